@@ -0,0 +1,54 @@
+"""
+Micro-benchmark for fund code validation: linear scan over the old
+``fund_code_map.values()`` versus the hashed ``SchemeRegistry`` lookup.
+
+Usage:
+    python benchmarks/bench_scheme_registry.py [--schemes 40000] [--lookups 2000]
+"""
+import argparse
+import random
+import timeit
+
+from pyfinmuni.utils.scheme_registry import SchemeRegistry
+
+
+def synthetic_fund_list(n_schemes):
+    return [
+        {
+            "schemeCode": 100000 + i,
+            "schemeName": f"Synthetic Fund {i} - Direct Plan - Growth",
+            "isinGrowth": f"INF{i % 45:03d}K01{i:05d}",
+            "isinDivReinvestment": None,
+        }
+        for i in range(n_schemes)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--schemes", type=int, default=40000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    fund_list = synthetic_fund_list(args.schemes)
+    fund_code_map = {fund["schemeName"]: fund["schemeCode"] for fund in fund_list}
+    registry = SchemeRegistry(fund_list)
+
+    rng = random.Random(42)
+    # Half hits, half misses, like a mix of valid and mistyped user input
+    codes = [rng.choice((100000 + rng.randrange(args.schemes), 900000 + rng.randrange(1000)))
+             for _ in range(args.lookups)]
+
+    scan = min(timeit.repeat(lambda: [c in fund_code_map.values() for c in codes], number=1, repeat=3))
+    hashed = min(timeit.repeat(lambda: [c in registry for c in codes], number=1, repeat=3))
+    build = min(timeit.repeat(lambda: SchemeRegistry(fund_list), number=1, repeat=3))
+
+    print(f"schemes={args.schemes} lookups={args.lookups}")
+    print(f"linear scan   : {scan / args.lookups * 1e6:10.2f} us/lookup")
+    print(f"registry      : {hashed / args.lookups * 1e6:10.2f} us/lookup")
+    print(f"speedup       : {scan / hashed:10.1f}x")
+    print(f"registry build: {build * 1e3:10.2f} ms (once per scheme list)")
+
+
+if __name__ == "__main__":
+    main()
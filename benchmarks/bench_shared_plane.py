@@ -0,0 +1,106 @@
+"""
+Memory and lookup cost of worker processes holding their own scheme registry
+and embedding matrix versus attaching to the shared data plane.
+
+Each worker reports its proportional set size (PSS, Linux only), which splits
+shared pages between the processes mapping them.
+
+Usage:
+    python benchmarks/bench_shared_plane.py [--workers 4] [--schemes 40000] [--dim 384]
+"""
+import os
+import time
+import uuid
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from bench_scheme_registry import synthetic_fund_list
+from pyfinmuni.utils.embedding_store import EmbeddingStore, unit_rows
+from pyfinmuni.utils.scheme_registry import SchemeRegistry
+from pyfinmuni.utils.shared_plane import SharedDataPlane, SharedDataPublisher
+
+
+def pss_kib():
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1])
+    return 0
+
+
+def lookup_us(registry, codes):
+    start = time.perf_counter()
+    for code in codes:
+        code in registry
+    return (time.perf_counter() - start) / len(codes) * 1e6
+
+
+def private_worker(args, codes, ready, done, queue):
+    base = pss_kib()
+    registry = SchemeRegistry(synthetic_fund_list(args.schemes))
+    rng = np.random.default_rng(0)
+    embeddings = unit_rows(rng.standard_normal((args.schemes, args.dim), dtype=np.float32))
+    queue.put(("private", pss_kib() - base, lookup_us(registry, codes), float(embeddings[0, 0])))
+    ready.wait()
+    done.wait()
+
+
+def shared_worker(namespace, codes, ready, done, queue):
+    base = pss_kib()
+    plane = SharedDataPlane(namespace)
+    registry, store = plane.registry(), plane.embeddings()
+    float(np.asarray(store.embeddings).sum())  # touch every page
+    ready.wait()  # every worker has mapped the data before PSS is read
+    queue.put(("shared", pss_kib() - base, lookup_us(registry, codes), float(store.embeddings[0, 0])))
+    done.wait()
+
+
+def run(target, args_for, workers):
+    context = multiprocessing.get_context("fork")
+    queue, ready, done = context.Queue(), context.Barrier(workers + 1), context.Event()
+    processes = [context.Process(target=target, args=args_for + (ready, done, queue)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    ready.wait()
+    results = [queue.get(timeout=300) for _ in processes]
+    done.set()
+    for process in processes:
+        process.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--schemes", type=int, default=40000)
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    codes = [100000 + int(i) for i in rng.integers(0, args.schemes * 2, 2000)]
+
+    publisher = SharedDataPublisher(f"pfm-bench-{uuid.uuid4().hex[:8]}")
+    try:
+        start = time.perf_counter()
+        registry = SchemeRegistry(synthetic_fund_list(args.schemes))
+        embeddings = rng.standard_normal((args.schemes, args.dim), dtype=np.float32)
+        publisher.publish_registry(registry)
+        publisher.publish_embeddings(EmbeddingStore([f["schemeName"] for f in registry],
+                                                    np.asarray(registry.codes), embeddings))
+        print(f"publish: {(time.perf_counter() - start) * 1e3:.0f} ms")
+        del registry, embeddings
+
+        for name, results in (("private", run(private_worker, (args, codes), args.workers)),
+                              ("shared", run(shared_worker, (publisher.namespace, codes), args.workers))):
+            pss = [result[1] for result in results]
+            lookups = [result[2] for result in results]
+            print(f"{name:8s}: {args.workers} workers, {sum(pss) / 1024:8.1f} MiB PSS in total "
+                  f"({np.mean(pss) / 1024:.1f} MiB each), {np.mean(lookups):.2f} us/lookup")
+    finally:
+        publisher.close(unlink=True)
+
+
+if __name__ == "__main__":
+    main()
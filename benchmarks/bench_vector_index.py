@@ -0,0 +1,77 @@
+"""
+Recall@k, latency and memory of the fund-name vector index backends against
+exact search.
+
+The synthetic embeddings are clustered, as real scheme names are (many plans
+of one scheme, many schemes of one AMC), and each query is a noisy copy of a
+random row.
+
+Usage:
+    python benchmarks/bench_vector_index.py [--schemes 40000] [--dim 384] [--queries 200] [--k 3]
+"""
+import time
+import argparse
+
+import numpy as np
+
+from pyfinmuni.utils.vector_index import ExactIndex, Int8Index, IVFIndex
+
+
+def unit(matrix):
+    return (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)).astype(np.float32)
+
+
+def synthetic_embeddings(rng, schemes, dim, clusters):
+    centres = rng.standard_normal((clusters, dim))
+    return unit(centres[rng.integers(0, clusters, schemes)] + 0.6 * rng.standard_normal((schemes, dim)))
+
+
+def timed_search(index, queries, k):
+    start = time.perf_counter()
+    batch = index.search(queries, k)[0]
+    batch_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query[None, :], k)
+    single_time = time.perf_counter() - start
+    return batch, batch_time / len(queries), single_time / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--schemes", type=int, default=40000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matrix = synthetic_embeddings(rng, args.schemes, args.dim, clusters=max(1, args.schemes // 20))
+    queries = unit(matrix[rng.integers(0, args.schemes, args.queries)] + 0.05 * rng.standard_normal((args.queries, args.dim)))
+
+    backends = {
+        "exact float32": lambda: ExactIndex(matrix),
+        "exact float16": lambda: ExactIndex(matrix.astype(np.float16)),
+        "int8": lambda: Int8Index(matrix),
+        "int8 + rerank": lambda: Int8Index(matrix, rerank_matrix=matrix),
+        "ivf (probe 8)": lambda: IVFIndex(matrix, n_probe=8),
+        "ivf (probe 16)": lambda: IVFIndex(matrix, n_probe=16),
+    }
+
+    print(f"schemes={args.schemes} dim={args.dim} queries={args.queries} k={args.k}")
+    print(f"{'backend':<16}{'recall@k':>10}{'build s':>10}{'batch ms/q':>12}{'single ms/q':>13}{'index MB':>10}")
+    reference = None
+    for name, build in backends.items():
+        start = time.perf_counter()
+        index = build()
+        build_time = time.perf_counter() - start
+        found, batch_time, single_time = timed_search(index, queries, args.k)
+        if reference is None:
+            reference = found
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, reference)])
+        print(f"{name:<16}{recall:>10.3f}{build_time:>10.2f}{batch_time * 1e3:>12.3f}{single_time * 1e3:>13.3f}"
+              f"{index.nbytes / 2 ** 20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
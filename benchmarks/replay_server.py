@@ -0,0 +1,292 @@
+"""
+Local stand-in for the mfapi.in and NSE endpoints used by the clients.
+
+Serves synthetic payloads shaped like the real ones (a 40k-scheme MF list,
+multi-year NAV histories, EQUITY_L.csv, allIndices, quotes, gainers/losers
+and historical data), or recorded payloads from a directory, with
+configurable latency and error injection. Point the clients at it with
+``IndianMFApi(base_url=server.mf_url)`` and ``NSEApi(base_url=server.nse_url)``.
+
+Recorded payloads replace the synthetic ones when present in --payloads:
+mf_list.json, allIndices.json, EQUITY_L.csv, gainers.json, losers.json.
+
+Usage:
+    python benchmarks/replay_server.py [--port 8000] [--schemes 40000] [--latency-ms 20] [--error-rate 0.01]
+"""
+import os
+import json
+import time
+import random
+import argparse
+import threading
+
+from collections import Counter
+from datetime import date, timedelta
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+AMCS = ["SBI", "HDFC", "ICICI Prudential", "Axis", "Kotak", "Nippon India", "Aditya Birla Sun Life", "UTI",
+        "DSP", "Mirae Asset", "Tata", "Franklin India", "Invesco India", "Canara Robeco", "Edelweiss"]
+CATEGORIES = ["Bluechip", "Flexi Cap", "Midcap", "Small Cap", "Large & Mid Cap", "Liquid", "Overnight",
+              "Corporate Bond", "Gilt", "Balanced Advantage", "ELSS Tax Saver", "Nifty 50 Index", "Banking & PSU Debt"]
+PLANS = ["Direct Plan - Growth", "Regular Plan - Growth", "Direct Plan - IDCW", "Regular Plan - IDCW"]
+INDICES = ["NIFTY 50", "NIFTY NEXT 50", "NIFTY 100", "NIFTY 200", "NIFTY 500", "NIFTY MIDCAP 100", "NIFTY BANK",
+           "NIFTY IT", "NIFTY PHARMA", "NIFTY AUTO", "NIFTY FMCG", "NIFTY METAL", "NIFTY REALTY", "INDIA VIX"]
+
+
+class Payloads:
+    """Deterministic synthetic payloads, optionally overridden by recorded files."""
+
+    def __init__(self, schemes=40000, symbols=2000, nav_years=10, extra_indices=100, payload_dir=None, seed=0):
+        self.schemes = schemes
+        self.symbols = symbols
+        self.nav_years = nav_years
+        self.extra_indices = extra_indices
+        self.payload_dir = payload_dir
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._static = {}
+
+    def _recorded(self, name):
+        if self.payload_dir:
+            path = os.path.join(self.payload_dir, name)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    return f.read()
+        return None
+
+    def _once(self, name, build):
+        with self._lock:
+            if name not in self._static:
+                self._static[name] = self._recorded(name) or build()
+            return self._static[name]
+
+    def scheme_name(self, i):
+        return f"{AMCS[i % len(AMCS)]} {CATEGORIES[(i // len(AMCS)) % len(CATEGORIES)]} Fund {i // 60} - {PLANS[i % len(PLANS)]}"
+
+    def scheme_codes(self):
+        return [100000 + i for i in range(self.schemes)]
+
+    def mf_list(self):
+        return self._once("mf_list.json", lambda: json.dumps([{
+            "schemeCode": 100000 + i,
+            "schemeName": self.scheme_name(i),
+            "isinGrowth": f"INF{i % 900:03d}K01{i:05d}"[:12],
+            "isinDivReinvestment": None,
+        } for i in range(self.schemes)]).encode())
+
+    @lru_cache(maxsize=2048)
+    def nav_history(self, code):
+        i = code - 100000
+        if not 0 <= i < self.schemes:
+            return json.dumps({"meta": {}, "data": [], "status": "SUCCESS"}).encode()
+        rng = np.random.default_rng(code)
+        days = [d for d in (date.today() - timedelta(days=n) for n in range(365 * self.nav_years)) if d.weekday() < 5]
+        navs = 10 * np.exp(np.cumsum(rng.normal(0.0004, 0.01, len(days))))[::-1]
+        return json.dumps({
+            "meta": {"fund_house": f"{AMCS[i % len(AMCS)]} Mutual Fund", "scheme_type": "Open Ended Schemes",
+                     "scheme_category": CATEGORIES[(i // len(AMCS)) % len(CATEGORIES)], "scheme_code": code,
+                     "scheme_name": self.scheme_name(i)},
+            "data": [{"date": d.strftime("%d-%m-%Y"), "nav": f"{nav:.5f}"} for d, nav in zip(days, navs)],
+            "status": "SUCCESS",
+        }).encode()
+
+    @lru_cache(maxsize=2048)
+    def nav_latest(self, code):
+        payload = json.loads(self.nav_history(code))
+        payload["data"] = payload["data"][:1]
+        return json.dumps(payload).encode()
+
+    def symbol(self, i):
+        return f"SYN{i:04d}"
+
+    def equity_csv(self):
+        def build():
+            lines = ["SYMBOL,NAME OF COMPANY, SERIES, DATE OF LISTING, PAID UP VALUE, MARKET LOT, ISIN NUMBER, FACE VALUE"]
+            for i in range(self.symbols):
+                name = f'"Synthetic {CATEGORIES[i % len(CATEGORIES)]}, Industries {i} Limited"'
+                lines.append(f"{self.symbol(i)},{name},EQ,01-JAN-2005,10,1,INE{i:06d}01,10")
+            return ("\n".join(lines) + "\n").encode()
+        return self._once("EQUITY_L.csv", build)
+
+    def all_indices(self):
+        names = INDICES + [f"NIFTY SYNTHETIC {i}" for i in range(self.extra_indices)]
+        wobble = time.time() % 60
+        return json.dumps({"data": [{"key": "INDICES", "index": name, "indexSymbol": name,
+                                     "last": round(1000 + 97 * i + wobble, 2), "variation": round(wobble / 10, 2),
+                                     "percentChange": round(wobble / 100, 2), "open": 1000 + 97 * i}
+                                    for i, name in enumerate(names)]}).encode()
+
+    def movers(self, kind):
+        def build():
+            rng = random.Random(f"{self.seed}-{kind}")
+            sign = 1 if kind == "gainers" else -1
+            return json.dumps({
+                segment: {"data": [{"symbol": self.symbol(rng.randrange(self.symbols)), "ltp": round(rng.uniform(50, 5000), 2),
+                                    "perChange": sign * round(rng.uniform(0.5, 9), 2)} for _ in range(20)]}
+                for segment in ("NIFTY", "BANKNIFTY", "NIFTYNEXT50", "SecGtr20", "SecLwr20")
+            } | {"legends": [["NIFTY", "Nifty 50"], ["BANKNIFTY", "Nifty Bank"]]}).encode()
+        return self._once(f"{kind}.json", build)
+
+    def quote(self, symbol):
+        seed = sum(map(ord, symbol))
+        last = 100 + seed % 4000 + (time.time() % 60) / 10
+        return json.dumps({"info": {"symbol": symbol, "companyName": f"{symbol} Limited"},
+                           "priceInfo": {"lastPrice": round(last, 2), "change": 1.5, "pChange": 0.4,
+                                         "open": last - 2, "close": 0, "previousClose": last - 1.5,
+                                         "intraDayHighLow": {"min": last - 5, "max": last + 5}}}).encode()
+
+    def historical(self, symbol, from_date, to_date):
+        start = date(int(from_date[6:]), int(from_date[3:5]), int(from_date[:2]))
+        end = date(int(to_date[6:]), int(to_date[3:5]), int(to_date[:2]))
+        rows = []
+        day = start
+        while day <= end:
+            if day.weekday() < 5:
+                base = 100 + (day.toordinal() * 7 + sum(map(ord, symbol))) % 500
+                rows.append({"CH_SYMBOL": symbol, "CH_SERIES": "EQ", "CH_TIMESTAMP": day.isoformat(),
+                             "CH_OPENING_PRICE": base, "CH_TRADE_HIGH_PRICE": base + 5, "CH_TRADE_LOW_PRICE": base - 5,
+                             "CH_CLOSING_PRICE": base + 1, "CH_LAST_TRADED_PRICE": base + 1,
+                             "CH_PREVIOUS_CLS_PRICE": base - 1, "CH_TOT_TRADED_QTY": 100000, "CH_TOT_TRADED_VAL": base * 1e5,
+                             "CH_TOTAL_TRADES": 5000, "VWAP": base + 0.5})
+            day += timedelta(days=1)
+        return json.dumps({"data": rows[::-1]}).encode()
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY every keep-alive
+    # response waits out the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if self.path == "/":
+            self.send_header("Set-Cookie", "nsit=replay; Path=/")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        route = self._route(parts.path, query)
+        server.count(route[0])
+        if server.latency:
+            time.sleep(max(0.0, random.gauss(server.latency, server.latency_jitter)))
+        if server.error_rate and route[0] != "home" and random.random() < server.error_rate:
+            server.count("injected_error")
+            return self._send(server.error_status, b'{"error": "injected"}')
+        name, build, content_type = route
+        if build is None:
+            return self._send(404, b'{"error": "not found"}')
+        self._send(200, build(), content_type)
+
+    def _route(self, path, query):
+        payloads = self.server.payloads
+        path = path.rstrip("/") or "/"
+        if path == "/":
+            return "home", lambda: b"<html></html>", "text/html"
+        if path == "/mf":
+            return "mf_list", payloads.mf_list, "application/json"
+        if path.startswith("/mf/"):
+            code = path.split("/")[2]
+            if not code.isdigit():
+                return "not_found", None, None
+            if path.endswith("/latest"):
+                return "mf_latest", lambda: payloads.nav_latest(int(code)), "application/json"
+            return "mf_history", lambda: payloads.nav_history(int(code)), "application/json"
+        if path == "/content/equities/EQUITY_L.csv":
+            return "equity_csv", payloads.equity_csv, "text/csv"
+        if path == "/api/allIndices":
+            return "all_indices", payloads.all_indices, "application/json"
+        if path == "/api/quote-equity":
+            return "quote", lambda: payloads.quote(query.get("symbol", "")), "application/json"
+        if path == "/api/live-analysis-variations":
+            kind = "gainers" if query.get("index") == "gainers" else "losers"
+            return kind, lambda: payloads.movers(kind), "application/json"
+        if path == "/api/historical/cm/equity":
+            return "historical", lambda: payloads.historical(query["symbol"], query["from"], query["to"]), "application/json"
+        return "not_found", None, None
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """The stand-in server; run it with start() and read per-route request counts with counts()."""
+
+    daemon_threads = True
+
+    def __init__(self, payloads=None, port=0, latency_ms=0.0, latency_jitter_ms=0.0, error_rate=0.0, error_status=503):
+        super().__init__(("127.0.0.1", port), ReplayHandler)
+        self.payloads = payloads or Payloads()
+        self.latency = latency_ms / 1000
+        self.latency_jitter = latency_jitter_ms / 1000
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._counts = Counter()
+        self._counts_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def mf_url(self):
+        return f"{self.url}/mf"
+
+    @property
+    def nse_url(self):
+        return self.url
+
+    def count(self, route):
+        with self._counts_lock:
+            self._counts[route] += 1
+
+    def counts(self, reset=False):
+        with self._counts_lock:
+            counts = dict(self._counts)
+            if reset:
+                self._counts.clear()
+            return counts
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="replay-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--schemes", type=int, default=40000)
+    parser.add_argument("--symbols", type=int, default=2000)
+    parser.add_argument("--nav-years", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--payloads", help="directory of recorded payloads")
+    args = parser.parse_args()
+
+    payloads = Payloads(args.schemes, args.symbols, args.nav_years, payload_dir=args.payloads)
+    server = ReplayServer(payloads, args.port, args.latency_ms, args.latency_jitter_ms, args.error_rate)
+    print(f"Serving on {server.url} (MF API at {server.mf_url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
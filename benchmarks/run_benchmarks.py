@@ -0,0 +1,411 @@
+"""
+Offline benchmark suite for NSEApi, IndianMFApi, AsyncIndianMFApi, mf_fund_utils and portfolio valuation.
+
+Starts the local replay server (benchmarks/replay_server.py), points the
+clients at it and times their public methods:
+
+- cold: caches are dropped before every call (before every burst when threaded),
+- warm: the cache is primed once and then hit,
+- single-threaded and with --threads concurrent callers.
+
+Each result has throughput, p50/p99/mean latency, the tracemalloc peak of one
+call and the upstream requests per call counted by the server. Results go to
+a JSON file with the git revision, Python version and parameters, and
+--compare prints the change against an earlier file.
+
+The fund matcher runs on a synthetic embedding store built from the replayed
+scheme list with a hash-based stand-in for the transformer, so no model is
+downloaded.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--output results.json] [--compare old.json] [--only REGEX]
+                                        [--iterations 20] [--threads 8] [--latency-ms 0] [--error-rate 0]
+                                        [--schemes 40000] [--payloads DIR]
+"""
+import os
+import re
+import gc
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import tracemalloc
+
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from bench_fund_matching import HashEmbedder
+from replay_server import INDICES, Payloads, ReplayServer
+
+
+class Case:
+    """One benchmarked call; ``reset`` drops whatever the cold runs must not reuse."""
+
+    def __init__(self, name, op, reset=None, modes=("cold", "warm"), threaded=True):
+        self.name = name
+        self.op = op
+        self.reset = reset or (lambda: None)
+        self.modes = modes
+        self.threaded = threaded
+
+
+def percentile(latencies, q):
+    return float(np.percentile(latencies, q) * 1000) if latencies else 0.0
+
+
+def timed(op):
+    start = time.perf_counter()
+    op()
+    return time.perf_counter() - start
+
+
+def run_single(case, mode, iterations, max_seconds):
+    latencies = []
+    budget_end = time.perf_counter() + max_seconds
+    for _ in range(iterations):
+        if mode == "cold":
+            case.reset()
+        latencies.append(timed(case.op))
+        if time.perf_counter() > budget_end:
+            break
+    return latencies, sum(latencies)
+
+
+def run_threaded(case, mode, iterations, max_seconds, threads, pool):
+    # A round is one call per thread started together; cold rounds start with empty caches,
+    # which is the stampede the single-flight layer is meant to absorb
+    latencies = []
+    wall = 0.0
+    budget_end = time.perf_counter() + max_seconds
+    barrier = threading.Barrier(threads)
+
+    def call():
+        barrier.wait()
+        return timed(case.op)
+
+    for _ in range(max(1, iterations // threads)):
+        if mode == "cold":
+            case.reset()
+        start = time.perf_counter()
+        latencies.extend(future.result() for future in [pool.submit(call) for _ in range(threads)])
+        wall += time.perf_counter() - start
+        if time.perf_counter() > budget_end:
+            break
+    return latencies, wall
+
+
+def peak_memory(case, mode):
+    case.reset()
+    if mode == "warm":
+        case.op()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        case.op()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(case, server, args, pool):
+    results = []
+    for mode in case.modes:
+        for threads in ([1, args.threads] if case.threaded and args.threads > 1 else [1]):
+            try:
+                if mode == "warm":
+                    case.reset()
+                    case.op()
+                server.counts(reset=True)
+                if threads == 1:
+                    latencies, wall = run_single(case, mode, args.iterations, args.max_seconds)
+                else:
+                    latencies, wall = run_threaded(case, mode, args.iterations, args.max_seconds, threads, pool)
+            except Exception as e:
+                results.append({"name": case.name, "mode": mode, "threads": threads, "error": repr(e)})
+                continue
+            counts = server.counts(reset=True)
+            upstream = sum(count for route, count in counts.items() if route != "home")
+            results.append({
+                "name": case.name,
+                "mode": mode,
+                "threads": threads,
+                "calls": len(latencies),
+                "ops_per_sec": len(latencies) / wall if wall else 0.0,
+                "p50_ms": percentile(latencies, 50),
+                "p99_ms": percentile(latencies, 99),
+                "mean_ms": 1000 * float(np.mean(latencies)),
+                "upstream_per_call": upstream / len(latencies),
+                "peak_kib": peak_memory(case, mode) / 1024 if not args.no_memory and threads == 1 else None,
+            })
+    return results
+
+
+def nse_cases(server, payloads, args):
+    from pyfinmuni.NSEApi import NSEApi
+
+    nse = NSEApi(base_url=server.nse_url, background_session_refresh=False, max_workers=args.threads)
+    symbols = [payloads.symbol(i) for i in range(50)]
+    today = date.today()
+    month_ago = (today - timedelta(days=30)).strftime("%d-%m-%Y")
+    years_ago = (today - timedelta(days=3 * 365)).strftime("%d-%m-%Y")
+    to_date = today.strftime("%d-%m-%Y")
+
+    def reset():
+        nse.cache.clear()
+        nse.history._symbols.clear()
+
+    cases = [
+        Case("nse.get_quote", lambda: nse.get_quote(symbols[0]), reset),
+        Case("nse.get_quotes[50]", lambda: nse.get_quotes(symbols), reset),
+        Case("nse.get_top_gainers", nse.get_top_gainers, reset),
+        Case("nse.get_top_losers", nse.get_top_losers, reset),
+        Case("nse.get_all_indices", nse.get_all_indices, reset),
+        Case("nse.get_index_list", nse.get_index_list, reset),
+        Case("nse.get_index_quote", lambda: nse.get_index_quote("NIFTY 50"), reset),
+        Case(f"nse.get_index_quotes[{len(INDICES)}]", lambda: nse.get_index_quotes(INDICES), reset),
+        Case("nse.get_historical_data[30d]", lambda: nse.get_historical_data(symbols[0], month_ago, to_date), reset),
+        Case("nse.get_historical_data_many[20x30d]",
+             lambda: nse.get_historical_data_many(symbols[:20], month_ago, to_date), reset),
+        Case("nse.get_historical_range[3y]", lambda: nse.get_historical_range(symbols[0], years_ago, to_date), reset),
+        Case("nse.symbol_master.refresh", lambda: nse.symbol_master.refresh(force=True), modes=("cold",)),
+        Case("nse.get_stock_codes", nse.get_stock_codes, modes=("warm",)),
+        Case("nse.is_valid_code", lambda: nse.is_valid_code(symbols[7]), modes=("warm",)),
+        Case("nse.get_symbol_info", lambda: nse.get_symbol_info(symbols[7]), modes=("warm",)),
+        Case("nse.search_symbols", lambda: nse.search_symbols("synthetic gilt industries"), modes=("warm",)),
+        Case("nse.resolve_symbol", lambda: nse.resolve_symbol("Synthetic Midcap, Industries 2 Limited"), modes=("warm",)),
+        Case("nse.create_session", nse.create_session, modes=("cold",), threaded=False),
+    ]
+    return cases, nse.close
+
+
+def mf_cases(server, payloads, args):
+    from pyfinmuni.IMFApi import IndianMFApi
+    from pyfinmuni.AsyncIMFApi import AsyncIndianMFApi
+    from pyfinmuni.utils.cache import LRUCache
+    from pyfinmuni.utils.nav_store import NavHistoryStore
+    from pyfinmuni.utils.scheme_registry import save_snapshot
+
+    mf = IndianMFApi(base_url=server.mf_url)
+    codes = payloads.scheme_codes()[:50]
+    store_root = tempfile.mkdtemp(prefix="pyfinmuni-bench-")
+    snapshot_path = os.path.join(store_root, "schemes.json")
+    save_snapshot(mf.registry, snapshot_path)
+    mf_store = IndianMFApi(base_url=server.mf_url, history_store=NavHistoryStore(store_root))
+
+    def reset_store():
+        mf_store.cache.clear()
+        shutil.rmtree(store_root, ignore_errors=True)
+        mf_store.history_store = NavHistoryStore(store_root)
+
+    loop = asyncio.new_event_loop()
+    amf = AsyncIndianMFApi(base_url=server.mf_url)
+
+    cases = [
+        Case("mf.IndianMFApi()", lambda: IndianMFApi(base_url=server.mf_url, cache=LRUCache()), modes=("cold",)),
+        Case("mf.IndianMFApi().registry",
+             lambda: IndianMFApi(base_url=server.mf_url, cache=LRUCache(), snapshot_path="").registry, modes=("cold",)),
+        Case("mf.IndianMFApi().registry[snapshot]",
+             lambda: IndianMFApi(base_url=server.mf_url, cache=LRUCache(), snapshot_path=snapshot_path,
+                                 background_refresh=False).registry, modes=("cold",)),
+        Case("mf.get_mf_list", mf.get_mf_list, mf.cache.clear),
+        Case("mf.get_mf_price_latest", lambda: mf.get_mf_price_latest(codes[0]), mf.cache.clear),
+        Case("mf.get_mf_price_hist", lambda: mf.get_mf_price_hist(codes[0]), mf.cache.clear),
+        Case("mf.get_mf_nav_series", lambda: mf.get_mf_nav_series(codes[0]), mf.cache.clear),
+        Case("mf.is_valid_fund_code", lambda: mf.is_valid_fund_code(codes[0]), modes=("warm",)),
+        Case("mf.create_fund_code_map", lambda: mf.create_fund_code_map(mf.mutual_fund_list), modes=("warm",)),
+        Case("mf.warm_history[20]", lambda: mf_store.warm_history(codes[:20]), reset_store, threaded=False),
+        Case("mf.get_mf_nav_series[store]", lambda: mf_store.get_mf_nav_series(codes[0]), reset_store, threaded=False),
+        Case("async_mf.get_mf_price_latest_many[50]",
+             lambda: loop.run_until_complete(amf.get_mf_price_latest_many(codes)), amf.cache.clear, threaded=False),
+    ]
+
+    def close():
+        loop.run_until_complete(amf.close())
+        loop.close()
+        shutil.rmtree(store_root, ignore_errors=True)
+
+    return cases, close
+
+
+def matcher_cases(server, payloads, args):
+    from pyfinmuni.utils import mf_fund_utils
+    from pyfinmuni.utils.embedding_store import EmbeddingStore
+
+    scheme_list = json.loads(payloads.mf_list())
+    names = [scheme["schemeName"] for scheme in scheme_list]
+    codes = [scheme["schemeCode"] for scheme in scheme_list]
+    embedder = HashEmbedder(args.dim)
+    embeddings = embedder.embed_batch(names)
+    mf_fund_utils.set_embedder(embedder)
+
+    def reset():
+        # A new matrix object rebuilds the normalised rows, vector index and lexical index
+        mf_fund_utils.set_store(EmbeddingStore(names, np.asarray(codes), embeddings.copy()))
+
+    reset()
+    rng = np.random.default_rng(1)
+    picks = [names[i] for i in rng.integers(0, len(names), 50)]
+    queries = ([picks[0]] + [name.lower().replace(" - ", " ") for name in picks[1:20]]
+               + [name[:-3] for name in picks[20:40]] + [f"unknown scheme {i}" for i in range(10)])
+
+    cases = [
+        Case("mf_fund_utils.find_top_fund_matches[exact]",
+             lambda: mf_fund_utils.find_top_fund_matches(queries[0]), reset),
+        Case("mf_fund_utils.find_top_fund_matches[fuzzy]",
+             lambda: mf_fund_utils.find_top_fund_matches(queries[25]), reset),
+        Case("mf_fund_utils.find_top_fund_matches[neural]",
+             lambda: mf_fund_utils.find_top_fund_matches(queries[-1]), reset),
+        Case(f"mf_fund_utils.find_top_fund_matches_batch[{len(queries)}]",
+             lambda: mf_fund_utils.find_top_fund_matches_batch(queries), reset),
+        Case("mf_fund_utils.create_fund_to_code_mapping",
+             lambda: mf_fund_utils.create_fund_to_code_mapping(mf_fund_utils.get_store().fund_data), modes=("warm",)),
+    ]
+    return cases, lambda: None
+
+
+def portfolio_cases(server, payloads, args):
+    from pyfinmuni.IMFApi import IndianMFApi
+    from pyfinmuni.NSEApi import NSEApi
+    from pyfinmuni.utils.portfolio import PortfolioValuer
+
+    nse = NSEApi(base_url=server.nse_url, background_session_refresh=False, max_workers=args.threads)
+    mf = IndianMFApi(base_url=server.mf_url, snapshot_path="")
+    valuer = PortfolioValuer(nse, mf, max_workers=args.threads)
+    rng = np.random.default_rng(2)
+    symbols = [payloads.symbol(i) for i in range(50)]
+    funds = payloads.scheme_codes()[:50]
+    # 1000 users holding 10 of 100 instruments each: 10000 holdings, 100 distinct prices
+    portfolios = {user: [{"symbol": symbols[i], "quantity": 10, "avg_cost": 100} if i < 50 else
+                         {"scheme_code": funds[i - 50], "quantity": 25.5, "avg_cost": 10}
+                         for i in rng.choice(100, 10, replace=False)] for user in range(1000)}
+    snapshot = valuer.value_many(portfolios).snapshot
+
+    def reset():
+        nse.cache.clear()
+        mf.cache.clear()
+
+    cases = [
+        Case("portfolio.value_many[1000x10]", lambda: valuer.value_many(portfolios), reset, threaded=False),
+        Case("portfolio.value_many[1000x10,snapshot]", lambda: valuer.value_many(portfolios, snapshot),
+             modes=("warm",)),
+    ]
+
+    def close():
+        valuer.close()
+        nse.close()
+
+    return cases, close
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_key(result):
+    return result["name"], result["mode"], result["threads"]
+
+
+def compare(old_path, results, threshold):
+    with open(old_path) as f:
+        old = {result_key(result): result for result in json.load(f)["results"]}
+    print(f"\nChange against {old_path} (p50 and throughput; '!' marks a slowdown beyond {threshold:.0%})")
+    for result in results:
+        before = old.get(result_key(result))
+        if before is None or "error" in result or "error" in before:
+            continue
+        p50 = result["p50_ms"] / before["p50_ms"] - 1 if before["p50_ms"] else 0.0
+        throughput = result["ops_per_sec"] / before["ops_per_sec"] - 1 if before["ops_per_sec"] else 0.0
+        flag = "!" if p50 > threshold else " "
+        print(f"{flag} {result['name']:<48} {result['mode']:<5} x{result['threads']:<3} "
+              f"p50 {before['p50_ms']:9.3f} -> {result['p50_ms']:9.3f} ms ({p50:+7.1%})  "
+              f"ops/s {throughput:+7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="p50 slowdown flagged by --compare")
+    parser.add_argument("--only", help="regex selecting the cases to run")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--max-seconds", type=float, default=5.0, help="time budget per case and mode")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peaks")
+    parser.add_argument("--schemes", type=int, default=40000)
+    parser.add_argument("--symbols", type=int, default=2000)
+    parser.add_argument("--nav-years", type=int, default=10)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--payloads", help="directory of recorded payloads")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    payloads = Payloads(args.schemes, args.symbols, args.nav_years, payload_dir=args.payloads)
+    server = ReplayServer(payloads, latency_ms=args.latency_ms, latency_jitter_ms=args.latency_jitter_ms,
+                          error_rate=args.error_rate).start()
+    only = re.compile(args.only) if args.only else None
+    # Measure the clients, not the request rate allowed towards the real hosts
+    from pyfinmuni.utils.rate_limit import default_rate_limits
+    default_rate_limits.configure(urlsplit(server.url).netloc, rate=1e6, burst=10 ** 6, max_rate=1e6)
+
+    results = []
+    pool = ThreadPoolExecutor(max_workers=args.threads)
+    try:
+        for build in (nse_cases, mf_cases, matcher_cases, portfolio_cases):
+            cases, close = build(server, payloads, args)
+            try:
+                for case in cases:
+                    if only and not only.search(case.name):
+                        continue
+                    for result in run_case(case, server, args, pool):
+                        results.append(result)
+                        if "error" in result:
+                            print(f"{result['name']:<50} {result['mode']:<5} x{result['threads']:<3} ERROR {result['error']}")
+                        else:
+                            peak = f"{result['peak_kib']:10.0f} KiB" if result["peak_kib"] is not None else ""
+                            print(f"{result['name']:<50} {result['mode']:<5} x{result['threads']:<3} "
+                                  f"{result['ops_per_sec']:10.1f} ops/s  p50 {result['p50_ms']:9.3f} ms  "
+                                  f"p99 {result['p99_ms']:9.3f} ms  upstream/call {result['upstream_per_call']:6.2f}  {peak}")
+            finally:
+                close()
+    finally:
+        pool.shutdown()
+        server.stop()
+
+    output = {
+        "meta": {
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "params": vars(args),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"\nWrote {len(results)} results to {args.output}")
+    if args.compare:
+        compare(args.compare, results, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
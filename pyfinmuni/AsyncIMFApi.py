@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import random
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+import aiohttp
+
+from pyfinmuni.IMFApi import IndianMFApi
+from pyfinmuni.utils.cache import CacheBackend, LRUCache, Ttl, ONE_DAY, seconds_until_nav_publish
+from pyfinmuni.utils.concurrency import BatchResult
+from pyfinmuni.utils.json_codec import loads
+from pyfinmuni.utils.scheme_registry import SchemeRegistry
+from pyfinmuni.utils.singleflight import AsyncSingleFlight
+
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+_MISSING = object()
+
+
+class AsyncIndianMFApi:
+    """
+    An asyncio client for the Mutual Fund API, mirroring IndianMFApi.
+
+    Requests go through one keep-alive aiohttp connection pool, and retries back
+    off with ``asyncio.sleep`` so the event loop is never blocked.
+    """
+    base_url = IndianMFApi.base_url
+
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None, cache: Optional[CacheBackend] = None,
+                 cache_ttl: Optional[Dict[str, Ttl]] = None, limit: int = 32, max_attempts: int = 3,
+                 backoff: float = 0.5, max_backoff: float = 8.0, timeout: float = 10.0,
+                 base_url: Optional[str] = None):
+        """
+        Initializes the client. Nothing is fetched until the first call.
+
+        Args:
+            session (Optional[aiohttp.ClientSession]): Session to use; by default one
+                is created on first use and closed by ``close()``.
+            cache (Optional[CacheBackend]): Cache for API responses; defaults to a
+                per-instance LRU cache.
+            cache_ttl (Optional[Dict[str, Ttl]]): Per-method TTL overrides keyed by
+                method name.
+            limit (int): Maximum number of pooled connections, which also bounds
+                the concurrency of ``get_mf_price_latest_many``.
+            max_attempts (int): Attempts per request on retryable errors.
+            backoff (float): Base delay in seconds of the exponential backoff.
+            max_backoff (float): Upper bound of a single backoff delay.
+            timeout (float): Total timeout of a single request in seconds.
+            base_url (Optional[str]): API root to use instead of ``base_url``, e.g. a
+                local replay server.
+        """
+        if base_url is not None:
+            self.base_url = base_url.rstrip("/")
+        self._session = session
+        self._owns_session = session is None
+        self.cache = cache if cache is not None else LRUCache(maxsize=4096)
+        self.cache_ttl = dict(cache_ttl or {})
+        self.limit = limit
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.single_flight = AsyncSingleFlight()
+        self._registry: Optional[SchemeRegistry] = None
+        self._registry_lock: Optional[asyncio.Lock] = None
+
+    async def __aenter__(self) -> "AsyncIndianMFApi":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, keepalive_timeout=60, ssl=False)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._owns_session = True
+        return self._session
+
+    async def close(self) -> None:
+        """
+        Closes the connection pool if this client created it.
+        """
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def _backoff_delay(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def _parse_response(self, url: str) -> Any:
+        """
+        Returns the JSON response of a GET request to the specified URL.
+
+        Concurrent calls for the same URL share one request and its result; see
+        ``single_flight.stats()`` for how many were coalesced.
+
+        Args:
+            url (str): The URL to send the GET request to.
+
+        Returns:
+            Any: The JSON response from the server.
+        """
+        return await self.single_flight.do(("GET", url), lambda: self._get_json(url))
+
+    async def _get_json(self, url: str) -> Any:
+        """
+        Sends a GET request to the specified URL and returns the JSON response.
+
+        Retries on 429/502/503/504, connection errors and timeouts with
+        exponential backoff and jitter.
+
+        Args:
+            url (str): The URL to send the GET request to.
+
+        Returns:
+            Any: The JSON response from the server.
+
+        Raises:
+            aiohttp.ClientError: The request failed after all attempts.
+            asyncio.TimeoutError: The last attempt timed out.
+        """
+        session = self._get_session()
+        for attempt in range(self.max_attempts):
+            last_attempt = attempt == self.max_attempts - 1
+            try:
+                async with session.get(url) as response:
+                    if response.status in RETRY_STATUS_CODES and not last_attempt:
+                        logging.info(f"Retrying {url} due to status code: {response.status}")
+                    else:
+                        response.raise_for_status()
+                        return await response.json(content_type=None, loads=loads)
+            except aiohttp.ClientResponseError as http_err:
+                logging.error(f"HTTP error occurred: {http_err}")
+                raise
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as conn_err:
+                logging.error(f"Connection error occurred: {conn_err!r}")
+                if last_attempt:
+                    raise
+            await asyncio.sleep(self._backoff_delay(attempt))
+
+    async def _cached(self, name: str, key: tuple, ttl: Ttl, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        cache_key = (name,) + key
+        value = self.cache.get(cache_key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = await fetch()
+        if value:
+            ttl = self.cache_ttl.get(name, ttl)
+            self.cache.set(cache_key, value, ttl() if callable(ttl) else ttl)
+        return value
+
+    async def get_mf_list(self) -> List[Dict[str, Any]]:
+        """
+        Retrieves the list of all mutual funds.
+
+        Returns:
+            List[Dict[str, Any]]: A list of dictionaries containing mutual fund information.
+        """
+        return await self._cached("get_mf_list", (), ONE_DAY, lambda: self._parse_response(self.base_url))
+
+    async def get_registry(self) -> SchemeRegistry:
+        """
+        Returns the scheme registry, fetching the scheme list on first use.
+
+        Returns:
+            SchemeRegistry: The indexed scheme list.
+        """
+        if self._registry is None:
+            if self._registry_lock is None:
+                self._registry_lock = asyncio.Lock()
+            async with self._registry_lock:
+                if self._registry is None:
+                    self._registry = SchemeRegistry(await self.get_mf_list())
+        return self._registry
+
+    async def is_valid_fund_code(self, mf_code: int) -> bool:
+        """
+        Checks if the provided mutual fund code is valid.
+
+        Args:
+            mf_code (int): The mutual fund code to verify.
+
+        Returns:
+            bool: True if the fund code is valid, False otherwise.
+        """
+        return mf_code in await self.get_registry()
+
+    async def get_mf_price_latest(self, mf_code: int) -> Dict[str, Any]:
+        """
+        Retrieves the latest price for a specified mutual fund.
+
+        Args:
+            mf_code (int): The mutual fund code.
+
+        Returns:
+            Dict[str, Any]: The latest price information, or {} for an invalid code.
+        """
+        if not await self.is_valid_fund_code(mf_code):
+            logging.error(f"Invalid mutual fund code: {mf_code}")
+            return {}
+        url = f"{self.base_url}/{mf_code}/latest"
+        return await self._cached("get_mf_price_latest", (mf_code,), seconds_until_nav_publish,
+                                  lambda: self._parse_response(url))
+
+    async def get_mf_price_hist(self, mf_code: int) -> Dict[str, Any]:
+        """
+        Retrieves the historical price data for a specified mutual fund.
+
+        Args:
+            mf_code (int): The mutual fund code.
+
+        Returns:
+            Dict[str, Any]: The historical price information, or {} for an invalid code.
+        """
+        if not await self.is_valid_fund_code(mf_code):
+            logging.error(f"Invalid mutual fund code: {mf_code}")
+            return {}
+        url = f"{self.base_url}/{mf_code}"
+        return await self._cached("get_mf_price_hist", (mf_code,), seconds_until_nav_publish,
+                                  lambda: self._parse_response(url))
+
+    async def get_mf_price_latest_many(self, mf_codes: Iterable[int]) -> BatchResult:
+        """
+        Retrieves the latest prices of many mutual funds concurrently.
+
+        Args:
+            mf_codes (Iterable[int]): The mutual fund codes.
+
+        Returns:
+            BatchResult: Latest price information keyed by code; invalid codes and
+            failed requests are reported in ``errors``.
+        """
+        codes = list(dict.fromkeys(mf_codes))
+        registry = await self.get_registry()
+        semaphore = asyncio.Semaphore(self.limit)
+
+        async def fetch(mf_code):
+            if mf_code not in registry:
+                raise ValueError(f"Invalid mutual fund code: {mf_code}")
+            async with semaphore:
+                return await self.get_mf_price_latest(mf_code)
+
+        result = BatchResult()
+        outcomes = await asyncio.gather(*(fetch(code) for code in codes), return_exceptions=True)
+        for code, outcome in zip(codes, outcomes):
+            if isinstance(outcome, BaseException):
+                result.errors[code] = outcome
+            else:
+                result[code] = outcome
+        return result
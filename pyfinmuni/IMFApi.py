@@ -1,66 +1,301 @@
+import os
+import time
 import requests
 import logging
+import threading
+import weakref
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError, ConnectionError, Timeout, RequestException
-from retrying import retry
-from typing import Any, Dict, List
-from functools import lru_cache
+from typing import Any, Dict, List, Mapping, Optional
+
+from pyfinmuni.utils.concurrency import BatchResult
+from pyfinmuni.utils.nav_analytics import NavSeries
+from pyfinmuni.utils.nav_store import NavHistoryStore
+from pyfinmuni.utils.rate_limit import RateLimits, default_rate_limits
+from pyfinmuni.utils.cache import CacheBackend, LRUCache, Ttl, ONE_DAY, cached_method, seconds_until_nav_publish
+from pyfinmuni.utils.metrics import metrics
+from pyfinmuni.utils.scheme_registry import SchemeRegistry, load_snapshot, save_snapshot
+from pyfinmuni.utils.shared_plane import SharedDataPlane, default_plane
+from pyfinmuni.utils.singleflight import SingleFlight, default_single_flight
 
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
 class IndianMFApi:
     """
     A class to interact with the Mutual Fund API to retrieve mutual fund information.
     """
+    base_url = "https://api.mfapi.in/mf"
+    pool_maxsize = 32
+
+    _shared_session: Optional[requests.Session] = None
+    _shared_session_lock = threading.Lock()
+
+    def __init__(self, cache: Optional[CacheBackend] = None, cache_ttl: Optional[Dict[str, Ttl]] = None,
+                 session: Optional[requests.Session] = None, history_store: Optional[NavHistoryStore] = None,
+                 single_flight: Optional[SingleFlight] = None, base_url: Optional[str] = None,
+                 rate_limits: Optional[RateLimits] = None, snapshot_path: Optional[str] = None,
+                 snapshot_ttl: float = ONE_DAY, background_refresh: bool = True,
+                 shared_plane: Optional[SharedDataPlane] = None):
+        """
+        Initializes the MFApi instance. Nothing is fetched until the scheme list
+        is first needed.
+
+        Args:
+            cache (Optional[CacheBackend]): Cache for API responses; defaults to a
+                per-instance LRU cache.
+            cache_ttl (Optional[Dict[str, Ttl]]): Per-method TTL overrides keyed by
+                method name, in seconds or as a callable returning seconds.
+            session (Optional[requests.Session]): HTTP session to use; defaults to a
+                keep-alive session shared by all instances.
+            history_store (Optional[NavHistoryStore]): Local NAV history store; when
+                set, get_mf_price_hist only downloads days missing from it.
+            single_flight (Optional[SingleFlight]): Coalesces concurrent identical
+                requests; defaults to the one shared by all clients.
+            base_url (Optional[str]): API root to use instead of ``base_url``, e.g. a
+                local replay server.
+            rate_limits (Optional[RateLimits]): Per-host rate limiters, retries and circuit
+                breakers; defaults to the ones shared by all clients.
+            snapshot_path (Optional[str]): File keeping a compact snapshot of the scheme
+                list, so startup reads it instead of downloading; defaults to the
+                ``mf_scheme_snapshot`` environment variable, None for no snapshot.
+            snapshot_ttl (float): Age in seconds after which the snapshot is refreshed.
+            background_refresh (bool): Refresh the snapshot from a daemon thread, serving
+                the previous list meanwhile; otherwise a stale snapshot is only used
+                if the download fails.
+            shared_plane (Optional[SharedDataPlane]): Shared-memory plane published by a
+                loader process; its scheme list and latest NAVs are read in place
+                instead of being fetched by every worker. Defaults to the plane named
+                by the ``pyfinmuni_shared_plane`` environment variable, if any.
+        """
+        if base_url is not None:
+            self.base_url = base_url.rstrip("/")
+        self.history_store = history_store
+        self.single_flight = single_flight if single_flight is not None else default_single_flight
+        self.rate_limits = rate_limits if rate_limits is not None else default_rate_limits
+        self.session = session if session is not None else self.shared_session()
+        self.cache = cache if cache is not None else LRUCache(maxsize=4096)
+        self.cache_ttl = dict(cache_ttl or {})
+        metrics.watch_cache("mf", self.cache)
+        self.snapshot_path = snapshot_path if snapshot_path is not None else os.environ.get("mf_scheme_snapshot")
+        self.snapshot_ttl = snapshot_ttl
+        self.background_refresh = background_refresh
+        self.fetched_at: Optional[float] = None
+        self._registry: Optional[SchemeRegistry] = None
+        self._mutual_fund_list: Optional[List[Dict[str, Any]]] = None
+        self._mutual_fund_list_of: Any = None
+        self.shared_plane = shared_plane if shared_plane is not None else default_plane()
+        self._registry_lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def registry(self) -> SchemeRegistry:
+        """
+        The indexed scheme list, loaded on first use from the snapshot or the API.
+
+        While a shared plane has a registry published, that one is used instead.
+        """
+        if self.shared_plane is not None:
+            shared = self.shared_plane.registry()
+            if shared is not None:
+                return shared
+        registry = self._registry
+        if registry is None:
+            with self._registry_lock:
+                if self._registry is None:
+                    self._load_registry()
+                registry = self._registry
+        return registry
+
+    @registry.setter
+    def registry(self, registry: SchemeRegistry) -> None:
+        # A registry set explicitly replaces the shared one for this instance
+        self.shared_plane = None
+        self._mutual_fund_list = None
+        self._registry = registry
+
+    @property
+    def mutual_fund_list(self) -> List[Dict[str, Any]]:
+        """
+        The list of all mutual funds, as returned by ``get_mf_list``.
+        """
+        registry = self.registry
+        fund_list = self._mutual_fund_list
+        if fund_list is None or self._mutual_fund_list_of is not registry:
+            fund_list = registry.to_list()
+            self._mutual_fund_list, self._mutual_fund_list_of = fund_list, registry
+        return fund_list
+
+    def _load_registry(self) -> None:
+        snapshot = None
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            try:
+                snapshot = load_snapshot(self.snapshot_path)
+            except (OSError, ValueError) as e:
+                logging.error(f"Ignoring unreadable scheme snapshot {self.snapshot_path}: {e}")
+
+        if snapshot is not None:
+            registry, fetched_at = snapshot
+            fresh = time.time() - fetched_at < self.snapshot_ttl
+            if fresh or self.background_refresh:
+                self._registry, self.fetched_at = registry, fetched_at
+                if self.background_refresh:
+                    self._start_refresher()
+                return
+            try:
+                self._download_registry(refresh=True)
+            except RequestException as e:
+                logging.error(f"Using the stale scheme snapshot, refresh failed: {e}")
+                self._registry, self.fetched_at = registry, fetched_at
+            return
+
+        self._download_registry()
+        if self.snapshot_path and self.background_refresh:
+            self._start_refresher()
 
-    def __init__(self):
+    def _download_registry(self, refresh: bool = False) -> SchemeRegistry:
+        if refresh:
+            self.get_mf_list.invalidate()
+        fund_list = self.get_mf_list()
+        if not fund_list and (refresh or self._registry is not None):
+            raise RequestException("The scheme list is empty")
+        registry = SchemeRegistry(fund_list)
+        fetched_at = time.time()
+        # Whole objects are swapped in, readers never see a half-built registry
+        self._mutual_fund_list, self._mutual_fund_list_of = fund_list, registry
+        self._registry, self.fetched_at = registry, fetched_at
+        if self.snapshot_path:
+            try:
+                save_snapshot(registry, self.snapshot_path, fetched_at)
+            except OSError as e:
+                logging.error(f"Could not write the scheme snapshot {self.snapshot_path}: {e}")
+        return registry
+
+    def refresh_registry(self) -> SchemeRegistry:
+        """
+        Downloads the scheme list again, swaps in the new registry and rewrites the snapshot.
+
+        Returns:
+            SchemeRegistry: The new registry.
+
+        Raises:
+            RequestException: The download failed; the current list is kept.
         """
-        Initializes the MFApi instance and retrieves the list of mutual funds.
+        with self._registry_lock:
+            return self._download_registry(refresh=True)
+
+    def _start_refresher(self) -> None:
+        if self._refresher is None:
+            # The thread only holds a weak reference, so a dropped client is collected and stops it
+            self._refresher = threading.Thread(target=_refresh_loop, args=(weakref.ref(self), self._stop),
+                                               name="mf-scheme-refresh", daemon=True)
+            self._refresher.start()
+            weakref.finalize(self, self._stop.set)
+
+    def close(self) -> None:
         """
-        self.mutual_fund_list = self.get_mf_list()
-        self.fund_code_map = self.create_fund_code_map(self.mutual_fund_list)
+        Stops the background refresh of the scheme list.
+        """
+        self._stop.set()
+        if self._refresher is not None and self._refresher is not threading.current_thread():
+            self._refresher.join(timeout=5)
+        self._refresher = None
 
-    @retry(stop_max_attempt_number=3, wait_fixed=2000, retry_on_exception=lambda x: isinstance(x, HTTPError) and x.response.status_code in {502, 503, 504})
-    def __parse_response(self, url: str) -> Any:
+    @property
+    def fund_code_map(self) -> Mapping[str, int]:
+        """
+        Read-only mapping of fund names to their codes, backed by the scheme registry.
+        """
+        return self.registry.fund_code_map()
+
+    @fund_code_map.setter
+    def fund_code_map(self, fund_code_map: Mapping[str, int]) -> None:
+        self.registry = SchemeRegistry.from_fund_code_map(fund_code_map)
+
+    @classmethod
+    def shared_session(cls) -> requests.Session:
+        """
+        Returns the process-wide pooled session, creating it on first use.
+
+        Returns:
+            requests.Session: A session whose connections are kept alive and reused.
+        """
+        if cls._shared_session is None:
+            with cls._shared_session_lock:
+                if cls._shared_session is None:
+                    session = requests.Session()
+                    session.verify = False
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=cls.pool_maxsize)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    IndianMFApi._shared_session = session
+        return cls._shared_session
+
+    def __parse_response(self, url: str, endpoint: str) -> Any:
+        """
+        Returns the JSON response of a GET request to the specified URL.
+
+        Concurrent calls for the same URL (from any instance) share one request
+        and its result; see ``single_flight.stats()`` for how many were coalesced.
+
+        Args:
+            url (str): The URL to send the GET request to.
+            endpoint (str): Label of the request in the metrics, e.g. "mf.latest".
+
+        Returns:
+            Any: The JSON response from the server.
+        """
+        return self.single_flight.do(("GET", url), lambda: self.__get_json(url, endpoint))
+
+    def __get_json(self, url: str, endpoint: str) -> Any:
         """
         Sends a GET request to the specified URL and returns the JSON response.
 
+        The request goes through the host's rate limiter: 429 and 5xx responses,
+        connection errors and timeouts are retried with exponential backoff and
+        jitter, and requests fail fast while the host's circuit breaker is open.
+
         Args:
             url (str): The URL to send the GET request to.
+            endpoint (str): Label of the request in the metrics.
 
         Returns:
             Any: The JSON response from the server.
 
         Raises:
             HTTPError: An HTTP error occurred.
+            CircuitOpenError: The host has been failing; the request was not sent.
             ConnectionError: A network problem occurred.
             Timeout: The request timed out.
             RequestException: A request error occurred.
         """
+        def send():
+            start = metrics.clock()
+            response = self.session.get(url, verify=False, timeout=10)
+            metrics.record_response(endpoint, response, start)
+            return response
+
         try:
-            response = requests.get(url, verify=False, timeout=10)
+            response = self.rate_limits.call(url, send, endpoint)
             response.raise_for_status()
-            logging.info(f"Successfully fetched data from {url}")
-            return response.json()
+            return metrics.parse_json(endpoint, response)
         except HTTPError as http_err:
             logging.error(f"HTTP error occurred: {http_err}")
-            if http_err.response.status_code in {502, 503, 504}:
-                logging.info(f"Retrying due to status code: {http_err.response.status_code}")
             raise
         except ConnectionError as conn_err:
+            metrics.inc("errors", endpoint)
             logging.error(f"Connection error occurred: {conn_err}")
             raise
         except Timeout as timeout_err:
+            metrics.inc("errors", endpoint)
             logging.error(f"Timeout error occurred: {timeout_err}")
             raise
         except RequestException as req_err:
             logging.error(f"Request error occurred: {req_err}")
             raise
 
-    @lru_cache(maxsize=1)  # Cache the result of this function, since it only changes once a day
+    @cached_method(ttl=ONE_DAY)  # The scheme list only changes once a day
     def get_mf_list(self) -> List[Dict[str, Any]]:
         """
         Retrieves the list of all mutual funds.
@@ -68,8 +303,8 @@ class IndianMFApi:
         Returns:
             List[Dict[str, Any]]: A list of dictionaries containing mutual fund information.
         """
-        url = "https://api.mfapi.in/mf"
-        return self.__parse_response(url)
+        url = self.base_url
+        return self.__parse_response(url, "mf.list")
 
     def create_fund_code_map(self, fund_list: List[Dict[str, Any]]) -> Dict[str, int]:
         """
@@ -81,9 +316,9 @@ class IndianMFApi:
         Returns:
             Dict[str, int]: A dictionary mapping fund names to their codes.
         """
-        return {fund['schemeName']: fund['schemeCode'] for fund in fund_list}
+        return dict(SchemeRegistry(fund_list).fund_code_map())
 
-    @lru_cache(maxsize=128)  # Cache the result of this function based on mf_code
+    @cached_method(ttl=seconds_until_nav_publish)  # Valid until the next NAV is published
     def get_mf_price_latest(self, mf_code: int) -> Dict[str, Any]:
         """
         Retrieves the latest price for a specified mutual fund.
@@ -97,11 +332,16 @@ class IndianMFApi:
         if not self.is_valid_fund_code(mf_code):
             logging.error(f"Invalid mutual fund code: {mf_code}")
             return {}
-        
-        url = f"https://api.mfapi.in/mf/{mf_code}/latest"
-        return self.__parse_response(url)
+
+        if self.shared_plane is not None:
+            payload = self.shared_plane.nav_latest(mf_code)
+            if payload is not None:
+                return payload
+
+        url = f"{self.base_url}/{mf_code}/latest"
+        return self.__parse_response(url, "mf.latest")
     
-    @lru_cache(maxsize=128)  # Cache the result of this function based on mf_code
+    @cached_method(ttl=seconds_until_nav_publish)  # Valid until the next NAV is published
     def get_mf_price_hist(self, mf_code: int) -> Dict[str, Any]:
         """
         Retrieves the historical price data for a specified mutual fund.
@@ -115,9 +355,50 @@ class IndianMFApi:
         if not self.is_valid_fund_code(mf_code):
             logging.error(f"Invalid mutual fund code: {mf_code}")
             return {}
-        
-        url = f"https://api.mfapi.in/mf/{mf_code}"
-        return self.__parse_response(url)
+
+        if self.history_store is not None:
+            self.history_store.refresh(mf_code, self.get_mf_price_latest, self._download_mf_price_hist)
+            return self.history_store.to_payload(mf_code)
+        return self._download_mf_price_hist(mf_code)
+
+    def _download_mf_price_hist(self, mf_code: int) -> Dict[str, Any]:
+        url = f"{self.base_url}/{mf_code}"
+        return self.__parse_response(url, "mf.history")
+
+    def get_mf_nav_series(self, mf_code: int) -> NavSeries:
+        """
+        Retrieves the historical NAVs of a mutual fund as a columnar series for analytics.
+
+        Args:
+            mf_code (int): The mutual fund code.
+
+        Returns:
+            NavSeries: Dates and NAVs in ascending order; empty for an invalid code.
+        """
+        if self.history_store is not None and self.is_valid_fund_code(mf_code):
+            self.history_store.refresh(mf_code, self.get_mf_price_latest, self._download_mf_price_hist)
+            return NavSeries.from_records(self.history_store.load(mf_code), mf_code)
+        return NavSeries.from_payload(self.get_mf_price_hist(mf_code))
+
+    def warm_history(self, mf_codes: List[int], max_workers: int = 8) -> BatchResult:
+        """
+        Brings the local NAV history store up to date for many funds ahead of time.
+
+        Args:
+            mf_codes (List[int]): The mutual fund codes.
+            max_workers (int): Number of concurrent downloads.
+
+        Returns:
+            BatchResult: Number of new rows keyed by code, failures in ``errors``.
+
+        Raises:
+            ValueError: The instance has no history store.
+        """
+        if self.history_store is None:
+            raise ValueError("warm_history needs an IndianMFApi created with a history_store")
+        return self.history_store.warm([code for code in mf_codes if self.is_valid_fund_code(code)],
+                                       self.get_mf_price_latest, self._download_mf_price_hist,
+                                       max_workers=max_workers)
 
     def is_valid_fund_code(self, mf_code: int) -> bool:
         """
@@ -129,9 +410,35 @@ class IndianMFApi:
         Returns:
             bool: True if the fund code is valid, False otherwise.
         """
-        return mf_code in self.fund_code_map.values()
+        return mf_code in self.registry
+
+def _refresh_loop(api_ref: "weakref.ref[IndianMFApi]", stop: threading.Event) -> None:
+    # Holds a strong reference only while refreshing, never while waiting
+    while True:
+        api = api_ref()
+        if api is None:
+            return
+        delay = max(api.snapshot_ttl - (time.time() - (api.fetched_at or 0)), 0)
+        retry_interval = min(api.snapshot_ttl, 5 * 60)
+        del api
+        if stop.wait(delay):
+            return
+        api = api_ref()
+        if api is None:
+            return
+        failed = False
+        try:
+            api.refresh_registry()
+        except RequestException as e:
+            logging.error(f"Scheme list refresh failed: {e}")
+            failed = True
+        del api
+        if failed and stop.wait(retry_interval):
+            return
+
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     mf = IndianMFApi()
     try:
         logging.info("Fetching mutual fund list")
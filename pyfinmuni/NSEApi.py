@@ -1,16 +1,33 @@
-import re
 import six
 import ast
 import json
 import requests
 import logging
+import threading
 
 from abc import ABCMeta, abstractmethod
-from typing import Optional, Dict, Union
-from datetime import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Iterable, Iterator, Tuple, Union
+from urllib.parse import urlsplit
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from pyfinmuni.utils.cache import CacheBackend, LRUCache, Ttl, ONE_DAY, cached_method
+from pyfinmuni.utils.concurrency import BatchResult, iter_concurrent, run_concurrent
+from pyfinmuni.utils.market_poller import MarketPoller
+from pyfinmuni.utils.metrics import metrics
+from pyfinmuni.utils.nse_history import DEFAULT_CHUNK_DAYS, HistoricalDataEngine
+from pyfinmuni.utils.nse_indices import IndexSnapshot
+from pyfinmuni.utils.nse_session import NSESessionManager
+from pyfinmuni.utils.rate_limit import RateLimits, default_rate_limits
+from pyfinmuni.utils.singleflight import SingleFlight, default_single_flight
+from pyfinmuni.utils.symbol_master import SymbolMaster
+
+# Default cache lifetimes, in seconds
+LIVE_DATA_TTL = 60  # gainers/losers refresh about once a minute
+QUOTE_TTL = 15
+INDEX_SNAPSHOT_TTL = 15
+# A 403 on a session younger than this does not renew it again (e.g. many workers throttled at once)
+FORBIDDEN_SESSION_MIN_AGE = 1.0
+HISTORICAL_DATA_TTL = 60 * 60
 
 class AbstractBaseExchange(six.with_metaclass(ABCMeta, object)):
 
@@ -64,84 +81,161 @@ class NSEApi(AbstractBaseExchange):
     """
     __CODECACHE__ = None
 
-    def __init__(self, verify: bool = True, session_refresh_interval: int = 300):
+    def __init__(self, verify: bool = True, session_refresh_interval: int = 300,
+                 cache: Optional[CacheBackend] = None, cache_ttl: Optional[Dict[str, Ttl]] = None,
+                 max_workers: int = 8, history_cache_dir: Optional[str] = None,
+                 history_chunk_days: int = DEFAULT_CHUNK_DAYS, symbol_cache_path: Optional[str] = None,
+                 symbol_ttl: float = ONE_DAY, single_flight: Optional[SingleFlight] = None,
+                 background_session_refresh: bool = True, base_url: Optional[str] = None,
+                 rate_limits: Optional[RateLimits] = None):
+        """
+        :param verify: verify TLS certificates
+        :param session_refresh_interval: seconds after which the NSE session cookies are renewed
+        :param cache: cache for API responses, defaults to a per-instance LRU cache
+        :param cache_ttl: per-method TTL overrides keyed by method name
+        :param max_workers: concurrency limit of the batch methods (get_quotes, ...)
+        :param history_cache_dir: directory caching get_historical_range chunks, None for memory only
+        :param history_chunk_days: longest date range requested from the historical endpoint at once
+        :param symbol_cache_path: JSON file persisting the equity symbol list, None for memory only
+        :param symbol_ttl: seconds before the equity symbol list is revalidated
+        :param single_flight: coalesces concurrent identical requests, defaults to the one shared by all clients
+        :param background_session_refresh: renew the session cookies from a background thread before they expire
+        :param base_url: serve every endpoint from this URL instead of NSE's hosts, e.g. a local replay server
+        :param rate_limits: per-host rate limiters, retries and circuit breakers, defaults to the ones shared by all clients
+        """
+        self.single_flight = single_flight if single_flight is not None else default_single_flight
+        self.rate_limits = rate_limits if rate_limits is not None else default_rate_limits
+        self.symbol_master = SymbolMaster(lambda headers: self.fetch(self.stocks_csv_url, headers=headers, stream=True),
+                                          cache_path=symbol_cache_path, ttl=symbol_ttl)
+        self.history = HistoricalDataEngine(self, cache_dir=history_cache_dir, chunk_days=history_chunk_days)
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._market_poller = None
+        self.cache = cache if cache is not None else LRUCache(maxsize=1024)
+        self.cache_ttl = dict(cache_ttl or {})
+        metrics.watch_cache("nse", self.cache)
         # URLs
         self.session_refresh_interval = session_refresh_interval 
-        self.nse_home_url = "https://nseindia.com"
-        self.session = self.create_session(verify=verify)
+        self.background_session_refresh = background_session_refresh
+        api_url = base_url.rstrip("/") if base_url else "https://www.nseindia.com"
+        archives_url = base_url.rstrip("/") if base_url else "https://nsearchives.nseindia.com"
+        self.nse_home_url = base_url.rstrip("/") if base_url else "https://nseindia.com"
+        self.historical_data_url = api_url + "/api/historical/cm/equity?symbol={code}&series=[%22EQ%22]&from={from_date}&to={to_date}&json=true"
+        self.get_quote_url = api_url + "/api/quote-equity?symbol={code}"
+        self.stocks_csv_url = archives_url + '/content/equities/EQUITY_L.csv'
+        self.top_gainer_url = api_url + '/api/live-analysis-variations?index=gainers&type=NIFTY&json=true'
+        self.top_loser_url = api_url + '/api/live-analysis-variations?index=loosers&type=NIFTY&json=true'
+        self.all_indices_url = api_url + "/api/allIndices?json=true"
 
-        self.historical_data_url = "https://www.nseindia.com/api/historical/cm/equity?symbol={code}&series=[%22EQ%22]&from={from_date}&to={to_date}&json=true"
-        self.get_quote_url = "https://www.nseindia.com/api/quote-equity?symbol={code}"
-        self.stocks_csv_url = 'https://nsearchives.nseindia.com/content/equities/EQUITY_L.csv'
-        self.top_gainer_url = 'https://www.nseindia.com/api/live-analysis-variations?index=gainers&type=NIFTY&json=true'
-        self.top_loser_url = 'https://www.nseindia.com/api/live-analysis-variations?index=loosers&type=NIFTY&json=true'
-        self.all_indices_url = "https://www.nseindia.com/api/allIndices?json=true"
+        self.sessions: Optional[NSESessionManager] = None
+        self.create_session(verify=verify)
 
     def create_session(self, verify=True):
-        self._session = requests.Session()
-        self._session.verify = verify
-        self._session.headers.update(self.nse_headers())
+        """
+        Starts the session manager, or rotates its session if it is running
+        :param verify: verify TLS certificates
+        :return: the new requests.Session
+        :raises: RequestException if the home page handshake fails
+        """
+        if getattr(self, "sessions", None) is None or self.sessions.verify != verify:
+            if getattr(self, "sessions", None) is not None:
+                self.sessions.close()
+            self.sessions = NSESessionManager(self.nse_home_url, self.nse_headers(), verify=verify,
+                                              refresh_interval=self.session_refresh_interval,
+                                              pool_maxsize=max(self.max_workers, 10),
+                                              background=self.background_session_refresh)
+            return self.sessions.session()
+        return self.sessions.refresh()
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        The current NSE session, renewed in the background before its cookies expire
+        """
+        return self.sessions.session()
+
+    def fetch(self, url, **kwargs):
+        """
+        GETs a URL on the NSE session; concurrent plain GETs of the same URL share one request
+        :param url: the URL
+        :param kwargs: passed to requests; streamed or customised requests are never shared
+        :return: requests.Response
+        """
+        if kwargs:
+            return self._fetch(url, **kwargs)
+        return self.single_flight.do(("GET", url), lambda: self._fetch(url))
+
+    def _fetch(self, url, **kwargs):
+        def send():
+            start = metrics.clock()
+            res = self.sessions.session().get(url, **kwargs)
+            metrics.record_response(None, res, start, read_body=not kwargs.get("stream"))
+            return res
+
         try:
-            self._session.get(self.nse_home_url)
+            # Throttled (403/429) and failed attempts are retried with backoff; an unhealthy host fails fast
+            return self.rate_limits.call(url, send, before_retry=self._renew_forbidden_session)
         except requests.exceptions.RequestException as e:
-            logging.error(f"Error creating session: {e}")
+            metrics.inc("errors", urlsplit(url).path)
+            logging.error(f"Error fetching URL {url}: {e}")
             raise
-        self._session_init_time = dt.now()
-        return self._session
-
-    def fetch(self, url):
-        time_diff = dt.now() - self._session_init_time
-        if time_diff.seconds < self.session_refresh_interval:
-            try:
-                return self._session.get(url)
-            except requests.exceptions.RequestException as e:
-                logging.error(f"Error fetching URL {url}: {e}")
-                raise
-        else:
-            self.create_session(self._session.verify)
-            return self.fetch(url)
+
+    def _renew_forbidden_session(self, response):
+        # NSE also answers 403 when the session cookies went stale; retrying on them fails again
+        if response.status_code != 403:
+            return
+        try:
+            self.sessions.refresh(if_older_than=FORBIDDEN_SESSION_MIN_AGE)
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error renewing the NSE session after a 403: {e}")
 
     def __fetch_json(self, url):
+        # Concurrent callers share one request and the parsed payload
+        return self.single_flight.do(("JSON", url), lambda: self.__get_json(url))
+
+    def __get_json(self, url):
         try:
-            res = self.session.get(url)
+            res = self._fetch(url)
             res.raise_for_status()
-            data = res.json()
+            data = metrics.parse_json(None, res)
             return self.render_response(data, False)
         except requests.exceptions.RequestException as e:
             logging.error(f"Error fetching JSON data from URL {url}: {e}")
             return {}
 
+    @cached_method(ttl=LIVE_DATA_TTL)
     def get_top_gainers(self) -> Dict:
         return self.__fetch_json(self.top_gainer_url)
 
+    @cached_method(ttl=LIVE_DATA_TTL)
     def get_top_losers(self) -> Dict:
         return self.__fetch_json(self.top_loser_url)
 
+    @cached_method(ttl=INDEX_SNAPSHOT_TTL)
+    def get_index_snapshot(self) -> IndexSnapshot:
+        """
+        Gets the allIndices payload indexed by index symbol; every index method reads this
+        snapshot, so a page showing many indices costs one download per TTL
+        :return: IndexSnapshot (empty, and not cached, if the download failed)
+        """
+        return IndexSnapshot(self.__fetch_json(self.all_indices_url))
+
     def get_all_indices(self) -> Dict:
-        return self.__fetch_json(self.all_indices_url)
+        return self.get_index_snapshot().payload
     
     def get_stock_codes(self) -> Dict:
-        url = self.stocks_csv_url
-        res_dict = {}
-        try:
-            res = self.session.get(url)
-            res.raise_for_status()
-            data = res.text
-            for line in data.split('\n'):
-                if line and re.search(',', line):
-                    code, name = line.split(',')[0:2]
-                    res_dict[code] = name
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error fetching stock codes: {e}")
-        
-        return self.render_response(res_dict, False)
+        return self.render_response(dict(self.symbol_master.symbols()), False)
 
-    def get_historical_data(self, code, from_date, to_date):
+    @cached_method(ttl=HISTORICAL_DATA_TTL,
+                   key=lambda code, from_date, to_date, raise_errors=False: (code, from_date, to_date))
+    def get_historical_data(self, code, from_date, to_date, raise_errors=False):
         """
         Gets historical data for a given stock code
         :param code: stock code
         :param from_date: start date in dd-mm-yyyy format
         :param to_date: end date in dd-mm-yyyy format
+        :param raise_errors: raise request errors instead of returning {}
         :return: dict
         :raises: HTTPError
         """
@@ -149,15 +243,19 @@ class NSEApi(AbstractBaseExchange):
         try:
             res = self.fetch(url)
             res.raise_for_status()
-            return res.json()
+            return metrics.parse_json(None, res)
         except requests.exceptions.RequestException as e:
             logging.error(f"Error fetching historical data for {code}: {e}")
+            if raise_errors:
+                raise
             return {}
 
-    def get_quote(self, code, all_data=False):
+    @cached_method(ttl=QUOTE_TTL, key=lambda code, all_data=False, raise_errors=False: (code.upper(), all_data))
+    def get_quote(self, code, all_data=False, raise_errors=False):
         """
         Gets the quote for a given stock code
         :param code: stock code
+        :param raise_errors: raise request errors instead of returning {}
         :return: dict or None
         :raises: HTTPError
         """
@@ -165,11 +263,98 @@ class NSEApi(AbstractBaseExchange):
         try:
             res = self.fetch(self.get_quote_url.format(code=code))
             res.raise_for_status()
-            return res.json()['priceInfo'] if not all_data else res.json()
+            data = metrics.parse_json(None, res)
+            return data['priceInfo'] if not all_data else data
         except requests.exceptions.RequestException as e:
             logging.error(f"Error fetching quote for {code}: {e}")
+            if raise_errors:
+                raise
             return {}
 
+    def get_historical_range(self, code, from_date, to_date) -> Dict:
+        """
+        Gets historical data for a given stock code over any range, fetched as
+        concurrent chunks the endpoint accepts and merged into columns
+        :param code: stock code
+        :param from_date: start date in dd-mm-yyyy format
+        :param to_date: end date in dd-mm-yyyy format
+        :return: dict of numpy columns: date, open, high, low, close, last, prev_close, volume, value, trades, vwap
+        :raises: RequestException if a chunk fails (the others stay cached)
+        """
+        return self.history.get(code, from_date, to_date)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="nse")
+        return self._executor
+
+    def iter_quotes(self, codes: Iterable[str], all_data=False) -> Iterator[Tuple[str, Dict, Optional[Exception]]]:
+        """
+        Fetches quotes for many stock codes concurrently, yielding each as it arrives
+        :param codes: stock codes
+        :param all_data: return the full quote payload instead of priceInfo
+        :return: iterator of (code, quote, error) tuples; quote is None when error is set
+        """
+        return iter_concurrent(lambda code: self.get_quote(code, all_data, raise_errors=True),
+                               (code.upper() for code in codes), self._get_executor())
+
+    def get_quotes(self, codes: Iterable[str], all_data=False) -> BatchResult:
+        """
+        Fetches quotes for many stock codes concurrently
+        :param codes: stock codes
+        :param all_data: return the full quote payload instead of priceInfo
+        :return: BatchResult of quotes keyed by code, failed codes in .errors
+        """
+        return run_concurrent(lambda code: self.get_quote(code, all_data, raise_errors=True),
+                              (code.upper() for code in codes), self._get_executor())
+
+    def iter_historical_data(self, codes: Iterable[str], from_date, to_date) -> Iterator[Tuple[str, Dict, Optional[Exception]]]:
+        """
+        Fetches historical data for many stock codes concurrently, yielding each as it arrives
+        :param codes: stock codes
+        :param from_date: start date in dd-mm-yyyy format
+        :param to_date: end date in dd-mm-yyyy format
+        :return: iterator of (code, data, error) tuples; data is None when error is set
+        """
+        return iter_concurrent(lambda code: self.get_historical_data(code, from_date, to_date, raise_errors=True),
+                               codes, self._get_executor())
+
+    def get_historical_data_many(self, codes: Iterable[str], from_date, to_date) -> BatchResult:
+        """
+        Fetches historical data for many stock codes concurrently
+        :param codes: stock codes
+        :param from_date: start date in dd-mm-yyyy format
+        :param to_date: end date in dd-mm-yyyy format
+        :return: BatchResult of historical data keyed by code, failed codes in .errors
+        """
+        return run_concurrent(lambda code: self.get_historical_data(code, from_date, to_date, raise_errors=True),
+                              codes, self._get_executor())
+
+    def get_market_poller(self) -> MarketPoller:
+        """
+        Gets the poller shared by every subscriber of this instance, started on first use;
+        see MarketPoller.subscribe
+        :return: MarketPoller
+        """
+        with self._executor_lock:
+            if self._market_poller is None:
+                self._market_poller = MarketPoller(self).start()
+        return self._market_poller
+
+    def close(self):
+        """
+        Stops the market poller, shuts down the batch worker pool and closes the HTTP session
+        """
+        if self._market_poller is not None:
+            self._market_poller.stop()
+            self._market_poller = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self.sessions.close()
+
     def is_valid_code(self, code):
         """
         Validates if a given stock code is valid
@@ -177,17 +362,42 @@ class NSEApi(AbstractBaseExchange):
         :return: Boolean
         """
         if code:
-            stock_codes = self.get_stock_codes()
-            return code.upper() in stock_codes.keys()
+            return code.upper() in self.symbol_master
         return False
     
+    def get_symbol_info(self, code) -> Optional[Dict]:
+        """
+        Gets the listing details of a stock code
+        :param code: a string stock code
+        :return: dict with symbol, name, series, listing_date, paid_up_value, market_lot, isin,
+                 face_value, or None if unknown
+        """
+        return self.symbol_master.table().get(code)
+
+    def search_symbols(self, query, limit=10):
+        """
+        Searches listed companies by (partial) name
+        :param query: free text, e.g. "reliance ind"
+        :param limit: maximum number of results
+        :return: list of listing details dicts, best matches first
+        """
+        return self.symbol_master.table().search(query, limit=limit)
+
+    def resolve_symbol(self, query):
+        """
+        Resolves a stock code, ISIN or company name to a stock code
+        :param query: e.g. "RELIANCE", "INE002A01018" or "reliance ind"
+        :return: the stock code, or None
+        """
+        return self.symbol_master.table().resolve(query)
+
     def get_index_list(self):
         """ 
         Get list of indices and codes
         :returns: a list | json of index codes
         """
         try:
-            return [i['indexSymbol'] for i in self.get_all_indices()['data']]
+            return list(self.get_index_snapshot().symbols)
         except Exception as e:
             logging.error(f"Error fetching index list: {e}")
             return []
@@ -199,11 +409,9 @@ class NSEApi(AbstractBaseExchange):
         :returns: dict
         """
         try:
-            all_index_quote = self.get_all_indices()['data']
-            index_list = [i['indexSymbol'] for i in all_index_quote]
-            code = code.upper()
-            if code in index_list:
-                return list(filter(lambda idx: idx['indexSymbol'] == code, all_index_quote))[0]
+            snapshot = self.get_index_snapshot()
+            if code in snapshot:
+                return snapshot.get(code)
             else:
                 logging.error('Wrong index code')
                 return []
@@ -211,6 +419,14 @@ class NSEApi(AbstractBaseExchange):
             logging.error(f"Error fetching index quote for {code}: {e}")
             return []
 
+    def get_index_quotes(self, codes: Iterable[str]) -> BatchResult:
+        """
+        Get quotes for many index codes from one allIndices download
+        :param codes: string index codes
+        :returns: BatchResult of quotes keyed by upper-cased code, unknown codes in .errors
+        """
+        return self.get_index_snapshot().get_many(codes)
+
     def nse_headers(self):
         """
         Builds the right set of headers for requesting http://nseindia.com
@@ -1,2 +1,3 @@
 from pyfinmuni.NSEApi import NSEApi
-from pyfinmuni.IMFApi import IndianMFApi
\ No newline at end of file
+from pyfinmuni.IMFApi import IndianMFApi
+from pyfinmuni.AsyncIMFApi import AsyncIndianMFApi
\ No newline at end of file
@@ -0,0 +1,333 @@
+import sys
+import time
+import threading
+
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import update_wrapper
+from typing import Any, Callable, Dict, Hashable, Optional, Union
+
+IST = timezone(timedelta(hours=5, minutes=30))
+ONE_DAY = 24 * 60 * 60
+
+# AMFI publishes the day's NAVs by 23:00 IST; mfapi.in picks them up shortly after
+NAV_PUBLISH_HOUR = 23
+NAV_PUBLISH_MINUTE = 30
+
+Ttl = Union[None, int, float, Callable[[], float]]
+
+_MISSING = object()
+
+
+def seconds_until(hour: int, minute: int = 0, now: Optional[datetime] = None, tz: timezone = IST) -> float:
+    """
+    Returns the number of seconds until the next occurrence of a wall-clock time.
+
+    Args:
+        hour (int): Hour of day in ``tz``.
+        minute (int): Minute of the hour.
+        now (Optional[datetime]): Reference time, defaults to the current time.
+        tz (timezone): Time zone of ``hour``/``minute``, defaults to IST.
+
+    Returns:
+        float: Seconds until the next ``hour:minute``, always positive.
+    """
+    now = (now or datetime.now(tz)).astimezone(tz)
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+def seconds_until_nav_publish(now: Optional[datetime] = None) -> float:
+    """
+    Returns the number of seconds until the next daily NAV publication.
+    """
+    return seconds_until(NAV_PUBLISH_HOUR, NAV_PUBLISH_MINUTE, now=now)
+
+
+def approx_sizeof(obj: Any, _seen: Optional[set] = None) -> int:
+    """
+    Estimates the deep memory footprint of a JSON-like object in bytes.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_sizeof(k, _seen) + approx_sizeof(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_sizeof(item, _seen) for item in obj)
+    return size
+
+
+class CacheBackend(metaclass=ABCMeta):
+    """
+    Interface for the caches used by the API clients.
+
+    Keys are tuples whose first element is a namespace (the cached method name),
+    so a whole method can be invalidated at once.
+    """
+
+    @abstractmethod
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        :return: the cached value for key, or default if missing or expired
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Stores value under key, expiring after ttl seconds (never if None)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key: Hashable) -> bool:
+        """
+        :return: True if the key was present
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """
+        Drops every entry, or only the entries of one namespace
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """
+        :return: a dict of hit/miss/eviction counters
+        """
+        raise NotImplementedError
+
+
+class LRUCache(CacheBackend):
+    """
+    Thread-safe in-memory LRU cache with per-entry expiry.
+
+    Entries are evicted least-recently-used first once either ``maxsize``
+    entries or ``maxbytes`` (estimated) bytes are exceeded.
+    """
+
+    def __init__(self, maxsize: Optional[int] = 4096, maxbytes: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = approx_sizeof, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            maxsize (Optional[int]): Maximum number of entries, None for unbounded.
+            maxbytes (Optional[int]): Maximum estimated size of all values, None for unbounded.
+            sizeof (Callable[[Any], int]): Size estimator used when ``maxbytes`` is set.
+            clock (Callable[[], float]): Monotonic clock, overridable for tests.
+        """
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._namespaces: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, key: Hashable, outcome: str) -> None:
+        namespace = key[0] if isinstance(key, tuple) and key else None
+        counters = self._namespaces.get(namespace)
+        if counters is None:
+            counters = self._namespaces[namespace] = {"hits": 0, "misses": 0}
+        counters[outcome] += 1
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at, size = entry
+                if expires_at is None or expires_at > self.clock():
+                    self._data.move_to_end(key)
+                    self._hits += 1
+                    self._count(key, "hits")
+                    return value
+                self._remove(key)
+                self._expirations += 1
+            self._misses += 1
+            self._count(key, "misses")
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if ttl is not None and ttl <= 0:
+            return
+        size = self.sizeof(value) if self.maxbytes is not None else 0
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+        expires_at = None if ttl is None else self.clock() + ttl
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            self._evict()
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def _evict(self) -> None:
+        while self._data and ((self.maxsize is not None and len(self._data) > self.maxsize)
+                              or (self.maxbytes is not None and self._bytes > self.maxbytes)):
+            key = next(iter(self._data))
+            self._remove(key)
+            self._evictions += 1
+
+    def delete(self, key: Hashable) -> bool:
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+                return True
+            return False
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            if namespace is None:
+                self._data.clear()
+                self._bytes = 0
+                return
+            for key in [k for k in self._data if isinstance(k, tuple) and k and k[0] == namespace]:
+                self._remove(key)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "namespaces": {ns: dict(counters) for ns, counters in self._namespaces.items()},
+            }
+
+
+def _resolve_ttl(ttl: Ttl) -> Optional[float]:
+    return ttl() if callable(ttl) else ttl
+
+
+class _BoundCachedMethod:
+    """
+    A cached method bound to an instance, with cache management helpers.
+    """
+
+    __slots__ = ("_descriptor", "_instance")
+
+    def __init__(self, descriptor: "CachedMethod", instance: Any):
+        self._descriptor = descriptor
+        self._instance = instance
+
+    def __call__(self, *args, **kwargs):
+        return self._descriptor.call(self._instance, args, kwargs)
+
+    def invalidate(self, *args, **kwargs) -> bool:
+        """
+        Drops the cached result for one set of arguments.
+        """
+        cache = getattr(self._instance, "cache", None)
+        return cache is not None and cache.delete(self._descriptor.make_key(args, kwargs))
+
+    def cache_clear(self) -> None:
+        """
+        Drops every cached result of this method on this instance.
+        """
+        cache = getattr(self._instance, "cache", None)
+        if cache is not None:
+            cache.clear(self._descriptor.name)
+
+    def cache_info(self) -> Dict[str, int]:
+        """
+        :return: hit/miss counters of this method
+        """
+        cache = getattr(self._instance, "cache", None)
+        if cache is None:
+            return {"hits": 0, "misses": 0}
+        return dict(cache.stats().get("namespaces", {}).get(self._descriptor.name, {"hits": 0, "misses": 0}))
+
+
+class CachedMethod:
+    """
+    Descriptor caching a method's results in the owning instance's ``cache``.
+
+    The TTL can be overridden per instance through a ``cache_ttl`` dict keyed
+    by method name. Instances without a cache call straight through.
+    """
+
+    def __init__(self, func: Callable, ttl: Ttl = None, cache_if: Callable[[Any], bool] = bool,
+                 key: Optional[Callable[..., tuple]] = None):
+        self.func = func
+        self.ttl = ttl
+        self.cache_if = cache_if
+        self.key = key
+        self.name = func.__name__
+        update_wrapper(self, func)
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return _BoundCachedMethod(self, instance)
+
+    def make_key(self, args: tuple, kwargs: dict) -> tuple:
+        if self.key is not None:
+            return (self.name,) + tuple(self.key(*args, **kwargs))
+        if kwargs:
+            return (self.name,) + args + tuple(sorted(kwargs.items()))
+        return (self.name,) + args
+
+    def call(self, instance: Any, args: tuple, kwargs: dict) -> Any:
+        cache = getattr(instance, "cache", None)
+        if cache is None:
+            return self.func(instance, *args, **kwargs)
+        key = self.make_key(args, kwargs)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = self.func(instance, *args, **kwargs)
+        if self.cache_if(value):
+            overrides = getattr(instance, "cache_ttl", None) or {}
+            cache.set(key, value, _resolve_ttl(overrides.get(self.name, self.ttl)))
+        return value
+
+
+def cached_method(ttl: Ttl = None, cache_if: Callable[[Any], bool] = bool,
+                  key: Optional[Callable[..., tuple]] = None) -> Callable[[Callable], CachedMethod]:
+    """
+    Decorator caching a method in its instance's ``cache`` backend.
+
+    Args:
+        ttl (Ttl): Seconds to keep a result, a callable returning seconds, or
+            None to keep it until evicted.
+        cache_if (Callable[[Any], bool]): Predicate deciding whether a result is
+            cached; by default empty results (e.g. the ``{}`` returned on
+            errors) are not.
+        key (Optional[Callable[..., tuple]]): Builds the cache key from the call
+            arguments, so equivalent calls share an entry; defaults to the
+            positional and keyword arguments as given.
+
+    Returns:
+        Callable[[Callable], CachedMethod]: The decorator.
+    """
+    def decorator(func: Callable) -> CachedMethod:
+        return CachedMethod(func, ttl=ttl, cache_if=cache_if, key=key)
+    return decorator
@@ -0,0 +1,74 @@
+from concurrent.futures import Executor, as_completed
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, Optional, Tuple
+
+
+class BatchResult(dict):
+    """
+    Results of a batch call keyed by input, with the failures kept in ``errors``.
+
+    Successful results are the dict items; ``errors`` maps each failed input to
+    the exception it raised, so failures are reported instead of swallowed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.errors: Dict[Hashable, BaseException] = {}
+
+    @property
+    def ok(self) -> bool:
+        """
+        True if every input succeeded.
+        """
+        return not self.errors
+
+    def __repr__(self) -> str:
+        return f"BatchResult({dict.__repr__(self)}, errors={self.errors!r})"
+
+
+def iter_concurrent(func: Callable[[Hashable], Any], keys: Iterable[Hashable],
+                    executor: Executor) -> Iterator[Tuple[Hashable, Any, Optional[BaseException]]]:
+    """
+    Runs ``func`` over ``keys`` on ``executor`` and yields results as they finish.
+
+    Duplicate keys are only run once. If the consumer stops iterating early,
+    calls that have not started yet are cancelled.
+
+    Args:
+        func (Callable[[Hashable], Any]): The function to call with each key.
+        keys (Iterable[Hashable]): The inputs.
+        executor (Executor): The bounded pool to run on.
+
+    Yields:
+        Tuple[Hashable, Any, Optional[BaseException]]: ``(key, result, error)``;
+        ``result`` is None when ``error`` is set.
+    """
+    futures = {executor.submit(func, key): key for key in dict.fromkeys(keys)}
+    try:
+        for future in as_completed(futures):
+            key = futures[future]
+            error = future.exception()
+            yield key, (None if error is not None else future.result()), error
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def run_concurrent(func: Callable[[Hashable], Any], keys: Iterable[Hashable], executor: Executor) -> BatchResult:
+    """
+    Runs ``func`` over ``keys`` on ``executor`` and collects the results.
+
+    Args:
+        func (Callable[[Hashable], Any]): The function to call with each key.
+        keys (Iterable[Hashable]): The inputs.
+        executor (Executor): The bounded pool to run on.
+
+    Returns:
+        BatchResult: Results keyed by input, failures in ``errors``.
+    """
+    result = BatchResult()
+    for key, value, error in iter_concurrent(func, keys, executor):
+        if error is not None:
+            result.errors[key] = error
+        else:
+            result[key] = value
+    return result
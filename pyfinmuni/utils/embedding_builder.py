@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+
+import numpy as np
+
+from pyfinmuni.utils.embedding_store import EmbeddingStore, unit_rows
+from pyfinmuni.utils.scheme_registry import SchemeRegistry, normalise_code
+
+DEFAULT_BATCH_SIZE = 256
+# Store versions kept next to the live one, for readers still mapping them
+DEFAULT_KEEP_VERSIONS = 2
+
+
+def _load_existing(path):
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        return EmbeddingStore.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        logging.error(f"Ignoring unreadable embedding store {path}, rebuilding from scratch: {e}")
+        return None
+
+
+def embedder_meta(embedder):
+    """The store meta identifying how the vectors were computed: the model and its pooling."""
+    return {"model": getattr(embedder, "model_name", None), "pooling": getattr(embedder, "pooling", None)}
+
+
+def build_store(fund_list, embedder, existing=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Build an EmbeddingStore for a scheme list, reusing the vectors of an existing store.
+
+    Schemes are matched by scheme code: unchanged ones keep their vector, new
+    or renamed ones are embedded in batches of ``batch_size`` and schemes no
+    longer in the list are dropped. Vectors are only reused when the existing
+    store records the embedder's model and pooling; a store built otherwise
+    (or without that meta, e.g. a converted legacy .npy) is re-embedded in full.
+
+    Returns (store, report), where report counts the kept, added, renamed
+    and removed schemes and says whether the existing store was discarded.
+    """
+    start = time.perf_counter()
+    discarded = False
+    if existing is not None:
+        stored = {key: existing.meta.get(key) for key in ("model", "pooling")}
+        if stored != embedder_meta(embedder):
+            logging.warning(f"Existing store was embedded with {stored}, not {embedder_meta(embedder)}; "
+                            f"re-embedding every scheme")
+            existing, discarded = None, True
+    registry = SchemeRegistry(fund_list)
+    schemes = [(code, name) for code, name in zip(registry.codes, registry.names) if name]
+    codes, names = [code for code, _ in schemes], [name for _, name in schemes]
+
+    previous = {}
+    if existing is not None:
+        for row, (code, name) in enumerate(zip(existing.codes.tolist(), existing.names)):
+            previous[normalise_code(code)] = (row, name)
+
+    reuse_rows, reuse_at, embed_at = [], [], []
+    renamed = 0
+    for position, (code, name) in enumerate(zip(codes, names)):
+        found = previous.get(code)
+        if found is not None and found[1] == name:
+            reuse_rows.append(found[0])
+            reuse_at.append(position)
+        else:
+            renamed += found is not None
+            embed_at.append(position)
+
+    vectors = []
+    for offset in range(0, len(embed_at), batch_size):
+        batch = [names[position] for position in embed_at[offset:offset + batch_size]]
+        vectors.append(unit_rows(embedder.embed_batch(batch)))
+        logging.info(f"Embedded {offset + len(batch)} of {len(embed_at)} new or renamed schemes")
+
+    dim = vectors[0].shape[1] if vectors else (existing.embeddings.shape[1] if existing is not None else 0)
+    matrix = np.empty((len(codes), dim), dtype=np.float32)
+    if reuse_rows:
+        reused = np.asarray(existing.embeddings[np.asarray(reuse_rows)], dtype=np.float32)
+        matrix[reuse_at] = reused if existing.normalized else unit_rows(reused)
+    if embed_at:
+        matrix[embed_at] = np.concatenate(vectors)
+
+    report = {
+        "schemes": len(codes),
+        "kept": len(reuse_rows),
+        "added": len(embed_at) - renamed,
+        "renamed": renamed,
+        "removed": len(set(previous) - set(codes)),
+        "discarded_existing": discarded,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    store = EmbeddingStore(names, np.asarray(codes, dtype=np.int64), matrix, normalized=True,
+                           meta={"built_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **embedder_meta(embedder)})
+    return store, report
+
+
+def write_store(store, path, dtype=np.float32, keep=DEFAULT_KEEP_VERSIONS):
+    """
+    Write a store so that readers never see a half-written one.
+
+    The store goes into a new versioned directory next to ``path``, and
+    ``path`` becomes a symlink to it, swapped atomically. Processes that
+    memory-mapped an older version keep reading it; the ``keep`` most
+    recent old versions are left on disk.
+    """
+    path = os.path.abspath(path)
+    parent, base = os.path.split(path)
+    version = f"{base}.v{time.time_ns()}"
+    store.save(os.path.join(parent, version), dtype=dtype)
+
+    if os.path.isdir(path) and not os.path.islink(path):
+        # A plain directory from EmbeddingStore.save or the converter becomes a version too,
+        # named after its mtime so migrating a second one does not collide with the first
+        migrated = os.stat(path).st_mtime_ns
+        while os.path.exists(os.path.join(parent, f"{base}.v{migrated}")):
+            migrated += 1
+        os.replace(path, os.path.join(parent, f"{base}.v{migrated}"))
+    tmp_link = os.path.join(parent, f".{base}.tmp-{os.getpid()}")
+    os.symlink(version, tmp_link)
+    os.replace(tmp_link, path)
+
+    old = sorted((name for name in os.listdir(parent) if name.startswith(f"{base}.v") and name != version),
+                 key=lambda name: os.path.getmtime(os.path.join(parent, name)))
+    for name in old[:max(len(old) - keep, 0)]:
+        shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+    return os.path.join(parent, version)
+
+
+def update_store(path, fund_list, embedder, batch_size=DEFAULT_BATCH_SIZE, dtype=np.float32, keep=DEFAULT_KEEP_VERSIONS):
+    """Incrementally rebuild the store at ``path`` for a scheme list and swap it in."""
+    store, report = build_store(fund_list, embedder, _load_existing(path), batch_size)
+    write_store(store, path, dtype=dtype, keep=keep)
+    logging.info(f"Updated embedding store {path}: {report}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incrementally build the fund-name embedding store.")
+    parser.add_argument("path", help="store path (a symlink to the current version)")
+    parser.add_argument("--snapshot", help="JSON scheme list, as returned by IndianMFApi.get_mf_list(); "
+                                           "fetched from the API when omitted")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--float16", action="store_true", help="store the matrix as float16")
+    parser.add_argument("--keep", type=int, default=DEFAULT_KEEP_VERSIONS, help="old versions to keep")
+    args = parser.parse_args(argv)
+
+    if args.snapshot:
+        with open(args.snapshot) as f:
+            fund_list = json.load(f)
+    else:
+        from pyfinmuni.IMFApi import IndianMFApi
+        fund_list = IndianMFApi().get_mf_list()
+    from pyfinmuni.utils.mf_fund_utils import get_embedder
+
+    report = update_store(args.path, fund_list, get_embedder(), batch_size=args.batch_size,
+                          dtype=np.float16 if args.float16 else np.float32, keep=args.keep)
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import logging
+import argparse
+
+from datetime import datetime
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MATRIX_FILE = "embeddings.npy"
+CODES_FILE = "codes.npy"
+NAMES_FILE = "names.txt"
+META_FILE = "meta.json"
+# Pooling of stores that do not record one: the legacy file held each name's first-token vector
+LEGACY_POOLING = "cls"
+
+
+def unit_rows(matrix):
+    """The rows of a matrix scaled to unit length, as float32."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, np.float32(1e-12))
+
+
+def _codes_array(codes):
+    # Keep the codes' type (int or str) so lookups return what the legacy file held
+    codes = np.asarray(list(codes))
+    if codes.dtype.kind in "iu":
+        return codes.astype(np.int64)
+    return codes.astype(str)
+
+
+class EmbeddingStore:
+    """
+    Fund names, codes and their embedding matrix.
+
+    On disk this is a directory holding a raw ``.npy`` matrix (float32 or
+    float16, unit-length rows) that is memory-mapped read-only, so worker
+    processes share its pages through the OS page cache, plus a compact
+    names/codes sidecar. The legacy pickled ``{'fund_data', 'embeddings'}``
+    ``.npy`` file is still readable.
+    """
+
+    def __init__(self, names, codes, embeddings, normalized=False, meta=None):
+        self.names = names
+        self.codes = codes
+        self.embeddings = embeddings
+        self.normalized = normalized
+        self.meta = meta or {}
+        self._fund_data = None
+        self._fund_to_code_dict = None
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def fund_data(self):
+        """(name, code) pairs, the layout of the legacy file."""
+        if self._fund_data is None:
+            self._fund_data = list(zip(self.names, self.codes.tolist()))
+        return self._fund_data
+
+    @property
+    def fund_to_code_dict(self):
+        if self._fund_to_code_dict is None:
+            self._fund_to_code_dict = dict(zip(self.names, self.codes.tolist()))
+        return self._fund_to_code_dict
+
+    @property
+    def pooling(self):
+        """How token vectors were pooled into name vectors: meta "pooling", else LEGACY_POOLING."""
+        return self.meta.get("pooling") or LEGACY_POOLING
+
+    @classmethod
+    def from_fund_data(cls, fund_data, embeddings, meta=None):
+        """Build a store from legacy (name, code) pairs and their embeddings."""
+        names = [item[0] for item in fund_data]
+        codes = _codes_array([item[1] for item in fund_data])
+        return cls(names, codes, np.asarray(embeddings), normalized=False, meta=meta)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a store directory (memory-mapped by default) or a legacy ``.npy`` file.
+        """
+        start_time = datetime.now()
+        if os.path.isdir(path):
+            with open(os.path.join(path, META_FILE)) as f:
+                meta = json.load(f)
+            embeddings = np.load(os.path.join(path, MATRIX_FILE), mmap_mode='r' if mmap else None)
+            codes = np.load(os.path.join(path, CODES_FILE))
+            with open(os.path.join(path, NAMES_FILE), encoding='utf-8') as f:
+                names = f.read().split('\n')[:len(codes)]
+            store = cls(names, codes, embeddings, normalized=meta.get("normalized", False), meta=meta)
+        else:
+            logging.info(f"Loading legacy pickled embeddings from {path}; convert it with "
+                         f"'python -m pyfinmuni.utils.embedding_store convert' for faster, shared loading.")
+            data = np.load(path, allow_pickle=True).item()
+            store = cls.from_fund_data(data['fund_data'], data['embeddings'])
+        elapsed_time = (datetime.now() - start_time).total_seconds()
+        logging.info(f"Loaded {len(store)} fund embeddings from {path} in {elapsed_time:.2f} seconds.")
+        return store
+
+    def save(self, path, dtype=np.float32, extra_meta=None):
+        """
+        Write the store as a directory in the memory-mappable format.
+
+        Rows are normalized to unit length before being cast to ``dtype``.
+        """
+        os.makedirs(path, exist_ok=True)
+        matrix = self.embeddings if self.normalized else unit_rows(self.embeddings)
+        np.save(os.path.join(path, MATRIX_FILE), np.ascontiguousarray(matrix, dtype=dtype))
+        np.save(os.path.join(path, CODES_FILE), self.codes)
+        with open(os.path.join(path, NAMES_FILE), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(name.replace('\n', ' ') for name in self.names))
+        meta = dict(self.meta, version=FORMAT_VERSION, dtype=np.dtype(dtype).name, count=len(self.names),
+                    dim=int(matrix.shape[1]) if matrix.ndim == 2 else 0, normalized=True)
+        meta.update(extra_meta or {})
+        with open(os.path.join(path, META_FILE), 'w') as f:
+            json.dump(meta, f)
+
+
+def convert_legacy(src, dst, dtype=np.float32):
+    """Convert a legacy pickled embeddings ``.npy`` file into a store directory."""
+    store = EmbeddingStore.load(src)
+    store.save(dst, dtype=dtype, extra_meta={"pooling": store.pooling})
+    return dst
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage fund-name embedding stores.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert = subparsers.add_parser("convert", help="convert a legacy pickled .npy file")
+    convert.add_argument("src", help="legacy .npy file")
+    convert.add_argument("dst", help="output directory")
+    convert.add_argument("--float16", action="store_true", help="store the matrix as float16")
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        convert_legacy(args.src, args.dst, dtype=np.float16 if args.float16 else np.float32)
+        print(f"Wrote {args.dst}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
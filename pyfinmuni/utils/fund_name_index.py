@@ -0,0 +1,108 @@
+import re
+
+import numpy as np
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_DIGITS = re.compile(r"[0-9]+")
+_ROMAN = re.compile(r"m{0,4}(cm|cd|d?c{0,3})(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})")
+
+# Words that vary between otherwise identical spellings of a scheme name,
+# e.g. "Direct Plan - Growth Option" vs "Direct Growth"
+NOISE_WORDS = frozenset({"plan", "option"})
+
+# Words telling apart schemes whose names are otherwise the same: the plan, the
+# option and its payout frequency. Synonyms map to one spelling.
+PLAN_WORDS = {
+    "direct": "direct", "regular": "regular",
+    "growth": "growth", "idcw": "idcw", "dividend": "idcw", "bonus": "bonus",
+    "payout": "payout", "reinvestment": "reinvestment", "reinvest": "reinvestment", "transfer": "transfer",
+    "daily": "daily", "weekly": "weekly", "fortnightly": "fortnightly", "monthly": "monthly",
+    "quarterly": "quarterly", "half": "half", "yearly": "yearly", "annual": "yearly",
+}
+
+
+def normalize_fund_name(name):
+    """
+    Lower-cases a scheme name, turns punctuation into spaces, collapses runs of
+    spaces and drops NOISE_WORDS.
+    """
+    words = _NON_ALNUM.sub(" ", name.lower().replace("&", " and ")).split()
+    return " ".join(word for word in words if word not in NOISE_WORDS)
+
+
+def trigrams(normalized_name):
+    """Character trigrams of a normalized name, padded so word edges count."""
+    padded = f" {normalized_name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def discriminating_tokens(normalized_name):
+    """
+    The parts of a normalized name that trigrams barely see but that name another
+    scheme when they differ: numbers ("50" vs "500"), roman numerals ("xli" vs
+    "xlii") in order, and the set of PLAN_WORDS ("direct" vs "regular").
+    """
+    words = normalized_name.split()
+    numbers = tuple(_DIGITS.findall(normalized_name))
+    # Single letters are left out: "L&T" or "Plan X" say nothing about a series
+    numerals = tuple(word for word in words if len(word) > 1 and word not in PLAN_WORDS and _ROMAN.fullmatch(word))
+    plan = frozenset(PLAN_WORDS[word] for word in words if word in PLAN_WORDS)
+    return numbers, numerals, plan
+
+
+class LexicalIndex:
+    """
+    Lexical lookup over fund names: a hash index of normalized names and a
+    character-trigram inverted index scored by Dice similarity.
+    """
+
+    def __init__(self, names):
+        self.size = len(names)
+        self._by_name = {}
+        postings = {}
+        gram_counts = np.zeros(self.size, dtype=np.float32)
+        self._discriminators = []
+        for row, name in enumerate(names):
+            normalized = normalize_fund_name(name)
+            self._by_name.setdefault(normalized, []).append(row)
+            self._discriminators.append(discriminating_tokens(normalized))
+            grams = trigrams(normalized)
+            gram_counts[row] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(row)
+        self._postings = {gram: np.asarray(rows, dtype=np.int32) for gram, rows in postings.items()}
+        self._gram_counts = gram_counts
+
+    def lookup(self, name):
+        """Rows whose normalized name equals the normalized query."""
+        return self._by_name.get(normalize_fund_name(name), [])
+
+    def scores(self, name):
+        """Dice similarity of the query's trigrams against every row, as a float32 vector."""
+        grams = trigrams(normalize_fund_name(name))
+        hits = [self._postings[gram] for gram in grams if gram in self._postings]
+        if not hits:
+            return np.zeros(self.size, dtype=np.float32)
+        common = np.bincount(np.concatenate(hits), minlength=self.size).astype(np.float32)
+        return 2 * common / (len(grams) + self._gram_counts)
+
+    def discriminators_match(self, name, rows):
+        """
+        Mask of the rows whose discriminating tokens are exactly the query's.
+        Trigrams barely tell "Nifty 50" from "Nifty 500", "Fund XLI" from
+        "Fund XLII" or a Direct plan from its Regular twin.
+        """
+        tokens = discriminating_tokens(normalize_fund_name(name))
+        return np.fromiter((self._discriminators[row] == tokens for row in rows), dtype=bool, count=len(rows))
+
+    def shortlist(self, name, k):
+        """
+        The k rows with the best trigram scores, best first, and their scores.
+        """
+        scores = self.scores(name)
+        k = min(k, self.size)
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        rows = np.argpartition(-scores, k - 1)[:k] if k < self.size else np.arange(self.size)
+        rows = rows[np.argsort(-scores[rows], kind='stable')]
+        return rows, scores[rows]
@@ -0,0 +1,36 @@
+import json
+
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # Optional: pip install orjson for faster decoding of the large payloads
+    orjson = None
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Decodes JSON with orjson when it is installed, else with the standard library
+    :param data: the document as bytes or str
+    :return: the decoded value
+    :raises: json.JSONDecodeError (orjson's error is a subclass)
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # e.g. NaN, which only the standard library accepts
+    return json.loads(data)
+
+
+def response_json(response: Any) -> Any:
+    """
+    ``response.json()`` of a requests.Response through the faster decoder when available;
+    undecodable bodies still raise requests' own JSONDecodeError
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            pass
+    return response.json()
@@ -0,0 +1,340 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+
+from datetime import datetime, time as dtime
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from pyfinmuni.utils.cache import IST
+from pyfinmuni.utils.concurrency import run_concurrent
+
+MARKET_OPEN = dtime(9, 15)
+MARKET_CLOSE = dtime(15, 30)
+
+Feed = Tuple[str, ...]  # ("quote", "RELIANCE"), ("index", "NIFTY 50"), ("gainers",) or ("losers",)
+
+
+def is_market_open(now: Optional[datetime] = None) -> bool:
+    """
+    Whether NSE's normal trading session is running (weekdays 09:15-15:30 IST; holidays are not known)
+    :param now: reference time, defaults to the current time
+    """
+    now = (now or datetime.now(IST)).astimezone(IST)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() <= MARKET_CLOSE
+
+
+def quote_feed(symbol: str) -> Feed:
+    return ("quote", symbol.upper())
+
+
+def index_feed(symbol: str) -> Feed:
+    return ("index", symbol.upper())
+
+
+GAINERS: Feed = ("gainers",)
+LOSERS: Feed = ("losers",)
+
+
+def endpoint_of(feed: Feed) -> Hashable:
+    """
+    The upstream call serving a feed; every index feed shares the allIndices snapshot
+    """
+    if feed[0] == "index":
+        return ("indices",)
+    if feed[0] in ("quote", "gainers", "losers"):
+        return feed
+    raise ValueError(f"Unknown feed {feed!r}")
+
+
+def _movers_records(payload: Dict[str, Any]) -> Dict[Hashable, Any]:
+    # {"NIFTY": {"data": [{"symbol": ...}, ...]}, ..., "legends": [...]}
+    records = {}
+    for segment, value in (payload or {}).items():
+        if isinstance(value, dict) and isinstance(value.get("data"), list):
+            for record in value["data"]:
+                records[(segment, record.get("symbol"))] = record
+    return records
+
+
+def diff_records(old: Dict[Hashable, Any], new: Dict[Hashable, Any]) -> Tuple[Dict[Hashable, Any], List[Hashable]]:
+    """
+    :return: (records that are new or changed, keys that disappeared)
+    """
+    changed = {key: record for key, record in new.items() if old.get(key) != record}
+    return changed, [key for key in old if key not in new]
+
+
+class Update:
+    """
+    The changes of one feed between two polls
+    """
+    __slots__ = ("feed", "changed", "removed", "polled_at")
+
+    def __init__(self, feed: Feed, changed: Dict[Hashable, Any], removed: List[Hashable], polled_at: float):
+        self.feed = feed
+        self.changed = changed
+        self.removed = removed
+        self.polled_at = polled_at
+
+    def __repr__(self) -> str:
+        return f"Update({self.feed!r}, changed={len(self.changed)}, removed={len(self.removed)})"
+
+
+class Subscription:
+    """
+    A consumer's feeds. Updates go to the callback (called on the poller thread)
+    and, when iterated with ``async for``, to an asyncio queue on the loop that
+    started iterating.
+    """
+
+    def __init__(self, poller: "MarketPoller", feeds: Iterable[Feed], callback: Optional[Callable[[Update], Any]] = None,
+                 max_queue: int = 1000):
+        self.poller = poller
+        self.feeds = frozenset(feeds)
+        self.callback = callback
+        self.max_queue = max_queue
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self.closed = False
+
+    def _deliver(self, update: Update) -> None:
+        if self.callback is not None:
+            try:
+                self.callback(update)
+            except Exception as e:
+                logging.error(f"Subscriber callback failed for {update.feed}: {e}")
+        if self._queue is not None:
+            self._loop.call_soon_threadsafe(self._put, update)
+
+    def _put(self, update: Optional[Update]) -> None:
+        if self._queue.full():
+            # A slow consumer loses the oldest update rather than stalling the poller
+            self._queue.get_nowait()
+        self._queue.put_nowait(update)
+
+    def __aiter__(self) -> "Subscription":
+        if self._queue is None:
+            self._loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            # Replay the current state for feeds already polled before iteration started
+            for update in self.poller._current_state(self.feeds):
+                self._put(update)
+        return self
+
+    async def __anext__(self) -> Update:
+        update = await self._queue.get()
+        if update is None:
+            raise StopAsyncIteration
+        return update
+
+    def unsubscribe(self) -> None:
+        """
+        Stops the updates; an ``async for`` over the subscription ends
+        """
+        if not self.closed:
+            self.closed = True
+            self.poller._remove(self)
+            if self._queue is not None:
+                self._loop.call_soon_threadsafe(self._put, None)
+
+
+class MarketPoller:
+    """
+    Polls NSE market data on behalf of any number of subscribers.
+
+    Subscriptions are merged per upstream endpoint (one quote request per
+    symbol, one allIndices request for every index, one each for gainers and
+    losers), so each endpoint is polled once per interval however many
+    consumers want it. Consecutive results are diffed and subscribers only
+    receive the records that changed. Intervals are jittered so endpoints do
+    not fire in lockstep, and stretched to ``closed_interval`` outside market
+    hours.
+    """
+
+    def __init__(self, nse, interval: float = 5, closed_interval: float = 15 * 60, jitter: float = 0.1,
+                 market_open: Callable[[], bool] = is_market_open, clock: Callable[[], float] = time.monotonic):
+        """
+        :param nse: the NSEApi instance to poll
+        :param interval: seconds between polls of an endpoint while the market is open
+        :param closed_interval: seconds between polls while it is closed
+        :param jitter: fraction by which each interval is randomly shortened or lengthened
+        :param market_open: tells whether the market is open, overridable for tests
+        :param clock: monotonic clock, overridable for tests
+        """
+        self.nse = nse
+        self.interval = interval
+        self.closed_interval = closed_interval
+        self.jitter = jitter
+        self.market_open = market_open
+        self.clock = clock
+        self.polls = 0
+        self.updates = 0
+        self._lock = threading.Condition()
+        self._subscriptions: List[Subscription] = []
+        self._due: Dict[Hashable, float] = {}
+        self._records: Dict[Hashable, Dict[Hashable, Any]] = {}
+        self._polled_at: Dict[Hashable, float] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def subscribe(self, feeds: Iterable[Feed], callback: Optional[Callable[[Update], Any]] = None) -> Subscription:
+        """
+        Subscribes to feeds; endpoints not polled yet are polled on the next tick
+        :param feeds: e.g. [quote_feed("RELIANCE"), index_feed("NIFTY 50"), GAINERS]
+        :param callback: called with each Update on the poller thread
+        :return: Subscription, also usable with ``async for``
+        """
+        subscription = Subscription(self, feeds, callback)
+        endpoints = {endpoint_of(feed) for feed in subscription.feeds}
+        with self._lock:
+            self._subscriptions.append(subscription)
+            for endpoint in endpoints:
+                self._due.setdefault(endpoint, self.clock())
+            self._lock.notify()
+        if callback is not None:
+            for update in self._current_state(subscription.feeds):
+                subscription._deliver(update)
+        return subscription
+
+    def _remove(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+            wanted = {endpoint_of(feed) for s in self._subscriptions for feed in s.feeds}
+            for endpoint in list(self._due):
+                if endpoint not in wanted:
+                    del self._due[endpoint]
+                    self._records.pop(endpoint, None)
+
+    def endpoints(self) -> List[Hashable]:
+        """
+        :return: the endpoints currently polled
+        """
+        with self._lock:
+            return list(self._due)
+
+    def _current_state(self, feeds: Iterable[Feed]) -> List[Update]:
+        updates = []
+        for feed in feeds:
+            endpoint = endpoint_of(feed)
+            records = self._records.get(endpoint)
+            if records is not None:
+                updates.append(Update(feed, self._select(feed, records), [], self._polled_at[endpoint]))
+        return updates
+
+    @staticmethod
+    def _select(feed: Feed, records: Dict[Hashable, Any]) -> Dict[Hashable, Any]:
+        if feed[0] == "index":
+            return {feed[1]: records[feed[1]]} if feed[1] in records else {}
+        return records
+
+    def _next_interval(self) -> float:
+        interval = self.interval if self.market_open() else self.closed_interval
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _fetch(self, endpoint: Hashable) -> Dict[Hashable, Any]:
+        nse = self.nse
+        kind = endpoint[0]
+        # The poller is the freshness source, so skip the response cache
+        if kind == "quote":
+            nse.get_quote.invalidate(endpoint[1])
+            return {endpoint[1]: nse.get_quote(endpoint[1], raise_errors=True)}
+        # The NSEApi methods below answer an empty payload when the download fails; that is a
+        # failed poll, not a market where every record disappeared
+        if kind == "indices":
+            nse.get_index_snapshot.invalidate()
+            records = dict(nse.get_index_snapshot().by_symbol)
+        else:
+            method = nse.get_top_gainers if kind == "gainers" else nse.get_top_losers
+            method.invalidate()
+            records = _movers_records(method())
+        if not records:
+            raise LookupError(f"Empty {kind} payload")
+        return records
+
+    def poll_due(self) -> int:
+        """
+        Polls every endpoint that is due and delivers the changes
+        :return: number of endpoints polled
+        """
+        now = self.clock()
+        with self._lock:
+            due = [endpoint for endpoint, at in self._due.items() if at <= now]
+        if not due:
+            return 0
+        results = run_concurrent(self._fetch, due, self.nse._get_executor())
+        for endpoint, error in results.errors.items():
+            logging.error(f"Polling {endpoint} failed: {error}")
+
+        deliveries = []
+        with self._lock:
+            for endpoint in due:
+                if endpoint not in self._due:
+                    continue  # unsubscribed meanwhile
+                self._due[endpoint] = self.clock() + self._next_interval()
+                if endpoint not in results:
+                    continue  # failed poll: keep the last snapshot until the next good one
+                old = self._records.get(endpoint, {})
+                new = results[endpoint]
+                self._records[endpoint] = new
+                self._polled_at[endpoint] = now
+                changed, removed = diff_records(old, new)
+                if changed or removed:
+                    deliveries.append((endpoint, changed, removed))
+            subscriptions = list(self._subscriptions)
+        self.polls += len(due)
+
+        for endpoint, changed, removed in deliveries:
+            for subscription in subscriptions:
+                for feed in subscription.feeds:
+                    if endpoint_of(feed) != endpoint:
+                        continue
+                    if feed[0] == "index":
+                        feed_changed = {feed[1]: changed[feed[1]]} if feed[1] in changed else {}
+                        feed_removed = [feed[1]] if feed[1] in removed else []
+                    else:
+                        feed_changed, feed_removed = changed, removed
+                    if feed_changed or feed_removed:
+                        self.updates += 1
+                        subscription._deliver(Update(feed, feed_changed, feed_removed, now))
+        return len(due)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if self._stopped:
+                    return
+                next_due = min(self._due.values(), default=None)
+                delay = None if next_due is None else max(next_due - self.clock(), 0)
+                if delay is None or delay > 0:
+                    self._lock.wait(delay)
+                    continue
+            try:
+                self.poll_due()
+            except Exception as e:
+                logging.error(f"Market poller error: {e}")
+
+    def start(self) -> "MarketPoller":
+        """
+        Starts polling on a daemon thread
+        """
+        if self._thread is None:
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="nse-poller", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stops the polling thread and ends every subscription
+        """
+        with self._lock:
+            self._stopped = True
+            self._lock.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._thread = None
+        for subscription in list(self._subscriptions):
+            subscription.unsubscribe()
@@ -0,0 +1,358 @@
+import os
+import time
+import weakref
+import threading
+
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from pyfinmuni.utils.json_codec import response_json
+
+# Upper bounds of the histogram buckets; an implicit +Inf bucket follows
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(10))  # 1 KiB .. 256 MiB
+
+HISTOGRAMS = {
+    "request_seconds": LATENCY_BUCKETS,
+    "parse_seconds": LATENCY_BUCKETS,
+    "embed_seconds": LATENCY_BUCKETS,
+    "response_bytes": SIZE_BUCKETS,
+}
+
+Hook = Callable[[str, str, float], Any]
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram, as Prometheus keeps them; quantiles are interpolated within a bucket.
+    """
+    __slots__ = ("bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """
+        :param q: quantile in [0, 1]
+        :return: the estimated value, 0 when empty
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[i - 1] if i else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class Instrumentation:
+    """
+    Opt-in telemetry of the API clients and the fund matcher.
+
+    Records per-endpoint histograms (request latency, response bytes, JSON
+    parse time, embedding time) and counters (requests, errors, retries,
+    throttled responses), and gathers cache and component stats when a
+    snapshot is taken. Hooks receive every observation, e.g. to forward it to
+    statsd; render_prometheus and PrometheusExporter expose the snapshot.
+
+    Disabled, every recording call returns after one attribute check, so the
+    hot paths pay close to nothing. Enable it with ``metrics.enable()`` or the
+    ``pyfinmuni_metrics=1`` environment variable.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._counters: Dict[Tuple[str, str], float] = {}
+        self._hooks: List[Hook] = []
+        self._caches: "weakref.WeakKeyDictionary[Any, str]" = weakref.WeakKeyDictionary()
+        self._sources: Dict[str, Callable[[], Any]] = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        """
+        Drops the recorded histograms and counters; caches and sources stay registered
+        """
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def add_hook(self, hook: Hook) -> None:
+        """
+        :param hook: called as hook(metric, endpoint, value) for every observation and increment
+        """
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook: Hook) -> None:
+        self._hooks.remove(hook)
+
+    def watch_cache(self, name: str, cache: Any) -> None:
+        """
+        Includes a cache's stats() in snapshots under name; caches sharing a name are summed.
+        The cache is held weakly, so watching it does not keep its client alive.
+        """
+        try:
+            self._caches[cache] = name
+        except TypeError:
+            pass  # Not weak-referenceable
+
+    def add_source(self, name: str, stats: Callable[[], Any]) -> None:
+        """
+        Includes stats() in snapshots under name, e.g. a component's own counters
+        """
+        self._sources[name] = stats
+
+    def clock(self) -> Optional[float]:
+        """
+        :return: a start time to pass to observe_since, or None while disabled
+        """
+        return time.perf_counter() if self.enabled else None
+
+    def observe(self, metric: str, endpoint: str, value: float) -> None:
+        if not self.enabled:
+            return
+        key = (metric, endpoint)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(HISTOGRAMS.get(metric, LATENCY_BUCKETS))
+            histogram.observe(value)
+        for hook in self._hooks:
+            hook(metric, endpoint, value)
+
+    def observe_since(self, metric: str, endpoint: str, start: Optional[float]) -> None:
+        """
+        Observes the seconds elapsed since start, a value from clock(); a None start is ignored
+        """
+        if start is not None:
+            self.observe(metric, endpoint, time.perf_counter() - start)
+
+    def inc(self, metric: str, endpoint: str, value: float = 1) -> None:
+        if not self.enabled:
+            return
+        key = (metric, endpoint)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        for hook in self._hooks:
+            hook(metric, endpoint, value)
+
+    def record_response(self, endpoint: Optional[str], response: Any, start: Optional[float],
+                        read_body: bool = True) -> None:
+        """
+        Records an HTTP response: latency since start, bytes, and error or throttle status
+        :param endpoint: label; defaults to the URL path of the response
+        :param response: requests.Response
+        :param start: value of clock() taken before the request; nothing is recorded if None
+        :param read_body: False for streamed responses, whose size is taken from Content-Length
+        """
+        if start is None:
+            return
+        endpoint = endpoint or urlsplit(response.url).path
+        self.observe("request_seconds", endpoint, time.perf_counter() - start)
+        self.inc("requests", endpoint)
+        if read_body:
+            size = len(response.content)
+        else:
+            size = int(response.headers.get("Content-Length") or 0)
+        self.observe("response_bytes", endpoint, size)
+        if response.status_code == 429:
+            self.inc("throttled", endpoint)
+        if response.status_code >= 400:
+            self.inc("errors", endpoint)
+
+    def parse_json(self, endpoint: Optional[str], response: Any) -> Any:
+        """
+        :return: response.json() (decoded with orjson when installed), timed as parse_seconds while enabled
+        """
+        if not self.enabled:
+            return response_json(response)
+        start = time.perf_counter()
+        data = response_json(response)
+        self.observe("parse_seconds", endpoint or urlsplit(response.url).path, time.perf_counter() - start)
+        return data
+
+    def _cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        caches: Dict[str, Dict[str, Any]] = {}
+        for cache, name in list(self._caches.items()):
+            stats = cache.stats()
+            total = caches.setdefault(name, {"hits": 0, "misses": 0, "evictions": 0, "entries": 0, "bytes": 0})
+            for field in total:
+                total[field] += stats.get(field, 0)
+        for total in caches.values():
+            lookups = total["hits"] + total["misses"]
+            total["hit_ratio"] = total["hits"] / lookups if lookups else 0.0
+        return caches
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        :return: {"enabled", "endpoints": {endpoint: {metric: histogram summary or counter}},
+                  "caches": {name: summed cache stats with hit_ratio}, plus one entry per source}
+        """
+        with self._lock:
+            histograms = {key: histogram.snapshot() for key, histogram in self._histograms.items()}
+            counters = dict(self._counters)
+        endpoints: Dict[str, Dict[str, Any]] = {}
+        for (metric, endpoint), value in list(histograms.items()) + list(counters.items()):
+            endpoints.setdefault(endpoint, {})[metric] = value
+        snapshot = {"enabled": self.enabled, "endpoints": endpoints, "caches": self._cache_stats()}
+        for name, stats in list(self._sources.items()):
+            snapshot[name] = stats()
+        return snapshot
+
+    def histograms(self) -> Dict[Tuple[str, str], Histogram]:
+        """
+        :return: copies of the raw histograms keyed by (metric, endpoint), for exporters
+        """
+        with self._lock:
+            copies = {}
+            for key, histogram in self._histograms.items():
+                copy = Histogram(histogram.bounds)
+                copy.counts, copy.count, copy.sum, copy.max = list(histogram.counts), histogram.count, histogram.sum, histogram.max
+                copies[key] = copy
+            return copies
+
+    def counters(self) -> Dict[Tuple[str, str], float]:
+        with self._lock:
+            return dict(self._counters)
+
+
+def _label(value: Hashable) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(instrumentation: Optional[Instrumentation] = None, prefix: str = "pyfinmuni") -> str:
+    """
+    Renders the metrics in the Prometheus text exposition format
+    :param instrumentation: defaults to the shared ``metrics``
+    :param prefix: metric name prefix
+    :return: the exposition text
+    """
+    instrumentation = instrumentation or metrics
+    lines = []
+    by_metric: Dict[str, List[Tuple[str, Histogram]]] = {}
+    for (metric, endpoint), histogram in sorted(instrumentation.histograms().items()):
+        by_metric.setdefault(metric, []).append((endpoint, histogram))
+    for metric, series in by_metric.items():
+        name = f"{prefix}_{metric}"
+        lines.append(f"# TYPE {name} histogram")
+        for endpoint, histogram in series:
+            label = f'endpoint="{_label(endpoint)}"'
+            cumulative = 0
+            for bound, count in zip(histogram.bounds + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f'{name}_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{label}}} {_number(histogram.sum)}")
+            lines.append(f"{name}_count{{{label}}} {histogram.count}")
+
+    by_counter: Dict[str, List[Tuple[str, float]]] = {}
+    for (metric, endpoint), value in sorted(instrumentation.counters().items()):
+        by_counter.setdefault(metric, []).append((endpoint, value))
+    for metric, series in by_counter.items():
+        name = f"{prefix}_{metric}_total"
+        lines.append(f"# TYPE {name} counter")
+        lines.extend(f'{name}{{endpoint="{_label(endpoint)}"}} {_number(value)}' for endpoint, value in series)
+
+    caches = instrumentation._cache_stats()
+    for field, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"),
+                        ("entries", "gauge"), ("bytes", "gauge"), ("hit_ratio", "gauge")):
+        if caches:
+            name = f"{prefix}_cache_{field}" + ("_total" if kind == "counter" else "")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f'{name}{{cache="{_label(cache)}"}} {_number(stats[field])}' for cache, stats in sorted(caches.items()))
+    return "\n".join(lines) + "\n"
+
+
+class PrometheusExporter:
+    """
+    Serves render_prometheus() at /metrics from a daemon thread.
+    """
+
+    def __init__(self, port: int = 9464, host: str = "0.0.0.0", instrumentation: Optional[Instrumentation] = None,
+                 prefix: str = "pyfinmuni"):
+        """
+        :param port: port to listen on, 0 for any free port
+        :param host: interface to bind
+        :param instrumentation: defaults to the shared ``metrics``
+        :param prefix: metric name prefix
+        """
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render_prometheus(exporter.instrumentation, exporter.prefix).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.instrumentation = instrumentation or metrics
+        self.prefix = prefix
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def start(self) -> "PrometheusExporter":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.server.serve_forever, name="pyfinmuni-metrics", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self.server.shutdown()
+            self._thread = None
+        self.server.server_close()
+
+
+# Shared by the clients and the fund matcher
+metrics = Instrumentation(enabled=os.environ.get("pyfinmuni_metrics", "").lower() in ("1", "true", "yes"))
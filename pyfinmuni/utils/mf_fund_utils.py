@@ -1,83 +1,454 @@
 import os
+import time
 import logging
+import threading
 
 from datetime import datetime
 
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from transformers import pipeline
 
-
-# Setup logging configuration
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("fund_matching.log"),
-        logging.StreamHandler()
-    ]
-)
+from pyfinmuni.utils.cache import LRUCache
+from pyfinmuni.utils.embedding_store import LEGACY_POOLING, EmbeddingStore
+from pyfinmuni.utils.fund_name_index import LexicalIndex
+from pyfinmuni.utils.vector_index import make_index, top_k_indices
+from pyfinmuni.utils.metrics import metrics
+from pyfinmuni.utils.shared_plane import default_plane
 
 mf_embeddings_path = os.environ.get("mf_embeddings_path", "/home/ubuntu/finbotbackend/data/fund_embeddingas.npy")
 
-if not os.path.exists(mf_embeddings_path):
-    raise RuntimeError(f"Couldnt fine Numpy embeddings file for MF names at {mf_embeddings_path}, please set proper value in env 'mf_embeddings_path'!")
+_store = None
+_store_lock = threading.Lock()
+
+
+def load_embeddings(filename=None):
+    """Load fund data and embeddings from a store directory or a legacy .npy file."""
+    store = EmbeddingStore.load(filename or mf_embeddings_path)
+    return store.fund_data, store.embeddings
+
+
+def get_store():
+    """
+    Return the process-wide EmbeddingStore, loading it from 'mf_embeddings_path' on first use.
+
+    A store directory is memory-mapped, so workers share its pages; a legacy
+    pickled .npy file is still accepted but loaded fully into memory. When a
+    shared plane ('pyfinmuni_shared_plane') has embeddings published, its
+    current version is used instead and a new one is picked up on the next call.
+    """
+    global _store
+    plane = default_plane()
+    if plane is not None:
+        store = plane.embeddings()
+        if store is not None:
+            _store = store
+            return store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = os.environ.get("mf_embeddings_path", mf_embeddings_path)
+                if not os.path.exists(path):
+                    raise RuntimeError(f"Couldnt fine Numpy embeddings file for MF names at {path}, please set proper value in env 'mf_embeddings_path'!")
+                try:
+                    _store = EmbeddingStore.load(path)
+                except Exception as e:
+                    logging.error(f"Failed to load embeddings: {e}")
+                    raise
+                _warn_if_legacy(_store, path)
+    return _store
+
+
+def _warn_if_legacy(store, path):
+    if store.pooling == LEGACY_POOLING:
+        logging.warning(f"Embeddings at {path} hold legacy first-token vectors; queries are pooled the same "
+                        f"way to match them. Rebuild the store with 'python -m pyfinmuni.utils.embedding_builder' "
+                        f"for mean-pooled vectors, which match fund names better.")
+
+
+def set_store(store):
+    """Replace the process-wide EmbeddingStore, e.g. after rebuilding it."""
+    global _store
+    _store = store
+
+
+def reload_store():
+    """Load the store at 'mf_embeddings_path' again, e.g. after embedding_builder swapped in a new version."""
+    path = os.environ.get("mf_embeddings_path", mf_embeddings_path)
+    set_store(EmbeddingStore.load(path))
+    _warn_if_legacy(_store, path)
+    return _store
+
+
+def __getattr__(name):
+    # fund_data, embeddings and fund_to_code_dict used to be loaded at import
+    if name in ("fund_data", "embeddings", "fund_to_code_dict"):
+        return getattr(get_store(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _resolve(fund_data, embeddings, fund_to_code_dict):
+    if fund_data is None or embeddings is None or fund_to_code_dict is None:
+        store = get_store()
+        fund_data = store.fund_data if fund_data is None else fund_data
+        embeddings = store.embeddings if embeddings is None else embeddings
+        fund_to_code_dict = store.fund_to_code_dict if fund_to_code_dict is None else fund_to_code_dict
+    return fund_data, embeddings, fund_to_code_dict
+
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+# How token vectors become one name vector: 'mean' over the attention mask, or
+# 'cls' (the first token, as the legacy store was built); recorded in the store meta
+POOLING = 'mean'
+POOLINGS = ('mean', 'cls')
+
+
+class FundNameEmbedder:
+    """
+    Sentence embedder for fund names, loaded once on first use.
+
+    Token vectors are mean-pooled over the attention mask (as sentence-transformers
+    does), and query embeddings are kept in a bounded LRU cache so repeated
+    queries skip the model entirely.
+
+    Stores embedded with the old feature-extraction pipeline hold first-token
+    vectors, so queries against them are pooled the same way ('cls'); a store
+    rebuilt with embedding_builder records its pooling in its meta.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, cache_size=4096, pooling=POOLING):
+        if pooling not in POOLINGS:
+            raise ValueError(f"Unknown pooling {pooling!r}, expected one of {POOLINGS}")
+        self.model_name = model_name
+        self.pooling = pooling
+        self._tokenizer = None
+        self._model = None
+        self._torch = None
+        self._load_lock = threading.Lock()
+        self._infer_lock = threading.Lock()
+        self.cache = LRUCache(maxsize=cache_size)
+        metrics.watch_cache("fund_name_embeddings", self.cache)
+
+    def _load(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    start_time = datetime.now()
+                    import torch
+                    from transformers import AutoModel, AutoTokenizer
+                    tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                    model = AutoModel.from_pretrained(self.model_name)
+                    model.eval()
+                    self._torch, self._tokenizer, self._model = torch, tokenizer, model
+                    elapsed_time = (datetime.now() - start_time).total_seconds()
+                    logging.info(f"Loaded embedding model {self.model_name} in {elapsed_time:.2f} seconds.")
+
+    def warm_up(self):
+        """Load the model and run one forward pass so the first query is not slow."""
+        self._load()
+        self._forward(["warm up"], self.pooling)
+
+    def _forward(self, texts, pooling):
+        torch = self._torch
+        with self._infer_lock, torch.inference_mode():
+            encoded = self._tokenizer(list(texts), padding=True, truncation=True, return_tensors='pt')
+            token_embeddings = self._model(**encoded).last_hidden_state
+            if pooling == 'cls':
+                pooled = token_embeddings[:, 0]
+            else:
+                mask = encoded['attention_mask'].unsqueeze(-1).to(token_embeddings.dtype)
+                pooled = (token_embeddings * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        return pooled.cpu().numpy().astype(np.float32)
+
+    def embed_batch(self, texts, pooling=None):
+        """
+        Embed many texts with one forward pass over the ones not already cached.
+
+        'pooling' overrides the embedder's own, e.g. to match the vectors of a legacy store.
+        """
+        pooling = pooling or self.pooling
+        texts = list(texts)
+        vectors = [self.cache.get(("embed", pooling, text)) for text in texts]
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            self._load()
+            computed = dict(zip(missing, self._forward(missing, pooling)))
+            for text, vector in computed.items():
+                self.cache.set(("embed", pooling, text), vector)
+            vectors = [computed[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return np.stack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+    def embed(self, text, pooling=None):
+        """Embed one text."""
+        return self.embed_batch([text], pooling)[0]
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """Return the process-wide embedder, creating it (but not loading the model) on first use."""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                _embedder = FundNameEmbedder()
+    return _embedder
+
+
+def set_embedder(embedder):
+    """Replace the process-wide embedder, e.g. with one on another model."""
+    global _embedder
+    _embedder = embedder
+
+
+def warm_up():
+    """Load the embedding model ahead of the first fuzzy query (e.g. at worker boot)."""
+    get_embedder().warm_up()
 
-def load_embeddings(filename=mf_embeddings_path):
-    """Load fund data and embeddings from a .npy file."""
-    start_time = datetime.now()
-    logging.info("Starting to load embeddings from file.")
-    
-    try:
-        data = np.load(filename, allow_pickle=True).item()
-    except Exception as e:
-        logging.error(f"Failed to load embeddings: {e}")
-        raise
-    
-    end_time = datetime.now()
-    elapsed_time = (end_time - start_time).total_seconds()
-    logging.info(f"Finished loading embeddings. Time taken: {elapsed_time:.2f} seconds.")
-    
-    return data['fund_data'], data['embeddings']
 
 def create_fund_to_code_mapping(fund_data):
     return {i[0]: i[1] for i in fund_data}
 
-# Load data and create mappings
-fund_data, embeddings = load_embeddings(mf_embeddings_path)
-fund_to_code_dict = create_fund_to_code_mapping(fund_data)
-    
-def find_top_fund_matches(query_fund_name, fund_data=fund_data, embeddings=embeddings, fund_to_code_dict=fund_to_code_dict, top_n=3):
-    """Find the top N matching mutual funds for a given query."""
-    logging.info(f"Finding matches for query fund: {query_fund_name}")
-    
-    if query_fund_name in fund_to_code_dict:
-        logging.info(f"Exact match found for fund: {query_fund_name}")
-        return [{
-            "fund_name": query_fund_name,
-            "fund_code": fund_to_code_dict[query_fund_name],
-            "cosine_similarity_score": 1.0
-        }]
+
+# Rows converted to float32 at once when scanning a float16 or quantized matrix
+SCORE_BLOCK_ROWS = 8192
+
+_normalized = {}
+_normalized_lock = threading.Lock()
+
+
+def normalized_embeddings(embeddings):
+    """Return the embeddings as a matrix of unit rows, computed once per matrix."""
+    store = _store
+    if store is not None and store.normalized and embeddings is store.embeddings:
+        # Already unit rows on disk; keep using the shared memory map as is
+        return embeddings
+    cached = _normalized.get(id(embeddings))
+    if cached is not None and cached[0] is embeddings:
+        return cached[1]
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    normalized = matrix / np.maximum(norms, np.float32(1e-12))
+    with _normalized_lock:
+        _normalized.clear()
+        _normalized[id(embeddings)] = (embeddings, normalized)
+    return normalized
+
+
+# Nearest-neighbour backend for queries scored against every fund: "exact", "int8" or "ivf"
+VECTOR_INDEX = os.environ.get("mf_vector_index", "exact")
+
+_vector_indexes = {}
+_vector_indexes_lock = threading.Lock()
+
+
+def vector_index(embeddings):
+    """Return the VECTOR_INDEX backend over the normalized embeddings, built once per matrix."""
+    cached = _vector_indexes.get(id(embeddings))
+    if cached is not None and cached[0] is embeddings and cached[1] == VECTOR_INDEX:
+        return cached[2]
+    start_time = datetime.now()
+    if VECTOR_INDEX == "int8":
+        # Quantizes and re-ranks straight from the store's matrix, so no normalized
+        # float32 copy stays alive next to the int8 codes
+        matrix = np.asarray(embeddings)
+        index = make_index(VECTOR_INDEX, matrix, rerank_matrix=matrix, block_rows=SCORE_BLOCK_ROWS)
     else:
-        logging.info("No exact match found. Calculating similarities.")
-        embedder = pipeline('feature-extraction', model='sentence-transformers/all-MiniLM-L6-v2')
-        query_embedding = np.array(embedder(query_fund_name)[0][0])
-        similarities = cosine_similarity([query_embedding], embeddings)[0]
-        top_indices = similarities.argsort()[-top_n:][::-1]
-        
-        ret_list = []
-        for i in top_indices:
-            fund_info = {
-                "fund_name": fund_data[i][0],
-                "fund_code": fund_data[i][1],
-                "cosine_similarity_score": similarities[i]
-            }
-            ret_list.append(fund_info)
-            logging.info(f"Match found: {fund_info['fund_name']} with score {fund_info['cosine_similarity_score']:.2f}")
-        
-        return ret_list
+        matrix = normalized_embeddings(embeddings)
+        index = make_index(VECTOR_INDEX, matrix, block_rows=SCORE_BLOCK_ROWS)
+    elapsed_time = (datetime.now() - start_time).total_seconds()
+    logging.info(f"Built {VECTOR_INDEX} vector index over {len(matrix)} funds in {elapsed_time:.2f} seconds.")
+    with _vector_indexes_lock:
+        _vector_indexes.clear()
+        _vector_indexes[id(embeddings)] = (embeddings, VECTOR_INDEX, index)
+    return index
+
+
+def _query_pooling(embeddings):
+    # Queries are pooled like the store they are compared with; None for caller-supplied embeddings
+    store = _store
+    if store is not None and embeddings is store.embeddings:
+        return store.pooling
+    return None
+
+
+def _embed_queries(embedder, texts, pooling):
+    if pooling is None or getattr(embedder, "pooling", pooling) == pooling:
+        return embedder.embed_batch(texts)
+    return embedder.embed_batch(texts, pooling=pooling)
+
+
+def _normalize_rows(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), np.float32(1e-12))
+
+
+def _matches(fund_data, indices, scores, tier):
+    ret_list = []
+    for i, score in zip(indices, scores):
+        fund_info = {
+            "fund_name": fund_data[i][0],
+            "fund_code": fund_data[i][1],
+            "cosine_similarity_score": float(score),
+            "match_tier": tier
+        }
+        if tier == "lexical":
+            fund_info["trigram_similarity_score"] = float(score)
+        ret_list.append(fund_info)
+        logging.debug("Match found: %s with %s score %.2f", fund_info["fund_name"], tier, fund_info["cosine_similarity_score"])
+    return ret_list
+
+
+def _exact_match(query_fund_name, fund_to_code_dict):
+    logging.debug("Exact match found for fund: %s", query_fund_name)
+    return [{
+        "fund_name": query_fund_name,
+        "fund_code": fund_to_code_dict[query_fund_name],
+        "cosine_similarity_score": 1.0,
+        "match_tier": "exact"
+    }]
+
+
+# Trigram (Dice) score at or above which the lexical tier answers without the model, for
+# names with the query's numbers, roman numerals, plan and option (see discriminating_tokens)
+LEXICAL_THRESHOLD = 0.9
+# Lexical candidates re-ranked by the model when the lexical tier is not confident
+SHORTLIST_SIZE = 64
+
+TIERS = ("exact", "normalized", "lexical", "neural")
+
+
+class MatchStats:
+    """Thread-safe count and latency of the queries answered by each matching tier."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = dict.fromkeys(TIERS, 0)
+            self._seconds = dict.fromkeys(TIERS, 0.0)
+            self._max_seconds = dict.fromkeys(TIERS, 0.0)
+
+    def record(self, tier, seconds):
+        with self._lock:
+            self._counts[tier] += 1
+            self._seconds[tier] += seconds
+            self._max_seconds[tier] = max(self._max_seconds[tier], seconds)
+
+    def snapshot(self):
+        """{tier: {"count", "share", "mean_ms", "max_ms"}} over all queries so far."""
+        with self._lock:
+            total = sum(self._counts.values())
+            return {tier: {
+                "count": self._counts[tier],
+                "share": self._counts[tier] / total if total else 0.0,
+                "mean_ms": 1000 * self._seconds[tier] / self._counts[tier] if self._counts[tier] else 0.0,
+                "max_ms": 1000 * self._max_seconds[tier],
+            } for tier in TIERS}
+
+
+match_stats = MatchStats()
+metrics.add_source("fund_matching", match_stats.snapshot)
+
+_lexical = {}
+_lexical_lock = threading.Lock()
+
+
+def lexical_index(fund_data):
+    """Return the LexicalIndex over the fund names, built once per fund_data list."""
+    cached = _lexical.get(id(fund_data))
+    if cached is not None and cached[0] is fund_data:
+        return cached[1]
+    start_time = datetime.now()
+    index = LexicalIndex([item[0] for item in fund_data])
+    elapsed_time = (datetime.now() - start_time).total_seconds()
+    logging.info(f"Built lexical index over {index.size} fund names in {elapsed_time:.2f} seconds.")
+    with _lexical_lock:
+        _lexical.clear()
+        _lexical[id(fund_data)] = (fund_data, index)
+    return index
+
+
+def find_top_fund_matches(query_fund_name, fund_data=None, embeddings=None, fund_to_code_dict=None, top_n=3):
+    """Find the top N matching mutual funds for a given query."""
+    logging.debug("Finding matches for query fund: %s", query_fund_name)
+    return find_top_fund_matches_batch([query_fund_name], fund_data, embeddings, fund_to_code_dict, top_n)[0]
+
+
+def find_top_fund_matches_batch(query_fund_names, fund_data=None, embeddings=None, fund_to_code_dict=None, top_n=3):
+    """
+    Find the top N matching mutual funds for many queries at once.
+
+    Each query goes through a cascade and stops at the first tier that answers:
+    an exact name, a normalized name (case, punctuation, "Plan"/"Option"), a
+    trigram match scoring at least LEXICAL_THRESHOLD among names with the
+    query's numbers, roman numerals, plan and option ("Nifty 50" never answers
+    for "Nifty 500", "XLI" for "XLII" nor Regular for Direct), and finally
+    the embedding model, which re-ranks only the SHORTLIST_SIZE best trigram
+    candidates. Queries reaching the model are embedded in one batched forward
+    pass. Each match keeps its "fund_name", "fund_code" and
+    "cosine_similarity_score" and adds the "match_tier" that answered; the
+    score is only a cosine on the "neural" tier: 1.0 for "exact" and
+    "normalized" matches, and the trigram Dice score (also given as
+    "trigram_similarity_score") for "lexical" ones. Returns one result list
+    per query; see match_stats for per-tier counts and latencies.
+    """
+    fund_data, embeddings, fund_to_code_dict = _resolve(fund_data, embeddings, fund_to_code_dict)
+    query_fund_names = list(query_fund_names)
+    logging.debug("Finding matches for %d query funds", len(query_fund_names))
+    lexical = lexical_index(fund_data)
+    results = [None] * len(query_fund_names)
+    neural = []
+    for position, name in enumerate(query_fund_names):
+        start = time.perf_counter()
+        if name in fund_to_code_dict:
+            results[position] = _exact_match(name, fund_to_code_dict)
+            match_stats.record("exact", time.perf_counter() - start)
+            continue
+        rows = lexical.lookup(name)[:top_n]
+        if rows:
+            results[position] = _matches(fund_data, rows, [1.0] * len(rows), "normalized")
+            match_stats.record("normalized", time.perf_counter() - start)
+            continue
+        rows, scores = lexical.shortlist(name, max(SHORTLIST_SIZE, top_n))
+        if len(scores) and scores[0] >= LEXICAL_THRESHOLD:
+            same_scheme = lexical.discriminators_match(name, rows)
+            if same_scheme.any() and scores[same_scheme][0] >= LEXICAL_THRESHOLD:
+                results[position] = _matches(fund_data, rows[same_scheme][:top_n], scores[same_scheme][:top_n],
+                                             "lexical")
+                match_stats.record("lexical", time.perf_counter() - start)
+                continue
+        # No trigram in common: the shortlist is arbitrary, so score every fund
+        neural.append((position, rows if len(scores) and scores[0] > 0 else None, time.perf_counter() - start))
+
+    if neural:
+        logging.debug("No lexical match for %d queries. Calculating similarities.", len(neural))
+        start = time.perf_counter()
+        embedder = get_embedder()
+        embed_start = metrics.clock()
+        query_embeddings = _normalize_rows(_embed_queries(embedder, [query_fund_names[p] for p, _, _ in neural],
+                                                          _query_pooling(embeddings)))
+        metrics.observe_since("embed_seconds", type(embedder).__name__, embed_start)
+        full_scan = [row for row, (_, rows, _) in enumerate(neural) if rows is None]
+        if full_scan:
+            top_indices, top_scores = vector_index(embeddings).search(query_embeddings[full_scan], top_n)
+            for row, indices, scores in zip(full_scan, top_indices, top_scores):
+                results[neural[row][0]] = _matches(fund_data, indices, scores, "neural")
+        matrix = np.asarray(embeddings)
+        for row, (position, rows, _) in enumerate(neural):
+            if rows is not None:
+                # Only the shortlisted rows are read and normalized
+                scores = _normalize_rows(matrix[rows]) @ query_embeddings[row]
+                order = top_k_indices(scores[None, :], top_n)[0]
+                results[position] = _matches(fund_data, rows[order], scores[order], "neural")
+        shared = (time.perf_counter() - start) / len(neural)
+        for _, _, lexical_seconds in neural:
+            match_stats.record("neural", lexical_seconds + shared)
+    return results
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     # Example queries
     query_fund_name = "SBI Bluechip Fund"
     top_matches = find_top_fund_matches(query_fund_name)
@@ -0,0 +1,392 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+DAYS_PER_YEAR = 365.0
+TRADING_DAYS_PER_YEAR = 252
+
+# Look-back windows of trailing_returns, in calendar days
+TRAILING_PERIODS = {"1M": 30, "3M": 91, "6M": 182, "1Y": 365, "3Y": 3 * 365, "5Y": 5 * 365}
+
+DateLike = Union[str, np.datetime64, Any]
+
+
+def to_datetime64(value: DateLike) -> np.datetime64:
+    """
+    Converts a ``dd-mm-yyyy`` string (as used by mfapi), an ISO string, a date or
+    a datetime64 to ``datetime64[D]``.
+    """
+    if isinstance(value, str) and len(value) == 10 and value[2] == "-" and value[5] == "-":
+        value = f"{value[6:]}-{value[3:5]}-{value[:2]}"
+    return np.datetime64(value, "D")
+
+
+def _asof_index(dates: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    # Index of the last date on or before each target, -1 if there is none
+    return np.searchsorted(dates, targets, side="right") - 1
+
+
+def _take(values: np.ndarray, index: np.ndarray) -> np.ndarray:
+    # values[index] along axis 0, with NaN where index is -1 (everywhere for an empty series)
+    if len(values) == 0:
+        return np.full(index.shape + values.shape[1:], np.nan)
+    taken = values[np.maximum(index, 0)].astype(np.float64, copy=True)
+    taken[index < 0] = np.nan
+    return taken
+
+
+def _union_dates(date_arrays: List[np.ndarray]) -> np.ndarray:
+    if not date_arrays:
+        return np.empty(0, dtype="datetime64[D]")
+    first = date_arrays[0]
+    if all(len(d) == len(first) and d[0] == first[0] and d[-1] == first[-1] for d in date_arrays[1:]):
+        # Funds priced on the same calendar (the common case) need no merge
+        if all(np.array_equal(d, first) for d in date_arrays[1:]):
+            return first
+    return np.unique(np.concatenate(date_arrays).view(np.int64)).view("datetime64[D]")
+
+
+class NavSeries:
+    """
+    Columnar NAV history of one fund: ``datetime64[D]`` dates and ``float64``
+    NAVs in ascending date order.
+    """
+
+    __slots__ = ("dates", "navs", "scheme_code")
+
+    def __init__(self, dates: np.ndarray, navs: np.ndarray, scheme_code: Optional[int] = None):
+        """
+        Args:
+            dates (np.ndarray): Dates, converted to ``datetime64[D]``.
+            navs (np.ndarray): NAVs, converted to ``float64``.
+            scheme_code (Optional[int]): The mutual fund code, if known.
+
+        The rows are sorted by date and duplicate dates dropped.
+        """
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        navs = np.asarray(navs, dtype=np.float64)
+        if len(dates) > 1 and not np.all(dates[1:] > dates[:-1]):
+            dates, first = np.unique(dates, return_index=True)
+            navs = navs[first]
+        self.dates = dates
+        self.navs = navs
+        self.scheme_code = scheme_code
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> "NavSeries":
+        """
+        Builds a series from a ``get_mf_price_hist`` response.
+
+        Args:
+            payload (Dict[str, Any]): ``{"meta": ..., "data": [{"date": "dd-mm-yyyy", "nav": "..."}]}``.
+
+        Returns:
+            NavSeries: The parsed history.
+        """
+        rows = payload.get("data") or []
+        dates = np.array([f"{row['date'][6:]}-{row['date'][3:5]}-{row['date'][:2]}" for row in rows],
+                         dtype="datetime64[D]")
+        navs = np.array([row["nav"] for row in rows]).astype(np.float64) if rows else np.empty(0)
+        scheme_code = (payload.get("meta") or {}).get("scheme_code")
+        return cls(dates, navs, scheme_code)
+
+    @classmethod
+    def from_records(cls, records: np.ndarray, scheme_code: Optional[int] = None) -> "NavSeries":
+        """
+        Builds a series from ``NavHistoryStore.load`` records without any parsing.
+        """
+        return cls(records["day"].astype("datetime64[D]"), records["nav"], scheme_code)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def slice(self, start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> "NavSeries":
+        """
+        Returns the rows between two dates (inclusive) with a binary search.
+        """
+        lo = 0 if start is None else np.searchsorted(self.dates, to_datetime64(start), side="left")
+        hi = len(self.dates) if end is None else np.searchsorted(self.dates, to_datetime64(end), side="right")
+        return NavSeries(self.dates[lo:hi], self.navs[lo:hi], self.scheme_code)
+
+    def nav_on(self, when: DateLike) -> float:
+        """
+        Returns the NAV on a date, or the last one before it (NaN if none).
+        """
+        return float(_take(self.navs, _asof_index(self.dates, np.array([to_datetime64(when)])))[0])
+
+    def point_to_point_return(self, start: DateLike, end: DateLike) -> float:
+        return float(point_to_point_return(self.dates, self.navs, start, end))
+
+    def cagr(self, start: DateLike, end: DateLike) -> float:
+        return float(cagr(self.dates, self.navs, start, end))
+
+    def rolling_returns(self, window_days: int, annualize: bool = False) -> np.ndarray:
+        return rolling_returns(self.dates, self.navs, window_days, annualize)
+
+    def drawdown(self) -> np.ndarray:
+        return drawdown(self.navs)
+
+    def max_drawdown(self) -> float:
+        return float(max_drawdown(self.navs))
+
+    def volatility(self, periods_per_year: int = TRADING_DAYS_PER_YEAR) -> float:
+        return float(volatility(self.navs, periods_per_year))
+
+    def sip_xirr(self, amount: float, start: DateLike, end: DateLike, day_of_month: int = 1) -> float:
+        return float(sip_xirr(self.dates, self.navs, amount, start, end, day_of_month))
+
+
+class NavMatrix:
+    """
+    NAV histories of many funds aligned on one date grid.
+
+    ``values`` has one row per date and one column per fund; each fund's last
+    known NAV is carried forward and dates before its first NAV are NaN.
+    """
+
+    __slots__ = ("dates", "values", "scheme_codes")
+
+    def __init__(self, dates: np.ndarray, values: np.ndarray, scheme_codes: Sequence[Any]):
+        self.dates = dates
+        self.values = values
+        self.scheme_codes = list(scheme_codes)
+
+    @classmethod
+    def align(cls, series: Iterable[NavSeries], dates: Optional[np.ndarray] = None) -> "NavMatrix":
+        """
+        Aligns many series on the union of their dates (or on ``dates``).
+
+        Args:
+            series (Iterable[NavSeries]): The funds.
+            dates (Optional[np.ndarray]): The date grid to align on.
+
+        Returns:
+            NavMatrix: The aligned matrix.
+        """
+        series = list(series)
+        if dates is None:
+            dates = _union_dates([s.dates for s in series])
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        values = np.empty((len(dates), len(series)), dtype=np.float64)
+        for column, s in enumerate(series):
+            values[:, column] = _take(s.navs, _asof_index(s.dates, dates))
+        return cls(dates, values, [s.scheme_code for s in series])
+
+    def slice(self, start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> "NavMatrix":
+        """
+        Returns the rows between two dates (inclusive) with a binary search.
+        """
+        lo = 0 if start is None else np.searchsorted(self.dates, to_datetime64(start), side="left")
+        hi = len(self.dates) if end is None else np.searchsorted(self.dates, to_datetime64(end), side="right")
+        return NavMatrix(self.dates[lo:hi], self.values[lo:hi], self.scheme_codes)
+
+    def trailing_returns(self, as_of: Optional[DateLike] = None,
+                         periods: Optional[Dict[str, int]] = None) -> Dict[str, np.ndarray]:
+        return trailing_returns(self.dates, self.values, as_of, periods)
+
+    def drawdown(self) -> np.ndarray:
+        return drawdown(self.values)
+
+    def max_drawdown(self) -> np.ndarray:
+        return max_drawdown(self.values)
+
+    def volatility(self, periods_per_year: int = TRADING_DAYS_PER_YEAR) -> np.ndarray:
+        return volatility(self.values, periods_per_year)
+
+    def rolling_returns(self, window_days: int, annualize: bool = False) -> np.ndarray:
+        return rolling_returns(self.dates, self.values, window_days, annualize)
+
+    def sip_xirr(self, amount: float, start: DateLike, end: DateLike, day_of_month: int = 1) -> np.ndarray:
+        return sip_xirr(self.dates, self.values, amount, start, end, day_of_month)
+
+
+def point_to_point_return(dates: np.ndarray, values: np.ndarray, start: DateLike, end: DateLike) -> np.ndarray:
+    """
+    Absolute return between the NAVs on (or last before) two dates.
+
+    ``values`` may be 1-D (one fund) or 2-D (dates x funds).
+    """
+    index = _asof_index(dates, np.array([to_datetime64(start), to_datetime64(end)]))
+    start_nav, end_nav = _take(values, index)
+    return end_nav / start_nav - 1.0
+
+
+def cagr(dates: np.ndarray, values: np.ndarray, start: DateLike, end: DateLike) -> np.ndarray:
+    """
+    Compound annual growth rate between two dates.
+    """
+    years = (to_datetime64(end) - to_datetime64(start)).astype(np.int64) / DAYS_PER_YEAR
+    return (1.0 + point_to_point_return(dates, values, start, end)) ** (1.0 / years) - 1.0
+
+
+def rolling_returns(dates: np.ndarray, values: np.ndarray, window_days: int, annualize: bool = False) -> np.ndarray:
+    """
+    Return over the trailing ``window_days`` calendar days at every date.
+
+    Dates without a full window of history are NaN.
+    """
+    index = _asof_index(dates, dates - np.timedelta64(window_days, "D"))
+    base = _take(values, index)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = values / base - 1.0
+        if annualize:
+            returns = (1.0 + returns) ** (DAYS_PER_YEAR / window_days) - 1.0
+    return returns
+
+
+def trailing_returns(dates: np.ndarray, values: np.ndarray, as_of: Optional[DateLike] = None,
+                     periods: Optional[Dict[str, int]] = None) -> Dict[str, np.ndarray]:
+    """
+    Trailing returns over several look-back windows, for every fund at once.
+
+    Windows longer than a year are annualised (CAGR), as fund factsheets do.
+
+    Args:
+        dates (np.ndarray): Ascending ``datetime64[D]`` dates.
+        values (np.ndarray): NAVs, 1-D or 2-D (dates x funds).
+        as_of (Optional[DateLike]): End date, defaults to the last date.
+        periods (Optional[Dict[str, int]]): Window names to lengths in days,
+            defaults to ``TRAILING_PERIODS``.
+
+    Returns:
+        Dict[str, np.ndarray]: Returns per window (a scalar array per fund).
+    """
+    periods = periods or TRAILING_PERIODS
+    if as_of is None and len(dates) == 0:
+        return {name: np.full(np.shape(values)[1:], np.nan) for name in periods}
+    end = dates[-1] if as_of is None else to_datetime64(as_of)
+    targets = np.array([end] + [end - np.timedelta64(days, "D") for days in periods.values()])
+    return _trailing_from_navs(_take(values, _asof_index(dates, targets)), periods)
+
+
+def _trailing_from_navs(navs: np.ndarray, periods: Dict[str, int]) -> Dict[str, np.ndarray]:
+    # navs[0] holds the end NAVs, navs[i] the NAVs i windows into periods
+    result = {}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for offset, (name, days) in enumerate(periods.items(), start=1):
+            ratio = navs[0] / navs[offset]
+            result[name] = ratio ** (DAYS_PER_YEAR / days) - 1.0 if days > DAYS_PER_YEAR else ratio - 1.0
+    return result
+
+
+def drawdown(values: np.ndarray) -> np.ndarray:
+    """
+    Decline from the running peak at every date (0 at new highs, negative below).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    peaks = np.fmax.accumulate(values, axis=0)
+    with np.errstate(invalid="ignore"):
+        return values / peaks - 1.0
+
+
+def max_drawdown(values: np.ndarray) -> np.ndarray:
+    """
+    Largest peak-to-trough decline, as a negative fraction (NaN without any NAV).
+    """
+    drawdowns = drawdown(values)
+    if len(drawdowns) == 0:
+        return np.full(drawdowns.shape[1:], np.nan)
+    return np.fmin.reduce(drawdowns, axis=0)  # nanmin, without its all-NaN warning
+
+
+def volatility(values: np.ndarray, periods_per_year: int = TRADING_DAYS_PER_YEAR) -> np.ndarray:
+    """
+    Annualised standard deviation of period log returns.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        log_returns = np.diff(np.log(values), axis=0)
+        # Same as np.nanstd(ddof=1), without its per-call masked-array overhead
+        valid = ~np.isnan(log_returns)
+        log_returns = np.where(valid, log_returns, 0.0)
+        count = valid.sum(axis=0)
+        mean = log_returns.sum(axis=0) / count
+        squares = np.where(valid, (log_returns - mean) ** 2, 0.0).sum(axis=0)
+        return np.sqrt(squares / (count - 1)) * np.sqrt(periods_per_year)
+
+
+def xirr(days: np.ndarray, cashflows: np.ndarray, guess: float = 0.1, tol: float = 1e-10,
+         max_iter: int = 100) -> np.ndarray:
+    """
+    Internal rate of return of irregular cash flows, solved with Newton's method.
+
+    Args:
+        days (np.ndarray): Day offset of each cash flow from the first one.
+        cashflows (np.ndarray): Amounts (negative = invested), 1-D or 2-D
+            (flows x funds) to solve many funds at once.
+        guess (float): Starting rate.
+        tol (float): Convergence tolerance on the rate.
+        max_iter (int): Maximum Newton iterations.
+
+    Returns:
+        np.ndarray: The annual rate per fund; NaN where it did not converge.
+    """
+    years = np.asarray(days, dtype=np.float64) / DAYS_PER_YEAR
+    cashflows = np.asarray(cashflows, dtype=np.float64)
+    if cashflows.ndim == 2:
+        years = years[:, None]
+    rate = np.full(cashflows.shape[1:], guess)
+    converged = np.zeros(rate.shape, dtype=bool)
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        for _ in range(max_iter):
+            discount = (1.0 + rate) ** -years
+            npv = np.sum(cashflows * discount, axis=0)
+            dnpv = np.sum(-years * cashflows * discount / (1.0 + rate), axis=0)
+            step = npv / dnpv
+            rate = np.where(converged, rate, np.maximum(rate - step, -0.9999))
+            converged |= np.abs(step) < tol
+            if converged.all():
+                break
+    return np.where(converged, rate, np.nan)
+
+
+def sip_dates(start: DateLike, end: DateLike, day_of_month: int = 1) -> np.ndarray:
+    """
+    Monthly instalment dates between two dates, on ``day_of_month`` (capped at 28).
+    """
+    start, end = to_datetime64(start), to_datetime64(end)
+    months = np.arange(start.astype("datetime64[M]"), end.astype("datetime64[M]") + 1)
+    dates = months.astype("datetime64[D]") + np.timedelta64(min(day_of_month, 28) - 1, "D")
+    return dates[(dates >= start) & (dates <= end)]
+
+
+def sip_xirr(dates: np.ndarray, values: np.ndarray, amount: float, start: DateLike, end: DateLike,
+             day_of_month: int = 1) -> np.ndarray:
+    """
+    XIRR of a monthly SIP of ``amount``, valued at the NAV on ``end``.
+
+    Instalments buy units at the NAV on (or last before) each instalment date;
+    instalments before a fund's first NAV buy nothing.
+    """
+    instalments = sip_dates(start, end, day_of_month)
+    if len(instalments) == 0:
+        return np.full(np.shape(values)[1:], np.nan)
+    end = to_datetime64(end)
+    navs = _take(values, _asof_index(dates, np.append(instalments, end)))
+    buy_navs, end_nav = navs[:-1], navs[-1]
+    invested = np.where(np.isnan(buy_navs), 0.0, amount)
+    units = np.nansum(invested / buy_navs, axis=0)
+    cashflows = np.concatenate([-invested, (units * end_nav)[None, ...]], axis=0)
+    days = (np.append(instalments, end) - instalments[0]).astype(np.int64)
+    return xirr(days, cashflows)
+
+
+def trailing_returns_for(series: List[NavSeries], as_of: Optional[DateLike] = None,
+                         periods: Optional[Dict[str, int]] = None) -> Dict[Any, Dict[str, float]]:
+    """
+    Trailing returns of many funds (e.g. a whole AMC), keyed by scheme code.
+    """
+    periods = periods or TRAILING_PERIODS
+    if not series:
+        return {}
+    if as_of is None:
+        as_of = max((s.dates[-1] for s in series if len(s)), default=None)
+        if as_of is None:
+            return {s.scheme_code: {name: float("nan") for name in periods} for s in series}
+    end = to_datetime64(as_of)
+    targets = np.array([end] + [end - np.timedelta64(days, "D") for days in periods.values()])
+    # Only len(periods) + 1 NAVs per fund are needed, so skip aligning whole histories
+    navs = np.column_stack([_take(s.navs, _asof_index(s.dates, targets)) for s in series])
+    returns = _trailing_from_navs(navs, periods)
+    return {s.scheme_code: {name: float(values[column]) for name, values in returns.items()}
+            for column, s in enumerate(series)}
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from pyfinmuni.utils.cache import IST, seconds_until_nav_publish
+from pyfinmuni.utils.concurrency import BatchResult, run_concurrent
+
+# One fixed-size record per NAV: days since 1970-01-01 and the NAV itself
+NAV_RECORD_DTYPE = np.dtype([("day", "<i4"), ("nav", "<f8")])
+
+EPOCH = date(1970, 1, 1)
+DATE_FORMAT = "%d-%m-%Y"
+
+
+def parse_day(date_str: str) -> int:
+    """
+    Converts an mfapi ``dd-mm-yyyy`` date to days since the epoch.
+    """
+    return (datetime.strptime(date_str, DATE_FORMAT).date() - EPOCH).days
+
+
+def format_day(day: int) -> str:
+    """
+    Converts days since the epoch back to an mfapi ``dd-mm-yyyy`` date.
+    """
+    return date.fromordinal(EPOCH.toordinal() + int(day)).strftime(DATE_FORMAT)
+
+
+def records_from_payload(payload: Dict[str, Any]) -> np.ndarray:
+    """
+    Converts the ``data`` rows of an mfapi payload into sorted, de-duplicated NAV records.
+
+    Args:
+        payload (Dict[str, Any]): A ``/mf/{code}`` or ``/mf/{code}/latest`` response.
+
+    Returns:
+        np.ndarray: Records of ``NAV_RECORD_DTYPE`` in ascending date order.
+    """
+    rows = payload.get("data") or []
+    records = np.empty(len(rows), dtype=NAV_RECORD_DTYPE)
+    n = 0
+    for row in rows:
+        try:
+            records[n] = (parse_day(row["date"]), float(row["nav"]))
+        except (KeyError, TypeError, ValueError):
+            continue
+        n += 1
+    records = records[:n]
+    _, first = np.unique(records["day"], return_index=True)
+    return records[first]
+
+
+class NavHistoryStore:
+    """
+    A persistent, append-only store of NAV histories keyed by scheme code.
+
+    Each scheme has a binary file of fixed-size (day, nav) records, which loads
+    back with a single ``np.fromfile``, and a small JSON sidecar holding the
+    scheme meta and when it was last checked against the API. The records file
+    is the only source of the latest stored date, so a crash between writing
+    the two files can neither duplicate nor skip rows.
+    """
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root (str): Directory holding the store; created if missing.
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._locks: Dict[int, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, mf_code: int) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(mf_code, threading.Lock())
+
+    def _path(self, mf_code: int, ext: str) -> str:
+        return os.path.join(self.root, f"{int(mf_code)}.{ext}")
+
+    def codes(self) -> List[int]:
+        """
+        Returns the scheme codes with stored history.
+        """
+        return sorted(int(name[:-4]) for name in os.listdir(self.root) if name.endswith(".nav"))
+
+    def load(self, mf_code: int) -> np.ndarray:
+        """
+        Loads the stored NAV records of a scheme.
+
+        Args:
+            mf_code (int): The mutual fund code.
+
+        Returns:
+            np.ndarray: Records of ``NAV_RECORD_DTYPE`` in ascending date order,
+            empty if nothing is stored.
+        """
+        path = self._path(mf_code, "nav")
+        if not os.path.exists(path):
+            return np.empty(0, dtype=NAV_RECORD_DTYPE)
+        # A torn trailing record from an interrupted append is ignored
+        return np.fromfile(path, dtype=NAV_RECORD_DTYPE, count=os.path.getsize(path) // NAV_RECORD_DTYPE.itemsize)
+
+    def load_meta(self, mf_code: int) -> Dict[str, Any]:
+        """
+        Loads the sidecar of a scheme: ``meta`` and ``checked_at``.
+        """
+        try:
+            with open(self._path(mf_code, "json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_meta(self, mf_code: int, sidecar: Dict[str, Any]) -> None:
+        path = self._path(mf_code, "json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(sidecar, f)
+        os.replace(tmp_path, path)
+
+    def last_day(self, mf_code: int) -> Optional[int]:
+        """
+        Returns the latest stored date of a scheme as days since the epoch, or None.
+
+        Only the last whole record of the history file is read.
+        """
+        itemsize = NAV_RECORD_DTYPE.itemsize
+        try:
+            with open(self._path(mf_code, "nav"), "rb") as f:
+                end = f.seek(0, os.SEEK_END) // itemsize * itemsize
+                if not end:
+                    return None
+                f.seek(end - itemsize)
+                return int(np.frombuffer(f.read(itemsize), dtype=NAV_RECORD_DTYPE)["day"][0])
+        except FileNotFoundError:
+            return None
+
+    def append(self, mf_code: int, payload: Dict[str, Any]) -> int:
+        """
+        Appends the rows of an API payload that are newer than the stored history.
+
+        Args:
+            mf_code (int): The mutual fund code.
+            payload (Dict[str, Any]): A ``/mf/{code}`` or ``/mf/{code}/latest`` response.
+
+        Returns:
+            int: The number of rows appended.
+        """
+        with self._lock(mf_code):
+            sidecar = self.load_meta(mf_code)
+            sidecar.pop("last_day", None)  # written by earlier versions, never trusted
+            last_day = self.last_day(mf_code)
+            records = records_from_payload(payload)
+            if last_day is not None:
+                records = records[records["day"] > last_day]
+            if len(records):
+                with open(self._path(mf_code, "nav"), "ab") as f:
+                    torn = f.tell() % NAV_RECORD_DTYPE.itemsize
+                    if torn:
+                        f.truncate(f.tell() - torn)
+                    f.write(records.tobytes())
+            if payload.get("meta"):
+                sidecar["meta"] = payload["meta"]
+            sidecar["checked_at"] = time.time()
+            self._save_meta(mf_code, sidecar)
+            return len(records)
+
+    def is_fresh(self, mf_code: int, now: Optional[float] = None) -> bool:
+        """
+        True if the scheme was checked after the most recent NAV publication.
+        """
+        checked_at = self.load_meta(mf_code).get("checked_at")
+        if checked_at is None:
+            return False
+        checked = datetime.fromtimestamp(checked_at, IST)
+        return (now if now is not None else time.time()) < checked_at + seconds_until_nav_publish(checked)
+
+    def refresh(self, mf_code: int, fetch_latest: Callable[[int], Dict[str, Any]],
+                fetch_history: Callable[[int], Dict[str, Any]], force: bool = False) -> int:
+        """
+        Brings the stored history of a scheme up to date.
+
+        The cheap ``/latest`` payload is checked first; the full history is only
+        downloaded when the scheme is new to the store or the API has a newer
+        NAV than the last stored one, and then only the newer rows are appended.
+
+        Args:
+            mf_code (int): The mutual fund code.
+            fetch_latest (Callable[[int], Dict[str, Any]]): Fetches ``/mf/{code}/latest``.
+            fetch_history (Callable[[int], Dict[str, Any]]): Fetches ``/mf/{code}``.
+            force (bool): Check the API even if the store is fresh.
+
+        Returns:
+            int: The number of rows appended.
+        """
+        if not force and self.is_fresh(mf_code):
+            return 0
+        last_day = self.last_day(mf_code)
+        if last_day is not None:
+            latest = fetch_latest(mf_code)
+            latest_records = records_from_payload(latest)
+            if not len(latest_records) or latest_records["day"][-1] <= last_day:
+                self.append(mf_code, latest)  # only records the check
+                return 0
+        logging.info(f"Downloading NAV history for {mf_code}")
+        return self.append(mf_code, fetch_history(mf_code))
+
+    def warm(self, mf_codes: Iterable[int], fetch_latest: Callable[[int], Dict[str, Any]],
+             fetch_history: Callable[[int], Dict[str, Any]], max_workers: int = 8) -> BatchResult:
+        """
+        Refreshes many schemes concurrently, e.g. ahead of market open.
+
+        Returns:
+            BatchResult: Rows appended keyed by code, failures in ``errors``.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="nav-store") as executor:
+            return run_concurrent(lambda code: self.refresh(code, fetch_latest, fetch_history),
+                                  mf_codes, executor)
+
+    def to_payload(self, mf_code: int) -> Dict[str, Any]:
+        """
+        Renders the stored history in the shape of the ``/mf/{code}`` response.
+
+        NAVs are formatted with five decimals, newest first, as the API does.
+
+        Args:
+            mf_code (int): The mutual fund code.
+
+        Returns:
+            Dict[str, Any]: ``{"meta": ..., "data": [...], "status": "SUCCESS"}``, or
+            {} if nothing is stored.
+        """
+        records = self.load(mf_code)
+        if not len(records):
+            return {}
+        data = [{"date": format_day(day), "nav": f"{nav:.5f}"}
+                for day, nav in zip(records["day"][::-1].tolist(), records["nav"][::-1].tolist())]
+        return {"meta": self.load_meta(mf_code).get("meta", {}), "data": data, "status": "SUCCESS"}
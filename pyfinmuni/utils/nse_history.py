@@ -0,0 +1,220 @@
+import os
+import json
+import logging
+import threading
+
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from pyfinmuni.utils.concurrency import run_concurrent
+
+# NSE rejects or truncates historical queries spanning much more than this
+DEFAULT_CHUNK_DAYS = 90
+
+NSE_DATE_FORMAT = "%d-%m-%Y"
+
+# Output column -> field of the NSE historical response
+HISTORICAL_COLUMNS = {
+    "open": "CH_OPENING_PRICE",
+    "high": "CH_TRADE_HIGH_PRICE",
+    "low": "CH_TRADE_LOW_PRICE",
+    "close": "CH_CLOSING_PRICE",
+    "last": "CH_LAST_TRADED_PRICE",
+    "prev_close": "CH_PREVIOUS_CLS_PRICE",
+    "volume": "CH_TOT_TRADED_QTY",
+    "value": "CH_TOT_TRADED_VAL",
+    "trades": "CH_TOTAL_TRADES",
+    "vwap": "VWAP",
+}
+
+Interval = Tuple[int, int]  # inclusive date ordinals
+
+
+def parse_nse_date(value: str) -> date:
+    """
+    Parses a ``dd-mm-yyyy`` date as taken by the NSE historical endpoint.
+    """
+    return datetime.strptime(value, NSE_DATE_FORMAT).date()
+
+
+def row_date(row: Dict[str, Any]) -> Optional[date]:
+    """
+    Returns the trading date of a historical row, or None if it has none.
+    """
+    try:
+        if row.get("CH_TIMESTAMP"):
+            return date.fromisoformat(row["CH_TIMESTAMP"][:10])
+        if row.get("mTIMESTAMP"):
+            return datetime.strptime(row["mTIMESTAMP"], "%d-%b-%Y").date()
+    except ValueError:
+        pass
+    return None
+
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    """
+    Merges overlapping or adjacent inclusive intervals.
+    """
+    merged: List[List[int]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def missing_intervals(start: int, end: int, covered: List[Interval]) -> List[Interval]:
+    """
+    Returns the parts of ``[start, end]`` not in the merged ``covered`` intervals.
+    """
+    gaps = []
+    cursor = start
+    for cov_start, cov_end in covered:
+        if cov_end < cursor:
+            continue
+        if cov_start > end:
+            break
+        if cov_start > cursor:
+            gaps.append((cursor, cov_start - 1))
+        cursor = max(cursor, cov_end + 1)
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def split_interval(start: int, end: int, chunk_days: int) -> List[Interval]:
+    """
+    Splits ``[start, end]`` into consecutive pieces of at most ``chunk_days`` days.
+    """
+    return [(lo, min(lo + chunk_days - 1, end)) for lo in range(start, end + 1, chunk_days)]
+
+
+class HistoricalDataEngine:
+    """
+    Fetches long NSE historical ranges as concurrent, endpoint-sized chunks.
+
+    Fetched rows and the date ranges they cover are remembered per symbol (in
+    memory, and on disk when ``cache_dir`` is set), so overlapping or extended
+    queries only fetch the missing gaps.
+    """
+
+    def __init__(self, nse, cache_dir: Optional[str] = None, chunk_days: int = DEFAULT_CHUNK_DAYS,
+                 executor: Optional[Executor] = None):
+        """
+        :param nse: the NSEApi instance used for the chunk requests
+        :param cache_dir: directory for the per-symbol range cache, None to keep it in memory only
+        :param chunk_days: the longest range requested at once
+        :param executor: pool for the chunk requests, defaults to a private one
+        """
+        self.nse = nse
+        self.cache_dir = cache_dir
+        self.chunk_days = chunk_days
+        self.executor = executor
+        self._symbols: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, code: str) -> str:
+        return os.path.join(self.cache_dir, f"{code}.json")
+
+    def _load(self, code: str) -> Dict[str, Any]:
+        state = self._symbols.get(code)
+        if state is None:
+            state = {"coverage": [], "rows": {}}
+            if self.cache_dir and os.path.exists(self._path(code)):
+                try:
+                    with open(self._path(code)) as f:
+                        saved = json.load(f)
+                    state = {"coverage": [tuple(i) for i in saved["coverage"]], "rows": saved["rows"]}
+                except (OSError, ValueError, KeyError) as e:
+                    logging.error(f"Ignoring unreadable historical cache for {code}: {e}")
+            self._symbols[code] = state
+        return state
+
+    def _save(self, code: str, state: Dict[str, Any]) -> None:
+        if not self.cache_dir:
+            return
+        path = self._path(code)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"coverage": state["coverage"], "rows": state["rows"]}, f)
+        os.replace(tmp_path, path)
+
+    def coverage(self, code: str) -> List[Tuple[date, date]]:
+        """
+        :return: the cached date ranges of a symbol
+        """
+        with self._lock:
+            return [(date.fromordinal(s), date.fromordinal(e)) for s, e in self._load(code.upper())["coverage"]]
+
+    def _fetch_chunk(self, code: str, chunk: Interval) -> Dict[str, Any]:
+        from_date = date.fromordinal(chunk[0]).strftime(NSE_DATE_FORMAT)
+        to_date = date.fromordinal(chunk[1]).strftime(NSE_DATE_FORMAT)
+        payload = self.nse.get_historical_data(code, from_date, to_date, raise_errors=True)
+        # An error page or an empty body must not mark the chunk as covered
+        if not isinstance(payload, dict) or not isinstance(payload.get("data"), list):
+            raise ValueError(f"No 'data' list in the historical response for {code} {from_date} to {to_date}")
+        return payload
+
+    def get(self, code: str, from_date: str, to_date: str) -> Dict[str, np.ndarray]:
+        """
+        Gets historical data for a stock code over any range
+        :param code: stock code
+        :param from_date: start date in dd-mm-yyyy format
+        :param to_date: end date in dd-mm-yyyy format
+        :return: dict of columns: "date" (datetime64[D]) and the HISTORICAL_COLUMNS (float64)
+        :raises: the first chunk error, after caching the chunks that succeeded
+        """
+        code = code.upper()
+        start, end = parse_nse_date(from_date).toordinal(), parse_nse_date(to_date).toordinal()
+        with self._lock:
+            gaps = missing_intervals(start, end, self._load(code)["coverage"])
+        chunks = [chunk for gap in gaps for chunk in split_interval(gap[0], gap[1], self.chunk_days)]
+
+        if chunks:
+            results = self._run(code, chunks)
+            # Today's rows can still change, so ranges reaching today are never marked complete
+            last_complete = (date.today() - timedelta(days=1)).toordinal()
+            with self._lock:
+                state = self._load(code)
+                for chunk, payload in results.items():
+                    for row in payload["data"]:
+                        day = row_date(row)
+                        if day is not None:
+                            state["rows"][day.isoformat()] = row
+                    if chunk[0] <= last_complete:
+                        state["coverage"].append((chunk[0], min(chunk[1], last_complete)))
+                state["coverage"] = merge_intervals(state["coverage"])
+                self._save(code, state)
+            if results.errors:
+                chunk, error = next(iter(results.errors.items()))
+                logging.error(f"{len(results.errors)} of {len(chunks)} chunks failed for {code}, e.g. {chunk}: {error}")
+                raise error
+
+        with self._lock:
+            rows = self._load(code)["rows"]
+            lo, hi = date.fromordinal(start).isoformat(), date.fromordinal(end).isoformat()
+            selected = sorted((day, row) for day, row in rows.items() if lo <= day <= hi)
+        return to_columns(selected)
+
+    def _run(self, code: str, chunks: List[Interval]):
+        if self.executor is not None:
+            return run_concurrent(lambda chunk: self._fetch_chunk(code, chunk), chunks, self.executor)
+        with ThreadPoolExecutor(max_workers=min(8, len(chunks)), thread_name_prefix="nse-history") as executor:
+            return run_concurrent(lambda chunk: self._fetch_chunk(code, chunk), chunks, executor)
+
+
+def to_columns(rows: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, np.ndarray]:
+    """
+    Converts date-sorted ``(iso date, row)`` pairs into columns.
+    """
+    columns = {"date": np.array([day for day, _ in rows], dtype="datetime64[D]")}
+    for name, field in HISTORICAL_COLUMNS.items():
+        values = [row.get(field) for _, row in rows]
+        columns[name] = np.array([np.nan if v is None or v == "" else v for v in values], dtype=np.float64)
+    return columns
@@ -0,0 +1,50 @@
+import time
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from pyfinmuni.utils.concurrency import BatchResult
+
+
+class IndexSnapshot:
+    """
+    One ``allIndices`` payload with its records indexed by index symbol, so
+    any number of index lookups cost a single download and a dict lookup each.
+    """
+
+    def __init__(self, payload: Dict[str, Any], fetched_at: Optional[float] = None):
+        """
+        :param payload: the allIndices JSON, records under "data"
+        :param fetched_at: when the payload was downloaded, defaults to now
+        """
+        self.payload = payload
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self.records: List[Dict[str, Any]] = [record for record in payload.get("data") or []
+                                              if record.get("indexSymbol")]
+        self.symbols: List[str] = [record["indexSymbol"] for record in self.records]
+        self.by_symbol: Dict[str, Dict[str, Any]] = {record["indexSymbol"].upper(): record for record in self.records}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, code: Any) -> bool:
+        return isinstance(code, str) and code.upper() in self.by_symbol
+
+    def get(self, code: str) -> Optional[Dict[str, Any]]:
+        """
+        :return: the record of an index symbol, or None
+        """
+        return self.by_symbol.get(code.upper())
+
+    def get_many(self, codes: Iterable[str]) -> BatchResult:
+        """
+        :return: BatchResult of records keyed by upper-cased code, unknown codes in .errors
+        """
+        result = BatchResult()
+        for code in codes:
+            code = code.upper()
+            record = self.by_symbol.get(code)
+            if record is None:
+                result.errors[code] = KeyError(f"Unknown index code {code}")
+            else:
+                result[code] = record
+        return result
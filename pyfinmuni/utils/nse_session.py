@@ -0,0 +1,164 @@
+import time
+import logging
+import weakref
+import threading
+
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+
+class NSESessionManager:
+    """
+    Owns the NSE ``requests.Session`` and keeps its cookies fresh.
+
+    NSE only answers API calls that carry the cookies set by its home page, and
+    those expire. A background thread builds a new session (pool, headers and
+    home page handshake) ahead of expiry and swaps it in with one attribute
+    assignment, so callers read the current session without locking and never
+    wait for a handshake. Only if the background refresh has been failing for
+    longer than ``max_age`` does a caller refresh inline.
+
+    The thread only holds the manager weakly: a manager (and the NSEApi owning
+    it) that is dropped without close() is still collected, and its thread exits.
+    """
+
+    def __init__(self, home_url: str, headers: Dict[str, str], verify: bool = True, refresh_interval: float = 300,
+                 pool_maxsize: int = 10, background: bool = True, retry_interval: float = 10,
+                 max_age: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        """
+        :param home_url: page whose response sets the session cookies
+        :param headers: headers sent with every request
+        :param verify: verify TLS certificates
+        :param refresh_interval: seconds a session is used before it is replaced
+        :param pool_maxsize: connections kept per host, at least the number of concurrent callers
+        :param background: refresh from a daemon thread; otherwise callers trigger refreshes inline
+        :param retry_interval: seconds between background attempts after a failed refresh
+        :param max_age: age after which callers stop using a stale session and refresh inline,
+                        defaults to twice refresh_interval
+        :param clock: monotonic clock, overridable for tests
+        :raises: RequestException if the first handshake fails
+        """
+        self.home_url = home_url
+        self.headers = dict(headers)
+        self.verify = verify
+        self.refresh_interval = refresh_interval
+        self.pool_maxsize = pool_maxsize
+        self.retry_interval = retry_interval
+        self.max_age = max_age if max_age is not None else 2 * refresh_interval
+        self.clock = clock
+        self.refreshes = 0
+        self.failures = 0
+        self._refresh_lock = threading.Lock()
+        self._previous: Optional[requests.Session] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._state: Tuple[requests.Session, float] = (self._new_session(), self.clock())
+        self._thread: Optional[threading.Thread] = None
+        if background:
+            self._thread = threading.Thread(target=_refresh_loop, args=(weakref.ref(self), self._stop, self._wake),
+                                            name="nse-session-refresh", daemon=True)
+            self._thread.start()
+            weakref.finalize(self, _stop_refresh_loop, self._stop, self._wake)
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        session.verify = self.verify
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update(self.headers)
+        try:
+            session.get(self.home_url)
+        except requests.exceptions.RequestException as e:
+            session.close()
+            logging.error(f"Error creating session: {e}")
+            raise
+        return session
+
+    def age(self) -> float:
+        """
+        :return: seconds since the current session was created
+        """
+        return self.clock() - self._state[1]
+
+    def session(self) -> requests.Session:
+        """
+        Returns the current session; lock-free unless it is older than max_age
+        :return: requests.Session
+        """
+        session, created_at = self._state
+        age = self.clock() - created_at
+        if age < self.refresh_interval:
+            return session
+        if self._thread is not None and age < self.max_age:
+            # Keep using the old cookies while the background thread renews them
+            self._wake.set()
+            return session
+        return self.refresh(if_older_than=self.refresh_interval)
+
+    def refresh(self, if_older_than: Optional[float] = None) -> requests.Session:
+        """
+        Builds a new session and swaps it in
+        :param if_older_than: skip the refresh if another thread already renewed the session
+        :return: the current session
+        :raises: RequestException if the handshake fails
+        """
+        with self._refresh_lock:
+            if if_older_than is not None and self.age() < if_older_than:
+                return self._state[0]
+            try:
+                session = self._new_session()
+            except requests.exceptions.RequestException:
+                self.failures += 1
+                raise
+            old = self._state[0]
+            self._state = (session, self.clock())
+            self.refreshes += 1
+            # Requests may still be running on the old session; close it one rotation later
+            if self._previous is not None:
+                self._previous.close()
+            self._previous = old
+            return session
+
+    def close(self) -> None:
+        """
+        Stops the refresh thread and closes the sessions
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        for session in (self._state[0], self._previous):
+            if session is not None:
+                session.close()
+
+
+def _refresh_loop(manager_ref: "weakref.ref[NSESessionManager]", stop: threading.Event, wake: threading.Event) -> None:
+    # Holds a strong reference only while working, never while waiting
+    while not stop.is_set():
+        manager = manager_ref()
+        if manager is None:
+            return
+        delay = max(manager.refresh_interval * 0.8 - manager.age(), 0)
+        del manager
+        wake.wait(delay)
+        wake.clear()
+        manager = manager_ref()
+        if stop.is_set() or manager is None:
+            return
+        if manager.age() < manager.refresh_interval * 0.8:
+            continue
+        try:
+            manager.refresh()
+        except requests.exceptions.RequestException:
+            retry_interval = manager.retry_interval
+            del manager
+            stop.wait(retry_interval)
+
+
+def _stop_refresh_loop(stop: threading.Event, wake: threading.Event) -> None:
+    stop.set()
+    wake.set()
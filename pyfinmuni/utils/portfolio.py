@@ -0,0 +1,379 @@
+import time
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pyfinmuni.utils.concurrency import run_concurrent
+from pyfinmuni.utils.scheme_registry import normalise_code
+
+EQUITY = "equity"
+MUTUAL_FUND = "mf"
+
+# An instrument is (EQUITY, "RELIANCE") or (MUTUAL_FUND, 125497)
+Instrument = Tuple[str, Any]
+
+
+class PriceSnapshot:
+    """
+    Prices of distinct instruments at one point in time, stored column-wise.
+
+    ``price`` is the last traded price or latest NAV and ``previous`` the
+    previous close or NAV (NaN when unknown), row-aligned with ``instruments``.
+    Instruments that could not be priced are left out and listed in ``errors``.
+    """
+
+    def __init__(self, instruments: Sequence[Instrument], price: Sequence[float], previous: Sequence[float],
+                 errors: Optional[Mapping[Instrument, BaseException]] = None, taken_at: Optional[float] = None):
+        """
+        Args:
+            instruments (Sequence[Instrument]): Distinct instruments.
+            price (Sequence[float]): Current price of each instrument.
+            previous (Sequence[float]): Previous close or NAV of each instrument.
+            errors (Optional[Mapping[Instrument, BaseException]]): Instruments that could not be priced.
+            taken_at (Optional[float]): When the prices were fetched, in epoch seconds; defaults to now.
+        """
+        self.instruments = list(instruments)
+        self.price = np.asarray(price, dtype=np.float64)
+        self.previous = np.asarray(previous, dtype=np.float64)
+        self.errors: Dict[Instrument, BaseException] = dict(errors or {})
+        self.taken_at = time.time() if taken_at is None else taken_at
+        self._rows = {instrument: row for row, instrument in enumerate(self.instruments)}
+
+    def __len__(self) -> int:
+        return len(self.instruments)
+
+    def __contains__(self, instrument: Instrument) -> bool:
+        return instrument in self._rows
+
+    def rows(self, instruments: Iterable[Optional[Instrument]]) -> np.ndarray:
+        """
+        Looks up the rows of many instruments.
+
+        Args:
+            instruments (Iterable[Optional[Instrument]]): Instruments, None allowed.
+
+        Returns:
+            np.ndarray: The row of each instrument, -1 where it has no price.
+        """
+        rows = self._rows
+        return np.fromiter((rows.get(instrument, -1) for instrument in instruments), dtype=np.int64)
+
+
+class PortfolioValuation:
+    """
+    Valuation of many portfolios against one PriceSnapshot.
+
+    Per-holding columns (``holding_portfolio``, ``quantity``, ``price``,
+    ``value``, ...) are aligned with ``instruments``; per-portfolio totals
+    (``market_value``, ``day_change``, ``cost``, ``pnl``, ...) are aligned
+    with ``portfolio_ids``. Holdings without a price add nothing to the
+    totals and are listed in ``errors``; holdings without a previous price
+    add nothing to the day change, and ``day_change_coverage`` is the share
+    of each portfolio's market value whose day change is known.
+    """
+
+    def __init__(self, portfolio_ids: List[Hashable], holding_portfolio: np.ndarray,
+                 instruments: List[Optional[Instrument]], quantity: np.ndarray, cost: np.ndarray,
+                 snapshot: PriceSnapshot, errors: Dict[Tuple[Hashable, int], BaseException]):
+        self.portfolio_ids = portfolio_ids
+        self.snapshot = snapshot
+        self.holding_portfolio = holding_portfolio
+        self.instruments = instruments
+        self.quantity = quantity
+        self.cost = cost
+        self.errors = errors
+        self._index = {portfolio_id: i for i, portfolio_id in enumerate(portfolio_ids)}
+
+        rows = snapshot.rows(instruments)
+        priced = rows >= 0
+        safe_rows = np.where(priced, rows, 0)
+        nan = np.full(len(rows), np.nan)
+        self.price = np.where(priced, snapshot.price[safe_rows], nan) if len(snapshot) else nan
+        previous = np.where(priced, snapshot.previous[safe_rows], nan) if len(snapshot) else nan
+        self.value = quantity * self.price
+        self.previous_value = quantity * previous
+        self.day_change = self.value - self.previous_value
+        self.pnl = self.value - cost
+
+        for position in np.flatnonzero(~priced):
+            key = (portfolio_ids[holding_portfolio[position]], self._holding_number(position))
+            if key not in errors:
+                instrument = instruments[position]
+                errors[key] = snapshot.errors.get(instrument) or LookupError(f"No price for {instrument}")
+
+        has_change = priced & ~np.isnan(previous)
+        has_cost = priced & ~np.isnan(cost)
+        self.market_value = self._total(self.value, priced)
+        self.previous_market_value = self._total(self.previous_value, has_change)
+        self.total_day_change = self._total(self.day_change, has_change)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.day_change_coverage = self._total(self.value, has_change) / self.market_value
+        self.total_cost = self._total(cost, has_cost)
+        self.total_pnl = self._total(self.pnl, has_cost)
+
+    def _total(self, column: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        return np.bincount(self.holding_portfolio, weights=np.where(mask, column, 0.0),
+                           minlength=len(self.portfolio_ids))
+
+    def _holding_number(self, position: int) -> int:
+        # Position of the holding within its own portfolio, as given by the caller
+        portfolio = self.holding_portfolio[position]
+        return int(position - np.searchsorted(self.holding_portfolio, portfolio))
+
+    def __len__(self) -> int:
+        return len(self.portfolio_ids)
+
+    def __getitem__(self, portfolio_id: Hashable) -> Dict[str, Any]:
+        """
+        Summarises one portfolio.
+
+        Args:
+            portfolio_id (Hashable): The portfolio.
+
+        Returns:
+            Dict[str, Any]: ``market_value``, ``day_change``, ``day_change_pct``,
+            ``day_change_coverage``, ``cost``, ``pnl``, ``pnl_pct`` and a ``holdings`` list;
+            percentages and the coverage are None when undefined.
+        """
+        i = self._index[portfolio_id]
+        start, end = np.searchsorted(self.holding_portfolio, [i, i + 1])
+        holdings = [{"instrument": self.instruments[position],
+                     "quantity": float(self.quantity[position]),
+                     "price": _optional(self.price[position]),
+                     "value": _optional(self.value[position]),
+                     "day_change": _optional(self.day_change[position]),
+                     "pnl": _optional(self.pnl[position])}
+                    for position in range(start, end)]
+        previous, cost = self.previous_market_value[i], self.total_cost[i]
+        return {
+            "market_value": float(self.market_value[i]),
+            "day_change": float(self.total_day_change[i]),
+            "day_change_pct": float(self.total_day_change[i] / previous * 100) if previous else None,
+            "day_change_coverage": _optional(self.day_change_coverage[i]),
+            "cost": float(cost),
+            "pnl": float(self.total_pnl[i]),
+            "pnl_pct": float(self.total_pnl[i] / cost * 100) if cost else None,
+            "holdings": holdings,
+        }
+
+
+def _optional(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+class PortfolioValuer:
+    """
+    Values portfolios of NSE equities and mutual funds.
+
+    Holdings are resolved to distinct instruments and each instrument is
+    priced once, concurrently, through the clients' cached methods, so
+    identical requests from other callers are coalesced by their shared
+    single flight. Every portfolio is then valued with array arithmetic
+    against that one snapshot: a batch costs one request per distinct
+    instrument, however many holdings refer to it.
+    """
+
+    def __init__(self, nse: Any = None, mf: Any = None, max_workers: int = 16,
+                 mf_day_change: Optional[bool] = None):
+        """
+        Args:
+            nse (Optional[NSEApi]): Client pricing equities; None if only mutual funds are valued.
+            mf (Optional[IndianMFApi]): Client pricing mutual funds; None if only equities are valued.
+            max_workers (int): Number of concurrent price requests.
+            mf_day_change (Optional[bool]): Read NAV series to get the previous NAV of each
+                fund; otherwise the day change of a fund is only known when the shared
+                data plane published its previous NAV (see ``day_change_coverage``).
+                Defaults to on when the mutual fund client keeps a NavHistoryStore,
+                whose series cost no download beyond the latest NAV check.
+        """
+        self.nse = nse
+        self.mf = mf
+        self.max_workers = max_workers
+        if mf_day_change is None:
+            mf_day_change = getattr(mf, "history_store", None) is not None
+        self.mf_day_change = mf_day_change
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="portfolio")
+        return self._executor
+
+    def close(self) -> None:
+        """
+        Shuts down the request threads.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def resolve(self, holding: Mapping[str, Any]) -> Instrument:
+        """
+        Resolves a holding to the instrument to price.
+
+        Args:
+            holding (Mapping[str, Any]): One of ``scheme_code``, ``symbol`` or ``isin``
+                (an NSE equity ISIN or a mutual fund ISIN).
+
+        Returns:
+            Instrument: ``(EQUITY, symbol)`` or ``(MUTUAL_FUND, scheme_code)``.
+
+        Raises:
+            ValueError: The holding names no known instrument.
+        """
+        if holding.get("scheme_code") is not None:
+            code = normalise_code(holding["scheme_code"])
+            if code is None:
+                raise ValueError(f"Invalid scheme code {holding['scheme_code']!r}")
+            return MUTUAL_FUND, code
+        if holding.get("symbol"):
+            return EQUITY, str(holding["symbol"]).strip().upper()
+        isin = str(holding.get("isin") or "").strip().upper()
+        if not isin:
+            raise ValueError("A holding needs a scheme_code, symbol or isin")
+        if isin.startswith("INF") and self.mf is not None:
+            scheme = self.mf.registry.get_by_isin(isin)
+            if scheme is not None:
+                return MUTUAL_FUND, scheme["schemeCode"]
+        elif self.nse is not None:
+            listing = self.nse.symbol_master.table().get_by_isin(isin)
+            if listing is not None:
+                return EQUITY, listing["symbol"]
+        raise ValueError(f"Unknown ISIN {isin}")
+
+    def _price_equity(self, symbol: str) -> Tuple[float, float]:
+        quote = self.nse.get_quote(symbol, raise_errors=True)
+        if not quote or quote.get("lastPrice") is None:
+            raise LookupError(f"No quote for {symbol}")
+        previous = quote.get("previousClose")
+        return float(quote["lastPrice"]), float(previous) if previous is not None else np.nan
+
+    def _price_fund(self, mf_code: int) -> Tuple[float, float]:
+        if self.mf_day_change:
+            navs = self.mf.get_mf_nav_series(mf_code).navs
+            if not len(navs):
+                raise LookupError(f"No NAV for scheme {mf_code}")
+            return float(navs[-1]), float(navs[-2]) if len(navs) > 1 else np.nan
+        data = self.mf.get_mf_price_latest(mf_code).get("data")
+        if not data:
+            raise LookupError(f"No NAV for scheme {mf_code}")
+        return float(data[0]["nav"]), np.nan
+
+    def _price(self, instrument: Instrument) -> Tuple[float, float]:
+        kind, key = instrument
+        client = self.nse if kind == EQUITY else self.mf
+        if client is None:
+            raise LookupError(f"No client to price {kind} instruments")
+        return self._price_equity(key) if kind == EQUITY else self._price_fund(key)
+
+    def fetch_prices(self, instruments: Iterable[Instrument]) -> PriceSnapshot:
+        """
+        Prices distinct instruments concurrently.
+
+        Funds with a NAV in the mutual fund client's shared data plane are read
+        from it in one vectorised lookup instead of being requested.
+
+        Args:
+            instruments (Iterable[Instrument]): Instruments; duplicates are priced once.
+
+        Returns:
+            PriceSnapshot: The prices, failures in ``errors``.
+        """
+        pending = list(dict.fromkeys(instruments))
+        found, price, previous = [], [], []
+
+        table = None
+        plane = getattr(self.mf, "shared_plane", None)
+        if plane is not None and not self.mf_day_change:
+            table = plane.navs()
+        if table is not None:
+            funds = [instrument for instrument in pending if instrument[0] == MUTUAL_FUND]
+            rows = table.rows([code for _, code in funds])
+            hits = rows >= 0
+            found.extend(instrument for instrument, hit in zip(funds, hits) if hit)
+            price.extend(table.nav[rows[hits]].tolist())
+            previous.extend(table.prev_nav[rows[hits]].tolist())
+            shared = set(found)
+            pending = [instrument for instrument in pending if instrument not in shared]
+
+        fetched = run_concurrent(self._price, pending, self._get_executor()) if pending else None
+        if fetched is not None:
+            for instrument in pending:
+                if instrument in fetched:
+                    found.append(instrument)
+                    price.append(fetched[instrument][0])
+                    previous.append(fetched[instrument][1])
+            for instrument, error in fetched.errors.items():
+                logging.error(f"Could not price {instrument}: {error}")
+        return PriceSnapshot(found, price, previous, fetched.errors if fetched is not None else None)
+
+    def value_many(self, portfolios: Mapping[Hashable, Iterable[Mapping[str, Any]]],
+                   snapshot: Optional[PriceSnapshot] = None) -> PortfolioValuation:
+        """
+        Values many portfolios at once.
+
+        Args:
+            portfolios (Mapping[Hashable, Iterable[Mapping[str, Any]]]): Holdings keyed by
+                portfolio id. A holding names its instrument (see ``resolve``) and has a
+                ``quantity`` and, optionally, an ``avg_cost`` per unit for the P&L.
+            snapshot (Optional[PriceSnapshot]): Prices to value against, e.g. one shared
+                by many batches; instruments missing from it are reported, not fetched.
+                Fetched when omitted.
+
+        Returns:
+            PortfolioValuation: Per-holding and per-portfolio values.
+        """
+        portfolio_ids = list(portfolios)
+        holding_portfolio, instruments, quantity, cost = [], [], [], []
+        errors: Dict[Tuple[Hashable, int], BaseException] = {}
+        resolved: Dict[Tuple, Any] = {}
+
+        for i, portfolio_id in enumerate(portfolio_ids):
+            for number, holding in enumerate(portfolios[portfolio_id]):
+                key = (holding.get("scheme_code"), holding.get("symbol"), holding.get("isin"))
+                instrument = resolved.get(key)
+                if instrument is None:
+                    try:
+                        instrument = self.resolve(holding)
+                    except ValueError as e:
+                        instrument = e
+                    resolved[key] = instrument
+                if isinstance(instrument, ValueError):
+                    errors[(portfolio_id, number)] = instrument
+                    instrument = None
+                units = float(holding.get("quantity") or 0)
+                avg_cost = holding.get("avg_cost")
+                holding_portfolio.append(i)
+                instruments.append(instrument)
+                quantity.append(units)
+                cost.append(units * float(avg_cost) if avg_cost is not None else np.nan)
+
+        if snapshot is None:
+            snapshot = self.fetch_prices(instrument for instrument in instruments if instrument is not None)
+        return PortfolioValuation(portfolio_ids, np.asarray(holding_portfolio, dtype=np.int64), instruments,
+                                  np.asarray(quantity, dtype=np.float64), np.asarray(cost, dtype=np.float64),
+                                  snapshot, errors)
+
+    def value(self, holdings: Iterable[Mapping[str, Any]], snapshot: Optional[PriceSnapshot] = None) -> Dict[str, Any]:
+        """
+        Values one portfolio.
+
+        Args:
+            holdings (Iterable[Mapping[str, Any]]): The holdings, as for ``value_many``.
+            snapshot (Optional[PriceSnapshot]): Prices to value against; fetched when omitted.
+
+        Returns:
+            Dict[str, Any]: The summary of ``PortfolioValuation.__getitem__`` plus the
+            ``errors`` of holdings that could not be valued, keyed by position.
+        """
+        valuation = self.value_many({None: holdings}, snapshot)
+        summary = valuation[None]
+        summary["errors"] = {number: error for (_, number), error in valuation.errors.items()}
+        return summary
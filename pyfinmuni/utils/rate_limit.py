@@ -0,0 +1,365 @@
+import time
+import random
+import logging
+import threading
+
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from pyfinmuni.utils.metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """
+    Raised without sending the request while a host's circuit breaker is open
+    """
+
+
+class HostPolicy:
+    """
+    Rate limiting, retry and circuit breaker settings of one host
+    """
+
+    def __init__(self, rate: float = 20, burst: int = 20, min_rate: float = 0.5, max_rate: float = 200,
+                 increase: float = 0.5, decrease: float = 0.5, latency_target: Optional[float] = 5.0,
+                 max_attempts: int = 3, backoff: float = 0.5, max_backoff: float = 30.0,
+                 throttle_statuses: Iterable[int] = (429,), retry_statuses: Iterable[int] = (500, 502, 503, 504),
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        :param rate: starting requests per second
+        :param burst: requests that may be sent at once after an idle period
+        :param min_rate: the rate never drops below this
+        :param max_rate: the rate never grows beyond this
+        :param increase: requests per second added after each successful request
+        :param decrease: factor applied to the rate when the host throttles us
+        :param latency_target: responses slower than this many seconds ease the rate off a little, None to ignore latency
+        :param max_attempts: attempts per request, including the first
+        :param backoff: base delay in seconds of the exponential backoff between attempts
+        :param max_backoff: upper bound of one backoff delay
+        :param throttle_statuses: statuses meaning "slow down"; they cut the rate and are retried
+        :param retry_statuses: statuses meaning the host is failing; they count towards the breaker and are retried
+        :param failure_threshold: consecutive failures that open the circuit breaker
+        :param reset_timeout: seconds the breaker stays open before letting a probe request through
+        """
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.throttle_statuses: FrozenSet[int] = frozenset(throttle_statuses)
+        self.retry_statuses: FrozenSet[int] = frozenset(retry_statuses)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+    def replace(self, **changes) -> "HostPolicy":
+        """
+        :return: a copy with some settings changed
+        """
+        settings = dict(vars(self))
+        settings.update(changes)
+        return HostPolicy(**settings)
+
+
+class TokenBucket:
+    """
+    Token bucket whose rate adapts to the host: additive increase after each
+    success, multiplicative decrease when throttled or slow (AIMD, as TCP
+    congestion control), so it settles just under the highest rate the host
+    sustains.
+    """
+
+    def __init__(self, policy: HostPolicy, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.policy = policy
+        self.clock = clock
+        self.sleep = sleep
+        self.rate = policy.rate
+        self.tokens = float(policy.burst)
+        self.paused_until = 0.0
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.policy.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """
+        Waits for a token
+        :return: seconds waited
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._refill(now)
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                else:
+                    delay = (1 - self.tokens) / self.rate
+            self.sleep(delay)
+            waited += delay
+
+    def on_success(self, latency: Optional[float] = None) -> None:
+        policy = self.policy
+        with self._lock:
+            if latency is not None and policy.latency_target is not None and latency > policy.latency_target:
+                self.rate = max(policy.min_rate, self.rate * 0.9)
+            else:
+                self.rate = min(policy.max_rate, self.rate + policy.increase)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """
+        Cuts the rate, and holds every caller back for retry_after seconds if the host asked so
+        """
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            self.rate = max(self.policy.min_rate, self.rate * self.policy.decrease)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and fails requests
+    fast for ``reset_timeout`` seconds; then lets one probe through, closing
+    again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opens += 1
+                self.state = OPEN
+                self.opened_at = self.clock()
+                self._probing = False
+
+    def release(self) -> None:
+        """
+        Ends a probe that was neither a success nor a failure (e.g. throttled), so another may run
+        """
+        with self._lock:
+            self._probing = False
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None  # HTTP-date form; fall back to the backoff
+
+
+class HostLimiter:
+    """
+    The token bucket, circuit breaker and retry loop of one host
+    """
+
+    def __init__(self, host: str, policy: HostPolicy, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.host = host
+        self.policy = policy
+        self.clock = clock
+        self.sleep = sleep
+        self.bucket = TokenBucket(policy, clock, sleep)
+        self.breaker = CircuitBreaker(policy.failure_threshold, policy.reset_timeout, clock)
+        self.counts = {"requests": 0, "throttled": 0, "failures": 0, "retries": 0, "rejected": 0, "waited": 0.0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counts[name] += value
+
+    def backoff_delay(self, attempt: int) -> float:
+        """
+        :return: exponential backoff with full jitter for the given attempt (0-based)
+        """
+        delay = min(self.policy.max_backoff, self.policy.backoff * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    def call(self, send: Callable[[], requests.Response], endpoint: Optional[str] = None,
+             before_retry: Optional[Callable[[requests.Response], None]] = None) -> requests.Response:
+        """
+        Sends a request through the limiter, retrying throttled and failed attempts
+        :param send: performs one attempt and returns its response
+        :param endpoint: label of retries in the metrics, defaults to the host
+        :param before_retry: called with a throttled or failed response before it is retried,
+                             e.g. to renew the session the next attempt is sent on
+        :return: the first successful response, or the last one once attempts run out
+        :raises: CircuitOpenError while the host is unhealthy; the last RequestException of connection failures
+        """
+        policy = self.policy
+        for attempt in range(policy.max_attempts):
+            last_attempt = attempt == policy.max_attempts - 1
+            if not self.breaker.allow():
+                self._count("rejected")
+                raise CircuitOpenError(f"Circuit open for {self.host}; failing fast")
+            waited = self.bucket.acquire()
+            if waited:
+                self._count("waited", waited)
+            self._count("requests")
+            start = self.clock()
+            try:
+                response = send()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._count("failures")
+                self.breaker.record_failure()
+                if last_attempt:
+                    raise
+                delay = self.backoff_delay(attempt)
+            except Exception:
+                self.breaker.release()
+                raise
+            else:
+                status = response.status_code
+                if status in policy.throttle_statuses:
+                    self._count("throttled")
+                    retry_after = _retry_after(response)
+                    self.bucket.on_throttle(retry_after)
+                    self.breaker.release()
+                    delay = retry_after if retry_after is not None else self.backoff_delay(attempt)
+                elif status in policy.retry_statuses:
+                    self._count("failures")
+                    self.breaker.record_failure()
+                    delay = self.backoff_delay(attempt)
+                else:
+                    self.breaker.record_success()
+                    self.bucket.on_success(self.clock() - start)
+                    return response
+                if last_attempt or delay > policy.max_backoff:
+                    return response
+                response.close()
+                if before_retry is not None:
+                    before_retry(response)
+            self._count("retries")
+            metrics.inc("retries", endpoint or self.host)
+            logging.info(f"Retrying request to {self.host} in {delay:.2f}s (attempt {attempt + 2} of {policy.max_attempts})")
+            self.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self.counts)
+        counts.update(rate=self.bucket.rate, breaker=self.breaker.state, breaker_opens=self.breaker.opens)
+        return counts
+
+
+# Hosts known to throttle: NSE answers 403 as well as 429 when it wants us to back off
+DEFAULT_POLICIES = {
+    "www.nseindia.com": HostPolicy(rate=3, burst=5, max_rate=10, throttle_statuses=(403, 429)),
+    "nseindia.com": HostPolicy(rate=3, burst=5, max_rate=10, throttle_statuses=(403, 429)),
+    "nsearchives.nseindia.com": HostPolicy(rate=3, burst=5, max_rate=10, throttle_statuses=(403, 429)),
+    "api.mfapi.in": HostPolicy(rate=20, burst=40, max_rate=100),
+}
+
+
+class RateLimits:
+    """
+    Per-host limiters, created on first use from the host's policy. One
+    instance is shared by every client in the process (``default_rate_limits``),
+    so all of them together stay within what each host sustains.
+    """
+
+    def __init__(self, policies: Optional[Dict[str, HostPolicy]] = None, default_policy: Optional[HostPolicy] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        """
+        :param policies: policy per host name, defaults to DEFAULT_POLICIES
+        :param default_policy: policy of every other host
+        :param clock: monotonic clock, overridable for tests
+        :param sleep: sleep function, overridable for tests
+        """
+        self.policies = dict(DEFAULT_POLICIES if policies is None else policies)
+        self.default_policy = default_policy or HostPolicy()
+        self.clock = clock
+        self.sleep = sleep
+        self._limiters: Dict[str, HostLimiter] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, host: str, policy: Optional[HostPolicy] = None, **settings) -> HostPolicy:
+        """
+        Sets the policy of a host; its limiter restarts from the new settings
+        :param host: host name, e.g. "www.nseindia.com"
+        :param policy: the full policy, or
+        :param settings: HostPolicy settings to change on the current policy
+        :return: the new policy
+        """
+        with self._lock:
+            policy = policy or self.policies.get(host, self.default_policy).replace(**settings)
+            self.policies[host] = policy
+            self._limiters.pop(host, None)
+        return policy
+
+    def limiter(self, host: str) -> HostLimiter:
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(host)
+                if limiter is None:
+                    limiter = self._limiters[host] = HostLimiter(host, self.policies.get(host, self.default_policy),
+                                                                 self.clock, self.sleep)
+        return limiter
+
+    def call(self, url: str, send: Callable[[], requests.Response], endpoint: Optional[str] = None,
+             before_retry: Optional[Callable[[requests.Response], None]] = None) -> requests.Response:
+        """
+        Sends a request through the limiter of the URL's host; see HostLimiter.call
+        """
+        return self.limiter(urlsplit(url).netloc).call(send, endpoint, before_retry)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        :return: per-host request, throttle, failure, retry and rejection counts, current rate and breaker state
+        """
+        return {host: limiter.stats() for host, limiter in list(self._limiters.items())}
+
+
+# Shared by all clients, so instances together respect each host's limits
+default_rate_limits = RateLimits()
+metrics.add_source("rate_limits", default_rate_limits.stats)
@@ -0,0 +1,735 @@
+import os
+import sys
+import json
+import mmap
+import time
+import bisect
+import struct
+import logging
+import argparse
+import threading
+
+from collections.abc import Mapping as MappingABC, Sequence as SequenceABC
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from pyfinmuni.utils.cache import seconds_until_nav_publish
+from pyfinmuni.utils.concurrency import run_concurrent
+from pyfinmuni.utils.embedding_store import EmbeddingStore, unit_rows
+from pyfinmuni.utils.json_codec import loads
+from pyfinmuni.utils.metrics import metrics
+from pyfinmuni.utils.nav_store import parse_day
+from pyfinmuni.utils.scheme_registry import isin_issuer, normalise_code
+
+try:
+    import _posixshmem
+except ImportError:  # Windows has no POSIX shared memory names to map read-only
+    _posixshmem = None
+
+REGISTRY = "registry"
+EMBEDDINGS = "embeddings"
+NAVS = "navs"
+DATASETS = (REGISTRY, EMBEDDINGS, NAVS)
+
+DEFAULT_NAMESPACE = "pyfinmuni"
+# Versions of each dataset kept next to the live one, for readers still attaching to them
+DEFAULT_KEEP_VERSIONS = 2
+CONTROL_SIZE = 64
+ALIGNMENT = 64
+
+# Namespace of the plane every client attaches to by default, None for no shared plane
+SHARED_PLANE = os.environ.get("pyfinmuni_shared_plane")
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _segment_name(namespace: str, dataset: str, generation: int) -> str:
+    return f"{namespace}.{dataset}.{generation}"
+
+
+def _require_posix() -> None:
+    if _posixshmem is None:
+        raise RuntimeError("The shared data plane needs POSIX shared memory")
+
+
+def _untrack(shm: shared_memory.SharedMemory) -> None:
+    # Segments outlive the process that created them, like files, until they are
+    # unlinked; the resource tracker would otherwise remove them when it exits
+    resource_tracker.unregister(shm._name, "shared_memory")
+
+
+def _unlink(name: str) -> None:
+    try:
+        _posixshmem.shm_unlink("/" + name)
+    except FileNotFoundError:
+        pass
+
+
+def _map_readonly(name: str) -> mmap.mmap:
+    fd = _posixshmem.shm_open("/" + name, os.O_RDONLY, mode=0o600)
+    try:
+        return mmap.mmap(fd, os.fstat(fd).st_size, prot=mmap.PROT_READ)
+    finally:
+        os.close(fd)
+
+
+def encode_strings(values: Iterable[Optional[str]]) -> Dict[str, np.ndarray]:
+    """
+    Packs strings into one UTF-8 buffer with offsets, the layout of a StringColumn
+    :param values: strings, None allowed
+    :return: the ``data``, ``offsets`` and ``null`` arrays
+    """
+    values = list(values)
+    encoded = [b"" if value is None else value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+    return {
+        "data": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "offsets": offsets,
+        "null": np.fromiter((value is None for value in values), dtype=np.bool_, count=len(values)),
+    }
+
+
+class StringColumn(SequenceABC):
+    """
+    Read-only sequence of strings decoded on access from a packed UTF-8 buffer
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray, null: np.ndarray):
+        self._data = data
+        self._offsets = offsets
+        self._null = null
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray], prefix: str) -> "StringColumn":
+        return cls(arrays[f"{prefix}.data"], arrays[f"{prefix}.offsets"], arrays[f"{prefix}.null"])
+
+    def __len__(self) -> int:
+        return len(self._null)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("StringColumn index out of range")
+        if self._null[index]:
+            return None
+        return self._data[self._offsets[index]:self._offsets[index + 1]].tobytes().decode("utf-8")
+
+
+def _string_arrays(prefix: str, values: Iterable[Optional[str]]) -> Dict[str, np.ndarray]:
+    return {f"{prefix}.{key}": array for key, array in encode_strings(values).items()}
+
+
+class _Segment:
+    """
+    One published dataset version, mapped read-only: a JSON header followed by aligned arrays
+    """
+
+    def __init__(self, name: str):
+        buffer = _map_readonly(name)
+        header_size = struct.unpack_from("<Q", buffer, 0)[0]
+        self.header = json.loads(buffer[8:8 + header_size])
+        start = _align(8 + header_size)
+        self.arrays = {}
+        for key, spec in self.header["arrays"].items():
+            shape = tuple(spec["shape"])
+            count = int(np.prod(shape, dtype=np.int64))
+            # The arrays keep the mapping alive; it is unmapped once the last one is gone
+            self.arrays[key] = np.frombuffer(buffer, dtype=np.dtype(spec["dtype"]), count=count,
+                                             offset=start + spec["offset"]).reshape(shape)
+        self.nbytes = len(buffer)
+
+
+def _write_segment(name: str, arrays: Mapping[str, np.ndarray], header: Dict[str, Any]) -> int:
+    arrays = {key: np.ascontiguousarray(array) for key, array in arrays.items()}
+    layout, offset = {}, 0
+    for key, array in arrays.items():
+        if array.dtype.hasobject:
+            raise TypeError(f"{key}: object arrays cannot be shared")
+        layout[key] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        offset = _align(offset + array.nbytes)
+    header_bytes = json.dumps(dict(header, arrays=layout), separators=(",", ":")).encode()
+    start = _align(8 + len(header_bytes))
+
+    try:
+        shm = shared_memory.SharedMemory(name, create=True, size=start + offset)
+    except FileExistsError:
+        _unlink(name)  # left behind by a publisher that was killed mid-publish
+        shm = shared_memory.SharedMemory(name, create=True, size=start + offset)
+    _untrack(shm)
+    try:
+        struct.pack_into("<Q", shm.buf, 0, len(header_bytes))
+        shm.buf[8:8 + len(header_bytes)] = header_bytes
+        for key, array in arrays.items():
+            target = np.ndarray(array.shape, array.dtype, buffer=shm.buf, offset=start + layout[key]["offset"])
+            target[...] = array
+            del target
+        return shm.size
+    finally:
+        shm.close()
+
+
+class SharedSchemeRegistry:
+    """
+    A SchemeRegistry read from shared memory.
+
+    It answers the same queries as SchemeRegistry, with binary searches over
+    sorted arrays published alongside the columns instead of per-process hash
+    indexes, so a worker holds no copy of the scheme list.
+    """
+
+    def __init__(self, arrays: Mapping[str, np.ndarray]):
+        self.codes = arrays["codes"]
+        self.names = StringColumn.from_arrays(arrays, "names")
+        self.isin_growth = StringColumn.from_arrays(arrays, "isin_growth")
+        self.isin_div_reinvestment = StringColumn.from_arrays(arrays, "isin_div_reinvestment")
+        # Binary search over a memoryview yields Python ints, much faster than np.searchsorted on one code
+        self._code_sorted = memoryview(arrays["code_sorted"])
+        self._code_rows = memoryview(arrays["code_rows"])
+        self._name_keys = StringColumn.from_arrays(arrays, "name_keys")
+        self._name_codes = arrays["name_codes"]
+        self._isin_keys = StringColumn.from_arrays(arrays, "isin_keys")
+        self._isin_rows = arrays["isin_rows"]
+        self._amc_keys = StringColumn.from_arrays(arrays, "amc_keys")
+        self._amc_rows = arrays["amc_rows"]
+
+    @staticmethod
+    def encode(registry: Any) -> Dict[str, np.ndarray]:
+        """
+        Flattens a SchemeRegistry (or a SharedSchemeRegistry) into the arrays this class reads
+        :param registry: the registry
+        :return: arrays keyed by name
+        """
+        codes = np.asarray(registry.codes, dtype=np.int64)
+        names = list(registry.names)
+        isin_growth = list(registry.isin_growth)
+        isin_div = list(registry.isin_div_reinvestment)
+
+        name_index = registry.fund_code_map()
+        name_keys = sorted(name_index)
+        isin_index = {}
+        for row, (growth, div) in enumerate(zip(isin_growth, isin_div)):
+            # Same precedence as SchemeRegistry: later rows win
+            if growth:
+                isin_index[growth.upper()] = row
+            if div:
+                isin_index[div.upper()] = row
+        isin_keys = sorted(isin_index)
+        amc = sorted((issuer, row) for row, issuer in
+                     enumerate(isin_issuer(growth) or isin_issuer(div) for growth, div in zip(isin_growth, isin_div))
+                     if issuer is not None)
+
+        code_rows = np.argsort(codes, kind="stable")
+        arrays = {"codes": codes, "code_sorted": codes[code_rows], "code_rows": code_rows.astype(np.int64),
+                  "name_codes": np.fromiter((name_index[name] for name in name_keys), dtype=np.int64, count=len(name_keys)),
+                  "isin_rows": np.fromiter((isin_index[key] for key in isin_keys), dtype=np.int64, count=len(isin_keys)),
+                  "amc_rows": np.fromiter((row for _, row in amc), dtype=np.int64, count=len(amc))}
+        arrays.update(_string_arrays("names", names))
+        arrays.update(_string_arrays("isin_growth", isin_growth))
+        arrays.update(_string_arrays("isin_div_reinvestment", isin_div))
+        arrays.update(_string_arrays("name_keys", name_keys))
+        arrays.update(_string_arrays("isin_keys", isin_keys))
+        arrays.update(_string_arrays("amc_keys", [issuer for issuer, _ in amc]))
+        return arrays
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _row_of(self, mf_code: Any) -> Optional[int]:
+        code = normalise_code(mf_code)
+        if code is None:
+            return None
+        position = bisect.bisect_left(self._code_sorted, code)
+        if position < len(self._code_sorted) and self._code_sorted[position] == code:
+            return self._code_rows[position]
+        return None
+
+    def __contains__(self, mf_code: Any) -> bool:
+        return self._row_of(mf_code) is not None
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in range(len(self.codes)):
+            yield self._row(row)
+
+    def _row(self, row: int) -> Dict[str, Any]:
+        return {
+            "schemeCode": int(self.codes[row]),
+            "schemeName": self.names[row],
+            "isinGrowth": self.isin_growth[row],
+            "isinDivReinvestment": self.isin_div_reinvestment[row],
+        }
+
+    def get(self, mf_code: Any) -> Optional[Dict[str, Any]]:
+        """
+        Looks up a scheme by code
+        :param mf_code: the scheme code
+        :return: the scheme record, or None if unknown
+        """
+        row = self._row_of(mf_code)
+        return None if row is None else self._row(row)
+
+    def code_for_name(self, scheme_name: str) -> Optional[int]:
+        """
+        :return: the scheme code for an exact scheme name, or None
+        """
+        position = bisect.bisect_left(self._name_keys, scheme_name)
+        if position < len(self._name_keys) and self._name_keys[position] == scheme_name:
+            return int(self._name_codes[position])
+        return None
+
+    def get_by_isin(self, isin: str) -> Optional[Dict[str, Any]]:
+        """
+        Looks up a scheme by its growth or dividend-reinvestment ISIN
+        :param isin: the ISIN
+        :return: the scheme record, or None if unknown
+        """
+        if not isin:
+            return None
+        key = isin.upper()
+        position = bisect.bisect_left(self._isin_keys, key)
+        if position < len(self._isin_keys) and self._isin_keys[position] == key:
+            return self._row(int(self._isin_rows[position]))
+        return None
+
+    def schemes_for_amc(self, issuer: str) -> List[Dict[str, Any]]:
+        """
+        Lists the schemes of one AMC
+        :param issuer: the ISIN issuer prefix (e.g. ``"209K"``) or any ISIN of the AMC
+        :return: scheme records of the AMC
+        """
+        key = isin_issuer(issuer) if issuer and len(issuer) >= 7 else (issuer or "").upper()
+        start = bisect.bisect_left(self._amc_keys, key)
+        end = bisect.bisect_right(self._amc_keys, key, lo=start)
+        return [self._row(int(row)) for row in self._amc_rows[start:end]]
+
+    def amc_issuers(self) -> List[str]:
+        """
+        :return: the ISIN issuer prefixes known to the registry
+        """
+        return list(dict.fromkeys(self._amc_keys))
+
+    def fund_code_map(self) -> Mapping[str, int]:
+        """
+        :return: a read-only ``{scheme name: scheme code}`` view of the name index
+        """
+        return _SharedNameMap(self)
+
+    def to_columns(self) -> Dict[str, list]:
+        """
+        :return: the scheme list column-wise, as SchemeRegistry.to_columns
+        """
+        return {
+            "codes": self.codes.tolist(),
+            "names": list(self.names),
+            "isin_growth": list(self.isin_growth),
+            "isin_div_reinvestment": list(self.isin_div_reinvestment),
+        }
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """
+        Expands the registry back into the list-of-dicts form of the API
+        """
+        return list(self)
+
+
+class _SharedNameMap(MappingABC):
+    def __init__(self, registry: SharedSchemeRegistry):
+        self._registry = registry
+
+    def __getitem__(self, scheme_name: str) -> int:
+        code = self._registry.code_for_name(scheme_name) if isinstance(scheme_name, str) else None
+        if code is None:
+            raise KeyError(scheme_name)
+        return code
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._registry._name_keys)
+
+    def __len__(self) -> int:
+        return len(self._registry._name_keys)
+
+    def values(self):
+        return self._registry._name_codes.tolist()
+
+
+class SharedNavTable:
+    """
+    Latest NAVs of the hot schemes, sorted by scheme code, with the raw ``/latest``
+    payloads for cache hits
+    """
+
+    def __init__(self, arrays: Mapping[str, np.ndarray], meta: Mapping[str, Any]):
+        self.codes = arrays["codes"]
+        self.nav = arrays["nav"]
+        self.prev_nav = arrays["prev_nav"]
+        self.day = arrays["day"]
+        self._payloads = StringColumn.from_arrays(arrays, "payloads")
+        self.expires_at = meta.get("expires_at")
+
+    @staticmethod
+    def encode(payloads: Mapping[Any, Mapping[str, Any]]) -> Dict[str, np.ndarray]:
+        """
+        Flattens mfapi payloads keyed by scheme code into the arrays this class reads
+        :param payloads: ``/mf/{code}/latest`` (or ``/mf/{code}``) responses; empty ones are skipped
+        :return: arrays keyed by name
+        """
+        rows = []
+        for mf_code, payload in payloads.items():
+            code = normalise_code(mf_code)
+            data = payload.get("data") if payload else None
+            if code is None or not data:
+                continue
+            try:
+                nav, day = float(data[0]["nav"]), parse_day(data[0]["date"])
+                prev_nav = float(data[1]["nav"]) if len(data) > 1 else np.nan
+            except (KeyError, TypeError, ValueError) as e:
+                logging.error(f"Skipping malformed NAV payload of {code}: {e}")
+                continue
+            rows.append((code, nav, prev_nav, day, json.dumps(payload, separators=(",", ":"))))
+        rows.sort()
+        arrays = {
+            "codes": np.array([row[0] for row in rows], dtype=np.int64),
+            "nav": np.array([row[1] for row in rows], dtype=np.float64),
+            "prev_nav": np.array([row[2] for row in rows], dtype=np.float64),
+            "day": np.array([row[3] for row in rows], dtype=np.int32),
+        }
+        arrays.update(_string_arrays("payloads", [row[4] for row in rows]))
+        return arrays
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+    def rows(self, mf_codes: Sequence[int]) -> np.ndarray:
+        """
+        Vectorised lookup of many schemes
+        :param mf_codes: integer scheme codes
+        :return: the row of each code, -1 where the table has no NAV for it
+        """
+        codes = np.asarray(mf_codes, dtype=np.int64)
+        positions = np.searchsorted(self.codes, codes)
+        positions[positions >= len(self.codes)] = 0
+        found = (self.codes[positions] == codes) if len(self.codes) else np.zeros(len(codes), dtype=bool)
+        return np.where(found, positions, -1)
+
+    def payload(self, mf_code: Any) -> Optional[Dict[str, Any]]:
+        """
+        :param mf_code: the scheme code
+        :return: the published payload of the scheme, or None
+        """
+        code = normalise_code(mf_code)
+        if code is None or not -2 ** 63 <= code < 2 ** 63:
+            return None
+        row = int(self.rows([code])[0])
+        return None if row < 0 else loads(self._payloads[row])
+
+
+class SharedDataPublisher:
+    """
+    Publishes the scheme registry, fund-name embeddings and hot NAVs into shared
+    memory for SharedDataPlane readers in other processes.
+
+    Each publish writes a new segment per dataset version and then bumps the
+    dataset's generation in a small control segment, so readers switch to the
+    new version atomically on their next access while mappings of older
+    versions stay valid. The ``keep`` most recent old versions remain attachable.
+    Segments outlive the publisher until ``close(unlink=True)``.
+    """
+
+    def __init__(self, namespace: str = DEFAULT_NAMESPACE, keep: int = DEFAULT_KEEP_VERSIONS):
+        """
+        :param namespace: name of the plane; readers attach with the same name
+        :param keep: old versions of each dataset kept for readers still attaching to them
+        """
+        _require_posix()
+        self.namespace = namespace
+        self.keep = keep
+        self._lock = threading.Lock()
+        try:
+            self._control = shared_memory.SharedMemory(namespace, create=True, size=CONTROL_SIZE)
+        except FileExistsError:
+            # A restarted publisher carries on from the generations already published
+            self._control = shared_memory.SharedMemory(namespace)
+        _untrack(self._control)
+
+    def generation(self, dataset: str) -> int:
+        return struct.unpack_from("<Q", self._control.buf, DATASETS.index(dataset) * 8)[0]
+
+    def _publish(self, dataset: str, arrays: Mapping[str, np.ndarray], meta: Optional[Dict[str, Any]] = None) -> int:
+        with self._lock:
+            generation = self.generation(dataset) + 1
+            header = {"dataset": dataset, "generation": generation, "published_at": time.time(), "meta": meta or {}}
+            size = _write_segment(_segment_name(self.namespace, dataset, generation), arrays, header)
+            # Readers check the generation in the segment header, so they never use a torn value
+            struct.pack_into("<Q", self._control.buf, DATASETS.index(dataset) * 8, generation)
+            if generation > self.keep + 1:
+                _unlink(_segment_name(self.namespace, dataset, generation - self.keep - 1))
+        metrics.inc("published_bytes", f"shared_plane.{dataset}", size)
+        logging.info(f"Published {dataset} generation {generation} ({size / 2 ** 20:.1f} MiB) to {self.namespace}")
+        return generation
+
+    def publish_registry(self, registry: Any) -> int:
+        """
+        :param registry: a SchemeRegistry
+        :return: the generation published
+        """
+        return self._publish(REGISTRY, SharedSchemeRegistry.encode(registry), {"schemes": len(registry)})
+
+    def publish_embeddings(self, store: EmbeddingStore) -> int:
+        """
+        :param store: the fund-name embedding store; rows are published as unit vectors
+        :return: the generation published
+        """
+        matrix = store.embeddings if store.normalized else unit_rows(store.embeddings)
+        arrays = {"embeddings": np.asarray(matrix), "codes": np.asarray(store.codes)}
+        arrays.update(_string_arrays("names", store.names))
+        return self._publish(EMBEDDINGS, arrays, {"store": store.meta})
+
+    def publish_navs(self, payloads: Mapping[Any, Mapping[str, Any]], expires_at: Optional[float] = None) -> int:
+        """
+        :param payloads: ``/mf/{code}/latest`` responses keyed by scheme code
+        :param expires_at: epoch seconds after which readers ignore these NAVs, None to keep them until replaced
+        :return: the generation published
+        """
+        arrays = SharedNavTable.encode(payloads)
+        return self._publish(NAVS, arrays, {"expires_at": expires_at, "schemes": len(arrays["codes"])})
+
+    def close(self, unlink: bool = False) -> None:
+        """
+        :param unlink: also remove every segment of the plane; attached readers keep their mappings
+        """
+        if unlink:
+            for dataset in DATASETS:
+                generation = self.generation(dataset)
+                for old in range(max(generation - self.keep, 1), generation + 1):
+                    _unlink(_segment_name(self.namespace, dataset, old))
+            _unlink(self.namespace)
+        self._control.close()
+
+
+class SharedDataPlane:
+    """
+    Read-only, zero-copy access to the datasets of a SharedDataPublisher.
+
+    Every accessor first reads the dataset's generation (a few hundred
+    nanoseconds) and maps the new version when it changed, so one publish
+    reaches all worker processes. Accessors return None while nothing is
+    published, letting callers fall back to loading the data themselves.
+    """
+
+    # Seconds between lookups of the control segment by name
+    attach_interval = 1.0
+
+    def __init__(self, namespace: str = DEFAULT_NAMESPACE):
+        """
+        :param namespace: name of the plane, as given to the publisher
+        """
+        _require_posix()
+        self.namespace = namespace
+        self._control: Optional[mmap.mmap] = None
+        self._next_attach = 0.0
+        self._views: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def generation(self, dataset: str) -> int:
+        """
+        :param dataset: REGISTRY, EMBEDDINGS or NAVS
+        :return: the current generation of the dataset, 0 if never published
+        """
+        now = time.monotonic()
+        if now >= self._next_attach:
+            # Mapped again now and then, in case the publisher was restarted with a new control segment
+            self._next_attach = now + self.attach_interval
+            try:
+                self._control = _map_readonly(self.namespace)
+            except FileNotFoundError:
+                self._control = None
+        control = self._control
+        if control is None:
+            return 0
+        return struct.unpack_from("<Q", control, DATASETS.index(dataset) * 8)[0]
+
+    def _current(self, dataset: str, build: Callable[[_Segment], Any]) -> Any:
+        generation = self.generation(dataset)
+        view = self._views.get(dataset)
+        if not generation or view is not None and view[0] == generation:
+            # Without a control segment the last version mapped keeps serving
+            return view[1] if view is not None else None
+        with self._lock:
+            for _ in range(3):
+                view = self._views.get(dataset)
+                if view is not None and view[0] == generation:
+                    return view[1]
+                try:
+                    segment = _Segment(_segment_name(self.namespace, dataset, generation))
+                except FileNotFoundError:
+                    segment = None
+                if segment is not None and segment.header["generation"] == generation:
+                    value = build(segment)
+                    self._views[dataset] = (generation, value, segment.header, segment.nbytes)
+                    return value
+                generation = self.generation(dataset)  # replaced meanwhile, or a torn read
+        logging.error(f"Could not attach {dataset} generation {generation} of {self.namespace}")
+        view = self._views.get(dataset)
+        return view[1] if view is not None else None
+
+    def registry(self) -> Optional[SharedSchemeRegistry]:
+        """
+        :return: the published scheme registry, or None
+        """
+        return self._current(REGISTRY, lambda segment: SharedSchemeRegistry(segment.arrays))
+
+    def embeddings(self) -> Optional[EmbeddingStore]:
+        """
+        :return: the published embedding store, its matrix mapped from shared memory, or None
+        """
+        def build(segment):
+            arrays = segment.arrays
+            # Only the names are copied into the process, the matrix stays shared
+            return EmbeddingStore(list(StringColumn.from_arrays(arrays, "names")), arrays["codes"],
+                                  arrays["embeddings"], normalized=True, meta=segment.header["meta"].get("store"))
+        return self._current(EMBEDDINGS, build)
+
+    def navs(self) -> Optional[SharedNavTable]:
+        """
+        :return: the published NAV table, None if there is none or it has expired
+        """
+        table = self._current(NAVS, lambda segment: SharedNavTable(segment.arrays, segment.header["meta"]))
+        return None if table is None or table.expired else table
+
+    def nav_latest(self, mf_code: Any) -> Optional[Dict[str, Any]]:
+        """
+        :param mf_code: the scheme code
+        :return: the published ``/latest`` payload of the scheme, or None
+        """
+        table = self.navs()
+        return None if table is None else table.payload(mf_code)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        :return: per dataset: the generation published and the one this process has mapped
+        """
+        stats = {}
+        for dataset in DATASETS:
+            view = self._views.get(dataset)
+            stats[dataset] = {
+                "generation": self.generation(dataset),
+                "mapped": view[0] if view is not None else 0,
+                "published_at": view[2]["published_at"] if view is not None else None,
+                "bytes": view[3] if view is not None else 0,
+            }
+        return stats
+
+
+_default_planes: Dict[str, SharedDataPlane] = {}
+_default_planes_lock = threading.Lock()
+
+
+def default_plane() -> Optional[SharedDataPlane]:
+    """
+    :return: the plane named by the ``pyfinmuni_shared_plane`` environment variable, None if unset
+    """
+    namespace = SHARED_PLANE
+    if not namespace:
+        return None
+    plane = _default_planes.get(namespace)
+    if plane is None:
+        with _default_planes_lock:
+            plane = _default_planes.get(namespace)
+            if plane is None:
+                plane = _default_planes[namespace] = SharedDataPlane(namespace)
+                metrics.add_source("shared_plane", plane.stats)
+    return plane
+
+
+def run_loader(publisher: SharedDataPublisher, mf: Any, embeddings_path: Optional[str] = None,
+               hot_codes: Sequence[int] = (), interval: float = 60 * 60, max_workers: int = 8,
+               stop: Optional[threading.Event] = None) -> None:
+    """
+    Keeps a plane published: the scheme list, the embedding store whenever
+    embedding_builder swaps in a new version, and the latest NAVs of ``hot_codes``
+    :param publisher: the plane to publish to
+    :param mf: the IndianMFApi to fetch with
+    :param embeddings_path: embedding store directory (or symlink), None to skip embeddings
+    :param hot_codes: schemes whose latest NAV is published
+    :param interval: seconds between refreshes; NAVs are also refreshed when the next NAV is published
+    :param max_workers: concurrent NAV downloads
+    :param stop: set to return
+    """
+    stop = stop or threading.Event()
+    mf.shared_plane = None  # the loader reads the source data, not its own output
+    published_store = None
+    registry = mf.registry
+    while True:
+        publisher.publish_registry(registry)
+
+        if embeddings_path is not None and os.path.exists(embeddings_path):
+            version = (os.path.realpath(embeddings_path), os.path.getmtime(os.path.realpath(embeddings_path)))
+            if version != published_store:
+                publisher.publish_embeddings(EmbeddingStore.load(embeddings_path, mmap=True))
+                published_store = version
+
+        if hot_codes:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shared-plane") as executor:
+                navs = run_concurrent(mf.get_mf_price_latest, hot_codes, executor)
+            for code, error in navs.errors.items():
+                logging.error(f"Could not fetch the latest NAV of {code}: {error}")
+            publisher.publish_navs(navs, expires_at=time.time() + seconds_until_nav_publish())
+
+        if stop.wait(min(interval, seconds_until_nav_publish() + 1)):
+            return
+        try:
+            registry = mf.refresh_registry()
+        except Exception as e:
+            logging.error(f"Scheme list refresh failed, publishing the previous one again: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Publish pyfinmuni data to shared memory for worker processes.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve = subparsers.add_parser("serve", help="run the loader")
+    serve.add_argument("--namespace", default=SHARED_PLANE or DEFAULT_NAMESPACE)
+    serve.add_argument("--embeddings", help="embedding store directory, as written by embedding_builder")
+    serve.add_argument("--hot-codes", help="file with one scheme code per line whose latest NAV is published")
+    serve.add_argument("--snapshot", help="scheme list snapshot file of IndianMFApi")
+    serve.add_argument("--interval", type=float, default=60 * 60, help="seconds between refreshes")
+    status = subparsers.add_parser("status", help="print the published generations")
+    status.add_argument("--namespace", default=SHARED_PLANE or DEFAULT_NAMESPACE)
+    unlink = subparsers.add_parser("unlink", help="remove the plane's segments")
+    unlink.add_argument("--namespace", default=SHARED_PLANE or DEFAULT_NAMESPACE)
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        print(json.dumps(SharedDataPlane(args.namespace).stats(), indent=2))
+    elif args.command == "unlink":
+        SharedDataPublisher(args.namespace).close(unlink=True)
+    else:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+        from pyfinmuni.IMFApi import IndianMFApi
+        hot_codes = []
+        if args.hot_codes:
+            with open(args.hot_codes) as f:
+                hot_codes = [int(line) for line in f if line.strip()]
+        publisher = SharedDataPublisher(args.namespace)
+        mf = IndianMFApi(snapshot_path=args.snapshot, background_refresh=False)
+        try:
+            run_loader(publisher, mf, args.embeddings, hot_codes, args.interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            publisher.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
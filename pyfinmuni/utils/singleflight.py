@@ -0,0 +1,145 @@
+import asyncio
+import threading
+
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from pyfinmuni.utils.metrics import metrics
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for a key is in flight,
+    other threads asking for the same key wait for it and share its result
+    (or its exception) instead of running their own.
+
+    Nothing is cached; once the call finishes the next caller runs it again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._counts = {"calls": 0, "executions": 0, "coalesced": 0}
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """
+        Runs ``func`` unless a call for ``key`` is already in flight.
+
+        Args:
+            key (Hashable): Identifies identical calls, e.g. the URL.
+            func (Callable[[], Any]): The call to run.
+
+        Returns:
+            Any: The result of ``func``, possibly from another thread's call.
+        """
+        with self._lock:
+            self._counts["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._counts["executions"] += 1
+            else:
+                self._counts["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        """
+        Returns:
+            int: The number of keys with a call in flight.
+        """
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: ``calls`` made, ``executions`` actually run and
+            ``coalesced`` calls that shared another call's result.
+        """
+        with self._lock:
+            return dict(self._counts)
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines on one event loop.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._counts = {"calls": 0, "executions": 0, "coalesced": 0}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Awaits ``func()`` unless a call for ``key`` is already in flight.
+
+        Args:
+            key (Hashable): Identifies identical calls, e.g. the URL.
+            func (Callable[[], Awaitable[Any]]): Returns the awaitable to run.
+
+        Returns:
+            Any: The result, possibly from another task's call.
+        """
+        self._counts["calls"] += 1
+        task = self._calls.get(key)
+        if task is not None:
+            self._counts["coalesced"] += 1
+        else:
+            self._counts["executions"] += 1
+            # The call runs in its own task, so cancelling whichever caller started it
+            # does not cancel it for the others
+            task = self._calls[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # A cancelled caller must not cancel the shared call
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark it retrieved so a failure nobody awaits any more is not logged as lost
+            task.exception()
+
+    def in_flight(self) -> int:
+        """
+        Returns:
+            int: The number of keys with a call in flight.
+        """
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: ``calls`` made, ``executions`` actually run and
+            ``coalesced`` calls that shared another call's result.
+        """
+        return dict(self._counts)
+
+
+# Shared by the synchronous clients, so identical requests coalesce across instances too
+default_single_flight = SingleFlight()
+metrics.add_source("single_flight", default_single_flight.stats)
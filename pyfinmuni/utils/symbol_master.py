@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+from pyfinmuni.utils.cache import ONE_DAY
+from pyfinmuni.utils.symbol_table import SymbolTable
+
+
+class SymbolMaster:
+    """
+    The NSE equity list (a SymbolTable), cached in memory and on disk.
+
+    Lookups are answered from memory; once ``ttl`` has passed the list is
+    revalidated with a conditional request (ETag / Last-Modified), so an
+    unchanged file costs a 304 instead of a full download.
+    """
+
+    def __init__(self, fetch: Callable[[Dict[str, str]], requests.Response], cache_path: Optional[str] = None,
+                 ttl: float = ONE_DAY, retry_interval: float = 60, clock: Callable[[], float] = time.time):
+        """
+        :param fetch: performs the GET of EQUITY_L.csv with the given extra headers
+        :param cache_path: JSON file persisting the parsed list, None for memory only
+        :param ttl: seconds before the list is revalidated
+        :param retry_interval: seconds before retrying a failed refresh, serving the stale (or no) list meanwhile
+        :param clock: wall clock, overridable for tests
+        """
+        self._fetch = fetch
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._table = SymbolTable()
+        self._symbols: Dict[str, str] = {}
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        self._fetched_at: Optional[float] = None
+        if cache_path:
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_path) as f:
+                saved = json.load(f)
+            self._set_table(SymbolTable(saved["rows"]))
+            self._etag = saved.get("etag")
+            self._last_modified = saved.get("last_modified")
+            self._fetched_at = saved.get("fetched_at")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Ignoring unreadable symbol master cache {self.cache_path}: {e}")
+
+    def _save(self) -> None:
+        if not self.cache_path:
+            return
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"rows": self._table.rows(), "etag": self._etag, "last_modified": self._last_modified,
+                       "fetched_at": self._fetched_at}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def is_fresh(self) -> bool:
+        """
+        :return: True if the list was (re)validated less than ttl seconds ago
+        """
+        fetched_at = self._fetched_at
+        return fetched_at is not None and self.clock() - fetched_at < self.ttl
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Revalidates the list against NSE
+        :param force: download without conditional headers
+        :return: True if the list changed
+        """
+        with self._lock:
+            if not force and self.is_fresh():
+                return False
+            headers = {}
+            if not force and self._symbols:
+                if self._etag:
+                    headers["If-None-Match"] = self._etag
+                if self._last_modified:
+                    headers["If-Modified-Since"] = self._last_modified
+            try:
+                res = self._fetch(headers)
+                if res.status_code == 304:
+                    self._fetched_at = self.clock()
+                    self._save()
+                    return False
+                res.raise_for_status()
+                res.encoding = res.encoding or "utf-8"
+                table = SymbolTable.from_csv_lines(res.iter_lines(decode_unicode=True))
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Error fetching stock codes: {e}")
+                # Serve the stale (or, on a cold start, empty) list for a while rather than
+                # downloading again on every lookup
+                self._fetched_at = self.clock() - self.ttl + self.retry_interval
+                return False
+            self._set_table(table)
+            self._etag = res.headers.get("ETag")
+            self._last_modified = res.headers.get("Last-Modified")
+            self._fetched_at = self.clock()
+            self._save()
+            return True
+
+    def _set_table(self, table: SymbolTable) -> None:
+        # Readers never lock, so swap in both structures fully built
+        self._symbols = table.names_by_symbol()
+        self._table = table
+
+    def _ensure_fresh(self) -> None:
+        if not self.is_fresh():
+            self.refresh()
+
+    def symbols(self) -> Dict[str, str]:
+        """
+        :return: the {symbol: company name} dict; do not mutate it
+        """
+        self._ensure_fresh()
+        return self._symbols
+
+    def table(self) -> SymbolTable:
+        """
+        :return: the SymbolTable with every column and the search indexes
+        """
+        self._ensure_fresh()
+        return self._table
+
+    def __contains__(self, code: Any) -> bool:
+        self._ensure_fresh()
+        return code in self._symbols
+
+    def name(self, code: str) -> Optional[str]:
+        """
+        :return: the company name of a symbol, or None
+        """
+        self._ensure_fresh()
+        return self._symbols.get(code)
@@ -0,0 +1,221 @@
+import re
+import csv
+
+from bisect import bisect_left
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# EQUITY_L.csv header -> field name; the real header has stray spaces
+CSV_FIELDS = {
+    "SYMBOL": "symbol",
+    "NAME OF COMPANY": "name",
+    "SERIES": "series",
+    "DATE OF LISTING": "listing_date",
+    "PAID UP VALUE": "paid_up_value",
+    "MARKET LOT": "market_lot",
+    "ISIN NUMBER": "isin",
+    "FACE VALUE": "face_value",
+}
+FIELDS = tuple(CSV_FIELDS.values())
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_LEGAL_SUFFIX = re.compile(r"\s+(limited|ltd)$")
+
+
+def normalize_name(name: str) -> str:
+    """
+    Lower-cases a company name, turns punctuation into spaces and drops a
+    trailing "Limited"/"Ltd", so "Reliance Industries Ltd." matches
+    "RELIANCE INDUSTRIES LIMITED".
+    """
+    name = _NON_ALNUM.sub(" ", name.lower().replace("&", " and ")).strip()
+    return _LEGAL_SUFFIX.sub("", name)
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _convert(field: str, value: str) -> Any:
+    value = value.strip()
+    if field in ("paid_up_value", "face_value"):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    if field == "market_lot":
+        try:
+            return int(value)
+        except ValueError:
+            return None
+    if field == "listing_date":
+        try:
+            return datetime.strptime(value, "%d-%b-%Y").date().isoformat()
+        except ValueError:
+            return value or None
+    return value
+
+
+class SymbolTable:
+    """
+    The NSE equity list with indexes by symbol, ISIN and normalized name, plus
+    prefix and substring search over company names.
+
+    Rows are stored column-wise; every index maps to row numbers.
+    """
+
+    def __init__(self, rows: Iterable[Sequence[Any]] = ()):
+        """
+        :param rows: rows with the values of FIELDS in order
+        """
+        self.columns: Dict[str, List[Any]] = {field: [] for field in FIELDS}
+        self._by_symbol: Dict[str, int] = {}
+        self._by_isin: Dict[str, int] = {}
+        self._by_name: Dict[str, List[int]] = {}
+        self._names: List[str] = []
+        for row in rows:
+            self._append(row)
+        self._build_search_indexes()
+
+    @classmethod
+    def from_csv_lines(cls, lines: Iterable[str]) -> "SymbolTable":
+        """
+        Parses EQUITY_L.csv line by line, honouring quoted names with commas
+        :param lines: the CSV text as an iterable of lines, e.g. a streamed response
+        :return: SymbolTable
+        """
+        reader = csv.reader(lines)
+        header = next(reader, None)
+        if header is None:
+            return cls()
+        positions = {CSV_FIELDS.get(column.strip().upper()): i for i, column in enumerate(header)}
+        positions.pop(None, None)
+
+        def rows():
+            for record in reader:
+                if not record or not record[0].strip():
+                    continue
+                yield [_convert(field, record[positions[field]]) if field in positions and positions[field] < len(record)
+                       else None for field in FIELDS]
+        return cls(rows())
+
+    def _append(self, row: Sequence[Any]) -> None:
+        index = len(self._names)
+        for field, value in zip(FIELDS, row):
+            self.columns[field].append(value)
+        symbol, name, isin = row[0], row[1] or "", row[FIELDS.index("isin")]
+        self._by_symbol[symbol] = index
+        if isin:
+            self._by_isin[isin] = index
+        normalized = normalize_name(name)
+        self._names.append(normalized)
+        self._by_name.setdefault(normalized, []).append(index)
+
+    def _build_search_indexes(self) -> None:
+        self._sorted_names = sorted((name, i) for i, name in enumerate(self._names))
+        self._sorted_tokens = sorted((token, i) for i, name in enumerate(self._names) for token in name.split())
+        self._trigram_index: Dict[str, List[int]] = {}
+        for i, name in enumerate(self._names):
+            for gram in _trigrams(name):
+                self._trigram_index.setdefault(gram, []).append(i)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, symbol: Any) -> bool:
+        return symbol in self._by_symbol
+
+    def rows(self) -> List[List[Any]]:
+        """
+        :return: the table as a list of rows, the inverse of SymbolTable(rows)
+        """
+        return [list(values) for values in zip(*(self.columns[field] for field in FIELDS))]
+
+    def record(self, index: int) -> Dict[str, Any]:
+        return {field: self.columns[field][index] for field in FIELDS}
+
+    def get(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """
+        :return: the record of a symbol, or None
+        """
+        index = self._by_symbol.get(symbol.upper())
+        return None if index is None else self.record(index)
+
+    def get_by_isin(self, isin: str) -> Optional[Dict[str, Any]]:
+        """
+        :return: the record of an ISIN, or None
+        """
+        index = self._by_isin.get(isin.upper())
+        return None if index is None else self.record(index)
+
+    def find_by_name(self, name: str) -> List[Dict[str, Any]]:
+        """
+        :return: records whose normalized name equals the normalized query
+        """
+        return [self.record(i) for i in self._by_name.get(normalize_name(name), ())]
+
+    def names_by_symbol(self) -> Dict[str, str]:
+        """
+        :return: a {symbol: company name} dict
+        """
+        return dict(zip(self.columns["symbol"], self.columns["name"]))
+
+    def _prefix_rows(self, entries: List[tuple], prefix: str) -> Iterable[int]:
+        position = bisect_left(entries, (prefix,))
+        while position < len(entries) and entries[position][0].startswith(prefix):
+            yield entries[position][1]
+            position += 1
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Searches company names: whole-name prefix matches first, then names whose
+        words start with the query words ("reliance ind"), then substrings
+        :param query: free text
+        :param limit: maximum number of records
+        :return: list of records
+        """
+        query = normalize_name(query)
+        if not query:
+            return []
+        found: Dict[int, None] = {}
+
+        for i in self._prefix_rows(self._sorted_names, query):
+            found.setdefault(i)
+            if len(found) >= limit:
+                return [self.record(i) for i in found]
+
+        words = query.split()
+        token_hits = []
+        for i in set(self._prefix_rows(self._sorted_tokens, words[0])):
+            name_words = self._names[i].split()
+            if all(any(word.startswith(w) for word in name_words) for w in words[1:]):
+                token_hits.append(i)
+        for i in sorted(token_hits, key=lambda i: (len(self._names[i]), self._names[i])):
+            found.setdefault(i)
+
+        if len(found) < limit and len(query) >= 3:
+            postings = sorted((self._trigram_index.get(gram, ()) for gram in _trigrams(query)), key=len)
+            if postings and postings[0]:
+                candidates = set(postings[0]).intersection(*postings[1:])
+                for i in sorted(candidates, key=lambda i: (len(self._names[i]), self._names[i])):
+                    if query in self._names[i]:
+                        found.setdefault(i)
+        return [self.record(i) for i in list(found)[:limit]]
+
+    def resolve(self, query: str) -> Optional[str]:
+        """
+        Resolves free text to a symbol: an exact symbol, an ISIN, an exact company
+        name, or the best name search hit
+        :param query: symbol, ISIN or (partial) company name
+        :return: the symbol, or None
+        """
+        text = query.strip().upper()
+        if text in self._by_symbol:
+            return text
+        if text in self._by_isin:
+            return self.columns["symbol"][self._by_isin[text]]
+        exact = self._by_name.get(normalize_name(query))
+        if exact:
+            return self.columns["symbol"][exact[0]]
+        hits = self.search(query, limit=1)
+        return hits[0]["symbol"] if hits else None
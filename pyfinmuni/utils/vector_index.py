@@ -0,0 +1,191 @@
+from abc import ABCMeta, abstractmethod
+
+import numpy as np
+
+from pyfinmuni.utils.embedding_store import unit_rows
+
+# Rows converted to float32 at once when scanning a float16 or int8 matrix
+DEFAULT_BLOCK_ROWS = 8192
+
+
+def top_k_indices(scores, k):
+    """Indices of the k highest scores in each row, best first, via argpartition."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.intp)
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def _scan(matrix, queries, block_rows):
+    # queries @ matrix.T without materialising a float32 copy of a float16/int8 matrix
+    if matrix.dtype == np.float32:
+        return queries @ matrix.T
+    scores = np.empty((queries.shape[0], matrix.shape[0]), dtype=np.float32)
+    for start in range(0, matrix.shape[0], block_rows):
+        block = np.asarray(matrix[start:start + block_rows], dtype=np.float32)
+        scores[:, start:start + len(block)] = queries @ block.T
+    return scores
+
+
+def _rerank(matrix, queries, candidates, k):
+    # Exact scores of each query's candidate rows, normalized as they are read, best k first
+    vectors = unit_rows(matrix[candidates.ravel()]).reshape(candidates.shape + (-1,))
+    scores = np.einsum('qcd,qd->qc', vectors, queries)
+    order = top_k_indices(scores, k)
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+class VectorIndex(metaclass=ABCMeta):
+    """
+    Nearest-neighbour search by cosine similarity over unit-length rows.
+    """
+
+    @abstractmethod
+    def search(self, queries, k):
+        """
+        Best k rows for each unit-length query.
+
+        Returns (indices, scores), two (queries, k) arrays, best first.
+        """
+
+    @property
+    @abstractmethod
+    def nbytes(self):
+        """Memory held by the index itself."""
+
+
+class ExactIndex(VectorIndex):
+    """Brute-force search over a float32 (or float16) matrix; the reference for the others."""
+
+    def __init__(self, matrix, block_rows=DEFAULT_BLOCK_ROWS):
+        self.matrix = matrix
+        self.block_rows = block_rows
+
+    def scores(self, queries):
+        """Similarity of every query against every row."""
+        return _scan(self.matrix, queries, self.block_rows)
+
+    def search(self, queries, k):
+        scores = self.scores(queries)
+        indices = top_k_indices(scores, k)
+        return indices, np.take_along_axis(scores, indices, axis=1)
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes
+
+
+class Int8Index(VectorIndex):
+    """
+    Scalar-quantized search: each dimension is scaled into int8, a quarter of
+    the float32 size. The best ``k * rerank_factor`` approximate hits are
+    re-scored exactly against ``rerank_matrix`` when one is given (e.g. the
+    memory-mapped store, of which only those rows are then read).
+
+    Rows need not be unit length: each block is normalized as it is quantized
+    and each re-ranked row as it is read, so both matrices can be the store's
+    own (float16, memory-mapped) matrix rather than a normalized float32 copy.
+    The index then holds only the int8 codes; the price is reading
+    ``k * rerank_factor`` rows from the store per query.
+    """
+
+    def __init__(self, matrix, rerank_matrix=None, rerank_factor=4, block_rows=DEFAULT_BLOCK_ROWS):
+        scale = np.zeros(matrix.shape[1], dtype=np.float32)
+        for start in range(0, matrix.shape[0], block_rows):
+            block = np.abs(unit_rows(matrix[start:start + block_rows]))
+            scale = np.maximum(scale, block.max(axis=0))
+        self.scale = np.maximum(scale, np.float32(1e-12)) / 127
+        self.codes = np.empty(matrix.shape, dtype=np.int8)
+        for start in range(0, matrix.shape[0], block_rows):
+            block = unit_rows(matrix[start:start + block_rows])
+            self.codes[start:start + len(block)] = np.round(block / self.scale)
+        self.rerank_matrix = rerank_matrix
+        self.rerank_factor = rerank_factor
+        self.block_rows = block_rows
+
+    def search(self, queries, k):
+        # q . (codes * scale) == (q * scale) . codes
+        scores = _scan(self.codes, queries * self.scale, self.block_rows)
+        if self.rerank_matrix is None:
+            indices = top_k_indices(scores, k)
+            return indices, np.take_along_axis(scores, indices, axis=1)
+        candidates = top_k_indices(scores, k * self.rerank_factor)
+        return _rerank(self.rerank_matrix, queries, candidates, k)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scale.nbytes
+
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted-file search: rows are clustered with spherical k-means and a query
+    is scored exactly against the rows of its ``n_probe`` closest clusters only.
+    """
+
+    def __init__(self, matrix, n_lists=None, n_probe=8, iterations=10, seed=0, block_rows=DEFAULT_BLOCK_ROWS):
+        self.matrix = matrix
+        self.block_rows = block_rows
+        self.n_probe = n_probe
+        n_lists = n_lists or max(1, int(np.sqrt(matrix.shape[0])))
+        rng = np.random.default_rng(seed)
+        centroids = np.asarray(matrix[np.sort(rng.choice(matrix.shape[0], n_lists, replace=False))], dtype=np.float32)
+        for _ in range(iterations):
+            assignment = self._assign(centroids)
+            sums = np.zeros_like(centroids)
+            for start in range(0, matrix.shape[0], block_rows):
+                block = np.asarray(matrix[start:start + block_rows], dtype=np.float32)
+                one_hot = np.zeros((len(block), n_lists), dtype=np.float32)
+                one_hot[np.arange(len(block)), assignment[start:start + len(block)]] = 1
+                sums += one_hot.T @ block
+            counts = np.bincount(assignment, minlength=n_lists)
+            # Empty clusters restart from a random row
+            for empty in np.flatnonzero(counts == 0):
+                sums[empty] = matrix[rng.integers(matrix.shape[0])]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), np.float32(1e-12))
+        self.centroids = centroids
+        assignment = self._assign(centroids)
+        self.order = np.argsort(assignment, kind='stable').astype(np.int32)
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=n_lists))))
+
+    def _assign(self, centroids):
+        assignment = np.empty(self.matrix.shape[0], dtype=np.intp)
+        for start in range(0, self.matrix.shape[0], self.block_rows):
+            block = np.asarray(self.matrix[start:start + self.block_rows], dtype=np.float32)
+            assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return assignment
+
+    def search(self, queries, k):
+        k = min(k, self.matrix.shape[0])
+        probes = top_k_indices(queries @ self.centroids.T, self.n_probe)
+        indices = np.empty((len(queries), k), dtype=np.intp)
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        for row, (query, lists) in enumerate(zip(queries, probes)):
+            candidates = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists])
+            if len(candidates) < k:
+                candidates = np.arange(self.matrix.shape[0])
+            candidate_scores = np.asarray(self.matrix[candidates], dtype=np.float32) @ query
+            best = top_k_indices(candidate_scores[None, :], k)[0]
+            indices[row], scores[row] = candidates[best], candidate_scores[best]
+        return indices, scores
+
+    @property
+    def nbytes(self):
+        return self.centroids.nbytes + self.order.nbytes + self.offsets.nbytes
+
+
+BACKENDS = {"exact": ExactIndex, "int8": Int8Index, "ivf": IVFIndex}
+
+
+def make_index(kind, matrix, **options):
+    """Build the index backend named ``kind`` ("exact", "int8" or "ivf") over unit-length rows."""
+    try:
+        backend = BACKENDS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown vector index {kind!r}, expected one of {sorted(BACKENDS)}") from None
+    return backend(matrix, **options)
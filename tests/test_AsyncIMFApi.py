@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from pyfinmuni import AsyncIndianMFApi
+
+class FakeResponse:
+    def __init__(self, status, payload):
+        self.status = status
+        self.payload = payload
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        assert self.status < 400
+
+    async def json(self, content_type=None, loads=None):
+        return self.payload
+
+class FakeSession:
+    closed = False
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.requested = []
+
+    def get(self, url):
+        self.requested.append(url)
+        responses = self.routes[url]
+        return FakeResponse(*responses.pop(0)) if len(responses) > 1 else FakeResponse(*responses[0])
+
+@pytest.fixture
+def session():
+    return FakeSession({
+        "https://api.mfapi.in/mf": [(200, [{"schemeName": "Test Fund", "schemeCode": 123456},
+                                           {"schemeName": "Other Fund", "schemeCode": 654321}])],
+        "https://api.mfapi.in/mf/123456/latest": [(503, None), (200, {"meta": {"scheme_code": 123456}})],
+        "https://api.mfapi.in/mf/654321/latest": [(200, {"meta": {"scheme_code": 654321}})],
+    })
+
+def test_get_mf_price_latest_retries_without_blocking(session):
+    mf_api = AsyncIndianMFApi(session=session, backoff=0.001)
+    latest = asyncio.run(mf_api.get_mf_price_latest(123456))
+    assert latest["meta"]["scheme_code"] == 123456
+    assert session.requested.count("https://api.mfapi.in/mf/123456/latest") == 2
+
+def test_get_mf_price_latest_invalid_code(session):
+    mf_api = AsyncIndianMFApi(session=session)
+    assert asyncio.run(mf_api.get_mf_price_latest(999999)) == {}
+
+def test_get_mf_price_latest_many(session):
+    mf_api = AsyncIndianMFApi(session=session, backoff=0.001)
+
+    async def run():
+        first = await mf_api.get_mf_price_latest_many([123456, 654321, 999999, 123456])
+        second = await mf_api.get_mf_price_latest_many([654321])
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert set(first) == {123456, 654321}
+    assert list(first.errors) == [999999]
+    assert second[654321] == first[654321]
+    assert session.requested.count("https://api.mfapi.in/mf/654321/latest") == 1
+    assert session.requested.count("https://api.mfapi.in/mf") == 1
@@ -1,6 +1,11 @@
+import gc
+import time
+import weakref
 import pytest
 import requests_mock
 from pyfinmuni import IndianMFApi  # Adjust this import according to your module structure
+from pyfinmuni.utils.nav_store import NavHistoryStore
+from pyfinmuni.utils.scheme_registry import SchemeRegistry, load_snapshot, save_snapshot
 
 @pytest.fixture
 def mf_api():
@@ -69,3 +74,71 @@ def test_get_mf_price_hist_invalid_code(mf_api):
     price_hist = mf_api.get_mf_price_hist(999999)
     
     assert price_hist == {}
+
+def test_get_mf_price_hist_with_history_store(mf_api, requests_mock, tmp_path):
+    mock_data = {"meta": {"fund_house": "Test Fund House"}, "data": [{"date": "01-01-2024", "nav": "100.00000"}]}
+    hist = requests_mock.get("https://api.mfapi.in/mf/123456", json=mock_data)
+
+    mf_api.history_store = NavHistoryStore(str(tmp_path))
+    mf_api.fund_code_map = {"Test Fund": 123456}
+    assert mf_api.get_mf_price_hist(123456)["data"] == mock_data["data"]
+
+    # A later call (or a restarted process) reads the store instead of the network
+    mf_api.get_mf_price_hist.cache_clear()
+    assert mf_api.get_mf_price_hist(123456)["meta"]["fund_house"] == "Test Fund House"
+    assert hist.call_count == 1
+
+def test_get_mf_nav_series(mf_api, requests_mock):
+    mock_data = {"meta": {"scheme_code": 123456},
+                 "data": [{"date": "02-01-2024", "nav": "101.00"}, {"date": "01-01-2024", "nav": "100.00"}]}
+    requests_mock.get("https://api.mfapi.in/mf/123456", json=mock_data)
+
+    mf_api.fund_code_map = {"Test Fund": 123456}
+    series = mf_api.get_mf_nav_series(123456)
+    assert series.navs.tolist() == [100.0, 101.0]
+    assert series.point_to_point_return("01-01-2024", "02-01-2024") == pytest.approx(0.01)
+
+def test_scheme_list_is_loaded_lazily(requests_mock, tmp_path):
+    mf_list = requests_mock.get("https://api.mfapi.in/mf", json=[{"schemeName": "Test Fund", "schemeCode": 123456}])
+    snapshot_path = str(tmp_path / "schemes.json")
+
+    mf_api = IndianMFApi(snapshot_path=snapshot_path, background_refresh=False)
+    assert mf_list.call_count == 0  # construction does no I/O
+    assert mf_api.is_valid_fund_code(123456)
+    assert mf_list.call_count == 1
+    assert load_snapshot(snapshot_path)[0].code_for_name("Test Fund") == 123456
+
+    # A restarted process starts from the snapshot instead of the network
+    restarted = IndianMFApi(snapshot_path=snapshot_path, background_refresh=False)
+    assert restarted.mutual_fund_list[0]["schemeName"] == "Test Fund"
+    assert mf_list.call_count == 1
+
+def test_dropped_client_is_collected_and_its_refresher_exits(requests_mock, tmp_path):
+    requests_mock.get("https://api.mfapi.in/mf", json=[{"schemeName": "Test Fund", "schemeCode": 123456}])
+    mf_api = IndianMFApi(snapshot_path=str(tmp_path / "schemes.json"))
+    assert mf_api.is_valid_fund_code(123456)
+    thread, collected = mf_api._refresher, weakref.ref(mf_api)
+    assert thread.is_alive()
+    del mf_api
+
+    deadline = time.monotonic() + 5
+    while collected() is not None and time.monotonic() < deadline:
+        gc.collect()
+        time.sleep(0.01)
+    thread.join(timeout=5)
+
+    assert collected() is None
+    assert not thread.is_alive()
+
+def test_stale_snapshot_is_refreshed(requests_mock, tmp_path):
+    requests_mock.get("https://api.mfapi.in/mf", json=[{"schemeName": "New Fund", "schemeCode": 654321}])
+    snapshot_path = str(tmp_path / "schemes.json")
+    save_snapshot(SchemeRegistry([{"schemeName": "Test Fund", "schemeCode": 123456}]), snapshot_path, fetched_at=0)
+
+    mf_api = IndianMFApi(snapshot_path=snapshot_path, background_refresh=False)
+    assert mf_api.is_valid_fund_code(654321)
+    assert load_snapshot(snapshot_path)[1] > 0
+
+    requests_mock.get("https://api.mfapi.in/mf", status_code=404)
+    stale = IndianMFApi(snapshot_path=snapshot_path, snapshot_ttl=0, background_refresh=False)
+    assert stale.is_valid_fund_code(654321)  # the failed refresh keeps the old list
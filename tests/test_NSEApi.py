@@ -4,7 +4,9 @@ from pyfinmuni import NSEApi
 
 @pytest.fixture
 def nse_api():
-    return NSEApi()
+    api = NSEApi()
+    yield api
+    api.close()
 
 def test_get_stock_codes(nse_api):
     stock_codes = nse_api.get_stock_codes()
@@ -58,3 +60,133 @@ def test_get_index_quote(nse_api):
     assert "indexSymbol" in index_quote
     assert index_quote["indexSymbol"] == "NIFTY 50"
 
+@pytest.fixture
+def mocked_nse_api(requests_mock):
+    from pyfinmuni.utils.rate_limit import RateLimits
+    requests_mock.get("https://nseindia.com", text="")
+    api = NSEApi(max_workers=4, rate_limits=RateLimits())
+    yield api
+    api.close()
+
+def test_get_quotes(mocked_nse_api, requests_mock):
+    quote_url = "https://www.nseindia.com/api/quote-equity?symbol={code}"
+    requests_mock.get(quote_url.format(code="RELIANCE"), json={"priceInfo": {"lastPrice": 2950.5}})
+    requests_mock.get(quote_url.format(code="TCS"), json={"priceInfo": {"lastPrice": 3900.0}})
+    requests_mock.get(quote_url.format(code="BROKEN"), status_code=500)
+
+    quotes = mocked_nse_api.get_quotes(["reliance", "TCS", "BROKEN", "TCS"])
+    assert quotes == {"RELIANCE": {"lastPrice": 2950.5}, "TCS": {"lastPrice": 3900.0}}
+    assert list(quotes.errors) == ["BROKEN"]
+    assert not quotes.ok
+
+    # Cached quotes are reused by single-symbol lookups
+    calls = requests_mock.call_count
+    assert mocked_nse_api.get_quote("Reliance") == {"lastPrice": 2950.5}
+    assert requests_mock.call_count == calls
+
+def test_iter_historical_data(mocked_nse_api, requests_mock):
+    requests_mock.get("https://www.nseindia.com/api/historical/cm/equity", json={"data": [{"CH_SYMBOL": "X"}]})
+    results = {code: (data, error) for code, data, error in
+               mocked_nse_api.iter_historical_data(["INFY", "TCS"], "01-06-2024", "30-06-2024")}
+    assert set(results) == {"INFY", "TCS"}
+    assert all(error is None and data["data"] for data, error in results.values())
+    assert set(mocked_nse_api.get_historical_data_many(["INFY"], "01-06-2024", "30-06-2024")) == {"INFY"}
+
+def test_is_valid_code_uses_symbol_master(mocked_nse_api, requests_mock):
+    csv = requests_mock.get("https://nsearchives.nseindia.com/content/equities/EQUITY_L.csv",
+                            text="SYMBOL,NAME OF COMPANY\nRELIANCE,Reliance Industries Limited\n")
+    assert mocked_nse_api.is_valid_code("reliance") is True
+    assert mocked_nse_api.is_valid_code("INVALID_CODE") is False
+    assert mocked_nse_api.get_stock_codes()["RELIANCE"] == "Reliance Industries Limited"
+    assert csv.call_count == 1
+
+def test_index_quotes_share_one_snapshot(mocked_nse_api, requests_mock):
+    indices = requests_mock.get("https://www.nseindia.com/api/allIndices?json=true", json={"data": [
+        {"indexSymbol": "NIFTY 50", "last": 24000.5},
+        {"indexSymbol": "NIFTY BANK", "last": 51000.0},
+    ]})
+
+    quotes = mocked_nse_api.get_index_quotes(["nifty 50", "NIFTY BANK", "NIFTY XYZ"])
+    assert quotes == {"NIFTY 50": {"indexSymbol": "NIFTY 50", "last": 24000.5},
+                      "NIFTY BANK": {"indexSymbol": "NIFTY BANK", "last": 51000.0}}
+    assert list(quotes.errors) == ["NIFTY XYZ"]
+    assert mocked_nse_api.get_index_quote("NIFTY BANK")["last"] == 51000.0
+    assert mocked_nse_api.get_index_quote("NIFTY XYZ") == []
+    assert mocked_nse_api.get_index_list() == ["NIFTY 50", "NIFTY BANK"]
+    assert indices.call_count == 1
+
+def test_concurrent_identical_requests_are_coalesced(mocked_nse_api, requests_mock):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from pyfinmuni.utils.singleflight import SingleFlight
+
+    mocked_nse_api.single_flight = SingleFlight()
+    release = threading.Event()
+
+    def gainers(request, context):
+        release.wait(5)
+        return {"NIFTY": {"data": []}}
+
+    gainers_url = requests_mock.get("https://www.nseindia.com/api/live-analysis-variations?index=gainers&type=NIFTY&json=true",
+                                    json=gainers)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(mocked_nse_api.get_top_gainers) for _ in range(4)]
+        while mocked_nse_api.single_flight.stats()["calls"] < 4:
+            release.wait(0.01)
+        release.set()
+        assert all(future.result() == {"NIFTY": {"data": []}} for future in futures)
+    assert gainers_url.call_count == 1
+    assert mocked_nse_api.single_flight.stats()["coalesced"] == 3
+
+def test_metrics_record_endpoints_when_enabled(mocked_nse_api, requests_mock):
+    from pyfinmuni.utils.metrics import metrics
+
+    requests_mock.get("https://www.nseindia.com/api/quote-equity?symbol=RELIANCE", json={"priceInfo": {"lastPrice": 2950.5}})
+    metrics.enable()
+    metrics.reset()
+    try:
+        assert mocked_nse_api.get_quote("RELIANCE") == {"lastPrice": 2950.5}
+        assert mocked_nse_api.get_quote("RELIANCE") == {"lastPrice": 2950.5}
+        snapshot = metrics.snapshot()
+    finally:
+        metrics.disable()
+        metrics.reset()
+    quote = snapshot["endpoints"]["/api/quote-equity"]
+    assert quote["requests"] == 1
+    assert quote["request_seconds"]["count"] == 1
+    assert quote["parse_seconds"]["count"] == 1
+    assert snapshot["caches"]["nse"]["hits"] >= 1
+    assert "calls" in snapshot["single_flight"]
+
+def test_throttled_requests_back_off_and_retry(requests_mock):
+    from pyfinmuni.utils.rate_limit import HostPolicy, RateLimits
+
+    requests_mock.get("https://nseindia.com", text="")
+    limits = RateLimits({"www.nseindia.com": HostPolicy(rate=3, throttle_statuses=(403, 429), backoff=0.01)})
+    nse = NSEApi(rate_limits=limits, background_session_refresh=False)
+    quote = requests_mock.get("https://www.nseindia.com/api/quote-equity?symbol=INFY",
+                              [{"status_code": 403}, {"json": {"priceInfo": {"lastPrice": 1500.0}}}])
+    assert nse.get_quote("INFY") == {"lastPrice": 1500.0}
+    assert quote.call_count == 2
+    stats = limits.stats()["www.nseindia.com"]
+    assert stats["throttled"] == 1
+    assert stats["rate"] < 3
+    nse.close()
+
+def test_forbidden_requests_retry_on_a_new_session(requests_mock):
+    from pyfinmuni.utils.rate_limit import HostPolicy, RateLimits
+
+    home = requests_mock.get("https://nseindia.com", text="")
+    limits = RateLimits({"www.nseindia.com": HostPolicy(throttle_statuses=(403, 429), backoff=0.01)})
+    nse = NSEApi(rate_limits=limits, background_session_refresh=False)
+    first = nse.session
+    clock = nse.sessions.clock
+    nse.sessions.clock = lambda: clock() + 60  # the session is old enough to be renewed
+    quote = requests_mock.get("https://www.nseindia.com/api/quote-equity?symbol=INFY",
+                              [{"status_code": 403}, {"status_code": 429}, {"json": {"priceInfo": {"lastPrice": 1.0}}}])
+
+    assert nse.get_quote("INFY") == {"lastPrice": 1.0}
+    assert quote.call_count == 3
+    assert home.call_count == 2 and nse.sessions.refreshes == 1  # only the 403 renews the session
+    assert nse.session is not first
+    nse.close()
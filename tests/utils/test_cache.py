@@ -0,0 +1,82 @@
+from datetime import datetime
+
+import pytest
+
+from pyfinmuni.utils.cache import IST, LRUCache, cached_method, seconds_until_nav_publish
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class Quotes:
+    def __init__(self, cache, cache_ttl=None):
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        self.calls = 0
+
+    @cached_method(ttl=10)
+    def get_quote(self, code):
+        self.calls += 1
+        return {"code": code} if code != "BAD" else {}
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+def test_ttl_expiry(clock):
+    cache = LRUCache(clock=clock)
+    cache.set(("ns", 1), "value", ttl=5)
+    assert cache.get(("ns", 1)) == "value"
+    clock.now = 5.1
+    assert cache.get(("ns", 1)) is None
+    assert cache.stats()["expirations"] == 1
+
+def test_lru_eviction_by_count_and_bytes():
+    cache = LRUCache(maxsize=2)
+    cache.set(("ns", 1), 1)
+    cache.set(("ns", 2), 2)
+    cache.get(("ns", 1))
+    cache.set(("ns", 3), 3)
+    assert cache.get(("ns", 2)) is None
+    assert cache.get(("ns", 1)) == 1
+
+    cache = LRUCache(maxsize=None, maxbytes=100, sizeof=len)
+    cache.set(("ns", "a"), "x" * 60)
+    cache.set(("ns", "b"), "y" * 60)
+    assert cache.get(("ns", "a")) is None
+    assert cache.stats()["bytes"] == 60
+
+def test_cached_method_is_per_instance(clock):
+    first, second = Quotes(LRUCache(clock=clock)), Quotes(LRUCache(clock=clock))
+    assert first.get_quote("INFY") == {"code": "INFY"}
+    assert first.get_quote("INFY") == {"code": "INFY"}
+    assert second.get_quote("INFY") == {"code": "INFY"}
+    assert (first.calls, second.calls) == (1, 1)
+    assert first.get_quote.cache_info() == {"hits": 1, "misses": 1}
+
+    clock.now = 11
+    first.get_quote("INFY")
+    assert first.calls == 2
+
+def test_invalidation_and_empty_results(clock):
+    quotes = Quotes(LRUCache(clock=clock), cache_ttl={"get_quote": 100})
+    quotes.get_quote("BAD")
+    quotes.get_quote("BAD")
+    assert quotes.calls == 2  # empty (error) results are not cached
+
+    quotes.get_quote("TCS")
+    clock.now = 50
+    quotes.get_quote("TCS")
+    assert quotes.calls == 3  # the per-instance TTL override applies
+    assert quotes.get_quote.invalidate("TCS") is True
+    quotes.get_quote("TCS")
+    assert quotes.calls == 4
+    quotes.get_quote.cache_clear()
+    assert len(quotes.cache) == 0
+
+def test_seconds_until_nav_publish():
+    assert seconds_until_nav_publish(datetime(2024, 7, 1, 23, 0, tzinfo=IST)) == 30 * 60
+    assert seconds_until_nav_publish(datetime(2024, 7, 1, 23, 45, tzinfo=IST)) == 23 * 3600 + 45 * 60
@@ -0,0 +1,112 @@
+import os
+import json
+
+import numpy as np
+
+from pyfinmuni.utils.embedding_builder import build_store, main, update_store
+from pyfinmuni.utils.embedding_store import EmbeddingStore
+
+
+class CountingEmbedder:
+    model_name = "fake"
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_batch(self, texts):
+        self.embedded.extend(texts)
+        return np.array([[len(text), text.count("a") + 1.0, 1.0] for text in texts], dtype=np.float32)
+
+
+def scheme_list(*schemes):
+    return [{"schemeCode": code, "schemeName": name} for code, name in schemes]
+
+
+def test_build_store_from_scratch():
+    embedder = CountingEmbedder()
+    store, report = build_store(scheme_list((1, "Alpha"), (2, "Beta"), (3, "Gamma")), embedder, batch_size=2)
+
+    assert embedder.embedded == ["Alpha", "Beta", "Gamma"]
+    assert report["added"] == 3 and report["kept"] == 0
+    assert store.fund_data == [("Alpha", 1), ("Beta", 2), ("Gamma", 3)]
+    np.testing.assert_allclose(np.linalg.norm(store.embeddings, axis=1), 1.0, rtol=1e-6)
+
+
+def test_update_embeds_only_changes(tmp_path):
+    path = str(tmp_path / "store")
+    update_store(path, scheme_list((1, "Alpha"), (2, "Beta"), (3, "Gamma")), CountingEmbedder())
+    first = EmbeddingStore.load(path)
+
+    embedder = CountingEmbedder()
+    report = update_store(path, scheme_list((2, "Beta"), (1, "Alpha Fund"), (4, "Delta")), embedder)
+    store = EmbeddingStore.load(path)
+
+    assert embedder.embedded == ["Alpha Fund", "Delta"]
+    assert {k: report[k] for k in ("kept", "added", "renamed", "removed")} == \
+        {"kept": 1, "added": 1, "renamed": 1, "removed": 1}
+    assert store.fund_data == [("Beta", 2), ("Alpha Fund", 1), ("Delta", 4)]
+    # Reused vectors are copied from the previous version, which stays readable
+    np.testing.assert_array_equal(store.embeddings[0], first.embeddings[1])
+
+
+def test_update_reembeds_stores_of_another_model_or_pooling(tmp_path):
+    path = str(tmp_path / "store")
+    update_store(path, scheme_list((1, "Alpha"), (2, "Beta")), CountingEmbedder())
+    assert EmbeddingStore.load(path).meta["model"] == "fake"
+
+    pooled = CountingEmbedder()
+    pooled.pooling = "mean"
+    report = update_store(path, scheme_list((1, "Alpha"), (2, "Beta")), pooled)
+    assert pooled.embedded == ["Alpha", "Beta"]
+    assert report["discarded_existing"] and report["kept"] == 0
+    assert EmbeddingStore.load(path).meta["pooling"] == "mean"
+
+    again = CountingEmbedder()
+    again.pooling = "mean"
+    assert update_store(path, scheme_list((1, "Alpha"), (2, "Beta")), again)["kept"] == 2
+    assert again.embedded == []
+
+    # A store without model meta, e.g. converted from the legacy .npy file
+    legacy = EmbeddingStore.from_fund_data([("Alpha", 1)], np.ones((1, 3)))
+    embedder = CountingEmbedder()
+    store, report = build_store(scheme_list((1, "Alpha")), embedder, existing=legacy)
+    assert embedder.embedded == ["Alpha"] and report["discarded_existing"]
+
+
+def test_store_path_is_swapped_atomically(tmp_path):
+    path = str(tmp_path / "store")
+    EmbeddingStore.from_fund_data([("Alpha", 1)], np.ones((1, 3))).save(path)
+
+    for _ in range(4):
+        update_store(path, scheme_list((1, "Alpha"), (2, "Beta")), CountingEmbedder(), keep=1)
+
+    assert os.path.islink(path)
+    versions = [name for name in os.listdir(tmp_path) if name.startswith("store.v")]
+    assert len(versions) == 2 and os.readlink(path) in versions
+    assert EmbeddingStore.load(path).fund_to_code_dict == {"Alpha": 1, "Beta": 2}
+
+
+def test_plain_directories_are_migrated_more_than_once(tmp_path):
+    path = str(tmp_path / "store")
+    for name in ("Alpha", "Beta"):
+        if os.path.islink(path):
+            os.remove(path)
+        EmbeddingStore.from_fund_data([(name, 1)], np.ones((1, 3))).save(path)
+        update_store(path, scheme_list((1, "Alpha")), CountingEmbedder(), keep=4)
+
+    versions = [name for name in os.listdir(tmp_path) if name.startswith("store.v")]
+    assert len(versions) == 4  # both plain directories and both builds
+    names = sorted(EmbeddingStore.load(str(tmp_path / version)).fund_data[0][0] for version in versions)
+    assert names == ["Alpha", "Alpha", "Alpha", "Beta"]
+
+
+def test_cli_from_snapshot(tmp_path, monkeypatch, capsys):
+    from pyfinmuni.utils import mf_fund_utils
+    monkeypatch.setattr(mf_fund_utils, "_embedder", CountingEmbedder())
+    snapshot = tmp_path / "schemes.json"
+    snapshot.write_text(json.dumps(scheme_list((1, "Alpha"), (2, "Beta"))))
+
+    main([str(tmp_path / "store"), "--snapshot", str(snapshot), "--float16"])
+
+    assert json.loads(capsys.readouterr().out)["added"] == 2
+    assert EmbeddingStore.load(str(tmp_path / "store")).embeddings.dtype == np.float16
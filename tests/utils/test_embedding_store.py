@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from pyfinmuni.utils.embedding_store import EmbeddingStore, convert_legacy, main
+
+FUND_DATA = [("Alpha Fund - Growth", 101), ("Beta Fund - Income", 102), ("Gamma Fund", 103)]
+EMBEDDINGS = np.array([[3.0, 4.0, 0.0], [0.0, 2.0, 0.0], [1.0, 1.0, 1.0]])
+
+
+@pytest.fixture
+def legacy_file(tmp_path):
+    path = tmp_path / "legacy.npy"
+    np.save(path, {"fund_data": FUND_DATA, "embeddings": EMBEDDINGS}, allow_pickle=True)
+    return str(path)
+
+
+def test_convert_legacy_round_trip(legacy_file, tmp_path):
+    convert_legacy(legacy_file, str(tmp_path / "store"))
+    store = EmbeddingStore.load(str(tmp_path / "store"))
+
+    assert isinstance(store.embeddings, np.memmap)
+    assert store.embeddings.dtype == np.float32
+    assert store.normalized
+    assert store.fund_data == FUND_DATA
+    assert store.fund_to_code_dict["Gamma Fund"] == 103
+    np.testing.assert_allclose(np.linalg.norm(store.embeddings, axis=1), 1.0, rtol=1e-6)
+    np.testing.assert_allclose(store.embeddings[0], [0.6, 0.8, 0.0], rtol=1e-6)
+    assert store.meta["pooling"] == store.pooling == "cls"  # legacy vectors are first-token ones
+
+
+def test_legacy_file_loads_in_memory(legacy_file):
+    store = EmbeddingStore.load(legacy_file)
+
+    assert not store.normalized
+    assert store.fund_data == FUND_DATA
+    np.testing.assert_array_equal(store.embeddings, EMBEDDINGS)
+
+
+def test_cli_converts_to_float16(legacy_file, tmp_path):
+    main(["convert", legacy_file, str(tmp_path / "store16"), "--float16"])
+    store = EmbeddingStore.load(str(tmp_path / "store16"))
+
+    assert store.embeddings.dtype == np.float16
+    assert store.meta["dtype"] == "float16"
+    assert store.meta["count"] == 3 and store.meta["dim"] == 3
+
+
+def test_string_codes_are_kept(tmp_path):
+    store = EmbeddingStore.from_fund_data([("A", "0001"), ("B", "0002")], np.eye(2))
+    store.save(str(tmp_path / "store"))
+
+    assert EmbeddingStore.load(str(tmp_path / "store")).fund_to_code_dict == {"A": "0001", "B": "0002"}
@@ -0,0 +1,42 @@
+from pyfinmuni.utils.fund_name_index import LexicalIndex, normalize_fund_name
+
+NAMES = [
+    "SBI Bluechip Fund - Direct Plan - Growth",
+    "SBI Bluechip Fund - Regular Plan - Growth",
+    "HDFC Top 100 Fund - Growth Option",
+    "ICICI Prudential Bluechip Fund - Direct Plan - IDCW",
+]
+
+
+def test_normalize_fund_name():
+    assert normalize_fund_name("SBI  Bluechip Fund - Direct Plan - Growth") == "sbi bluechip fund direct growth"
+    assert normalize_fund_name("sbi bluechip fund direct growth") == "sbi bluechip fund direct growth"
+    assert normalize_fund_name("L&T Midcap Fund") == "l and t midcap fund"
+
+
+def test_lookup():
+    index = LexicalIndex(NAMES)
+    assert index.lookup("sbi bluechip fund   direct growth") == [0]
+    assert index.lookup("HDFC Top 100 Fund Growth") == [2]
+    assert index.lookup("SBI Bluechip Fund") == []
+
+
+def test_shortlist_ranks_by_trigram_similarity():
+    index = LexicalIndex(NAMES)
+    rows, scores = index.shortlist("SBI Bluechip Direct Growth", 2)
+
+    assert rows.tolist() == [0, 1]
+    assert scores[0] > scores[1] > 0
+    assert index.shortlist("zzzz", 10)[1].max() == 0
+    assert len(index.shortlist("SBI", 10)[0]) == len(NAMES)
+
+
+def test_discriminators_match():
+    index = LexicalIndex(NAMES + ["HDFC Top 1000 Fund - Growth", "Nippon India Fixed Horizon Fund XLI Series 8",
+                                  "L&T Midcap Fund - Dividend"])
+    assert index.discriminators_match("HDFC Top 100 Growth", [2, 4, 0]).tolist() == [True, False, False]
+    assert index.discriminators_match("SBI Bluechip Direct Growth", [0, 1, 3]).tolist() == [True, False, False]
+    assert index.discriminators_match("Nippon India Fixed Horizon XLII Series 8", [5]).tolist() == [False]
+    assert index.discriminators_match("Nippon India Fixed Horizon XLI Series 8", [5]).tolist() == [True]
+    # Synonyms and single letters do not tell schemes apart
+    assert index.discriminators_match("L and T Midcap IDCW", [6]).tolist() == [True]
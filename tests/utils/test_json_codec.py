@@ -0,0 +1,24 @@
+import json
+
+import pytest
+import requests
+import requests_mock
+
+from pyfinmuni.utils.json_codec import loads, response_json
+
+
+def test_loads_matches_the_standard_library():
+    document = '{"data": [{"nav": "10.5"}], "n": 1.5, "x": null}'
+    assert loads(document) == loads(document.encode()) == json.loads(document)
+    assert loads("[NaN]")[0] != loads("[NaN]")[0]  # only the standard library accepts NaN
+    with pytest.raises(json.JSONDecodeError):
+        loads("{")
+
+
+def test_response_json_keeps_requests_errors():
+    with requests_mock.Mocker() as m:
+        m.get("https://example.com/ok", json={"ok": True})
+        m.get("https://example.com/html", text="<html></html>")
+        assert response_json(requests.get("https://example.com/ok")) == {"ok": True}
+        with pytest.raises(requests.exceptions.JSONDecodeError):
+            response_json(requests.get("https://example.com/html"))
@@ -0,0 +1,138 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from pyfinmuni.NSEApi import NSEApi
+from pyfinmuni.utils.cache import IST
+from pyfinmuni.utils.rate_limit import RateLimits
+from pyfinmuni.utils.market_poller import (GAINERS, MarketPoller, diff_records, index_feed, is_market_open,
+                                           quote_feed)
+
+INDICES_URL = "https://www.nseindia.com/api/allIndices?json=true"
+QUOTE_URL = "https://www.nseindia.com/api/quote-equity?symbol={code}"
+GAINERS_URL = "https://www.nseindia.com/api/live-analysis-variations?index=gainers&type=NIFTY&json=true"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def nse(requests_mock):
+    requests_mock.get("https://nseindia.com", text="")
+    api = NSEApi(max_workers=2, background_session_refresh=False, rate_limits=RateLimits(sleep=lambda delay: None))
+    yield api
+    api.close()
+
+
+@pytest.fixture
+def poller(nse):
+    return MarketPoller(nse, interval=5, closed_interval=600, jitter=0, market_open=lambda: True, clock=FakeClock())
+
+
+def indices(nifty, bank):
+    return {"data": [{"indexSymbol": "NIFTY 50", "last": nifty}, {"indexSymbol": "NIFTY BANK", "last": bank}]}
+
+
+def test_is_market_open():
+    assert is_market_open(datetime(2024, 7, 5, 10, 0, tzinfo=IST))
+    assert not is_market_open(datetime(2024, 7, 5, 16, 0, tzinfo=IST))
+    assert not is_market_open(datetime(2024, 7, 6, 10, 0, tzinfo=IST))  # Saturday
+
+
+def test_diff_records():
+    assert diff_records({"a": 1, "b": 2}, {"a": 1, "b": 3, "c": 4}) == ({"b": 3, "c": 4}, [])
+    assert diff_records({"a": 1, "b": 2}, {"a": 1}) == ({}, ["b"])
+
+
+def test_subscriptions_share_one_poll_per_endpoint(nse, poller, requests_mock):
+    upstream = requests_mock.get(INDICES_URL, [{"json": indices(24000, 51000)}, {"json": indices(24010, 51000)}])
+    nifty, bank, both = [], [], []
+    poller.subscribe([index_feed("nifty 50")], nifty.append)
+    poller.subscribe([index_feed("NIFTY BANK")], bank.append)
+    poller.subscribe([index_feed("NIFTY 50"), index_feed("NIFTY BANK")], both.append)
+
+    assert poller.endpoints() == [("indices",)]
+    assert poller.poll_due() == 1
+    assert poller.poll_due() == 0  # not due again before the interval
+    poller.clock.now = 5
+    assert poller.poll_due() == 1
+
+    assert upstream.call_count == 2
+    assert [u.changed for u in nifty] == [{"NIFTY 50": {"indexSymbol": "NIFTY 50", "last": 24000}},
+                                          {"NIFTY 50": {"indexSymbol": "NIFTY 50", "last": 24010}}]
+    assert len(bank) == 1  # NIFTY BANK did not change in the second poll
+    assert len(both) == 3
+
+
+def test_failed_polls_keep_the_last_snapshot(nse, poller, requests_mock):
+    upstream = requests_mock.get(INDICES_URL, [{"json": indices(24000, 51000)}]
+                                 + [{"status_code": 500}] * 3 + [{"json": indices(24000, 51010)}])
+    updates = []
+    poller.subscribe([index_feed("NIFTY 50"), index_feed("NIFTY BANK")], updates.append)
+
+    for now in (0, 5, 10):
+        poller.clock.now = now
+        poller.poll_due()
+
+    assert upstream.call_count == 5  # the 500 is retried until attempts run out
+    # Nothing is reported removed by the failed poll, nor re-added by the next good one
+    assert sorted((u.feed[1], u.changed[u.feed[1]]["last"], u.removed) for u in updates) == [
+        ("NIFTY 50", 24000, []), ("NIFTY BANK", 51000, []), ("NIFTY BANK", 51010, [])]
+    assert updates[-1].changed["NIFTY BANK"]["last"] == 51010
+    assert poller._records[("indices",)]["NIFTY 50"]["last"] == 24000
+
+
+def test_quotes_and_movers(nse, poller, requests_mock):
+    requests_mock.get(QUOTE_URL.format(code="TCS"), json={"priceInfo": {"lastPrice": 3900.0}})
+    requests_mock.get(GAINERS_URL, json={"NIFTY": {"data": [{"symbol": "TCS", "pChange": 2.1}]}, "legends": []})
+    updates = []
+    subscription = poller.subscribe([quote_feed("tcs"), GAINERS], updates.append)
+
+    poller.poll_due()
+    assert {u.feed: u.changed for u in updates} == {
+        ("quote", "TCS"): {"TCS": {"lastPrice": 3900.0}},
+        ("gainers",): {("NIFTY", "TCS"): {"symbol": "TCS", "pChange": 2.1}},
+    }
+
+    # A late subscriber gets the current state straight away
+    late = []
+    poller.subscribe([quote_feed("TCS")], late.append)
+    assert late[0].changed == {"TCS": {"lastPrice": 3900.0}}
+
+    subscription.unsubscribe()
+    assert set(poller.endpoints()) == {("quote", "TCS")}
+
+
+def test_closed_market_interval(nse, requests_mock):
+    requests_mock.get(INDICES_URL, json=indices(1, 2))
+    poller = MarketPoller(nse, interval=5, closed_interval=600, jitter=0.1, market_open=lambda: False, clock=FakeClock())
+    poller.subscribe([index_feed("NIFTY 50")])
+    poller.poll_due()
+    assert 540 <= poller._due[("indices",)] <= 660
+
+
+def test_async_iteration(nse, requests_mock):
+    requests_mock.get(INDICES_URL, [{"json": indices(1, 2)}, {"json": indices(3, 2)}])
+    poller = MarketPoller(nse, interval=0.01, jitter=0, market_open=lambda: True)
+
+    async def consume():
+        subscription = poller.subscribe([index_feed("NIFTY 50")])
+        updates = subscription.__aiter__()  # queue updates from the first poll on
+        poller.start()
+        received = []
+        async for update in updates:
+            received.append(update.changed["NIFTY 50"]["last"])
+            if len(received) == 2:
+                subscription.unsubscribe()
+        return received
+
+    try:
+        assert asyncio.run(asyncio.wait_for(consume(), 5)) == [1, 3]
+    finally:
+        poller.stop()
@@ -0,0 +1,95 @@
+import requests
+import requests_mock
+
+from pyfinmuni.utils.cache import LRUCache
+from pyfinmuni.utils.metrics import Histogram, Instrumentation, PrometheusExporter, render_prometheus
+
+
+def test_disabled_instrumentation_records_nothing():
+    metrics = Instrumentation()
+    assert metrics.clock() is None
+    metrics.observe("request_seconds", "/api/quote-equity", 0.1)
+    metrics.inc("retries", "/api/quote-equity")
+    assert metrics.snapshot()["endpoints"] == {}
+
+
+def test_histogram_quantiles_and_counters():
+    histogram = Histogram((0.01, 0.1, 1.0))
+    for value in [0.005] * 50 + [0.05] * 40 + [0.5] * 10:
+        histogram.observe(value)
+    assert histogram.counts == [50, 40, 10, 0]
+    assert 0 < histogram.quantile(0.5) <= 0.01
+    assert 0.1 < histogram.quantile(0.99) <= 1.0
+
+    metrics = Instrumentation(enabled=True)
+    seen = []
+    metrics.add_hook(lambda metric, endpoint, value: seen.append((metric, endpoint, value)))
+    metrics.observe("request_seconds", "mf.latest", 0.02)
+    metrics.inc("retries", "mf.latest")
+    metrics.inc("retries", "mf.latest")
+    endpoint = metrics.snapshot()["endpoints"]["mf.latest"]
+    assert endpoint["request_seconds"]["count"] == 1
+    assert endpoint["retries"] == 2
+    assert seen == [("request_seconds", "mf.latest", 0.02), ("retries", "mf.latest", 1), ("retries", "mf.latest", 1)]
+
+
+def test_record_response_and_parse_json():
+    metrics = Instrumentation(enabled=True)
+    with requests_mock.Mocker() as m:
+        m.get("https://example.com/api/allIndices", json={"data": []})
+        m.get("https://example.com/api/quote-equity", status_code=429)
+        responses = []
+        for url in ("https://example.com/api/allIndices?json=true", "https://example.com/api/quote-equity"):
+            start = metrics.clock()
+            responses.append(requests.get(url))
+            metrics.record_response(None, responses[-1], start)
+        assert metrics.parse_json(None, responses[0]) == {"data": []}
+
+    endpoints = metrics.snapshot()["endpoints"]
+    assert endpoints["/api/allIndices"]["requests"] == 1
+    assert endpoints["/api/allIndices"]["response_bytes"]["sum"] == len(b'{"data": []}')
+    assert endpoints["/api/allIndices"]["parse_seconds"]["count"] == 1
+    assert endpoints["/api/quote-equity"]["throttled"] == 1
+    assert endpoints["/api/quote-equity"]["errors"] == 1
+
+
+def test_cache_stats_and_sources_are_gathered():
+    metrics = Instrumentation(enabled=True)
+    first, second = LRUCache(), LRUCache()
+    metrics.watch_cache("nse", first)
+    metrics.watch_cache("nse", second)
+    metrics.add_source("component", lambda: {"calls": 3})
+    first.set("a", 1)
+    first.get("a")
+    second.get("b")
+    snapshot = metrics.snapshot()
+    assert snapshot["caches"]["nse"]["hits"] == 1
+    assert snapshot["caches"]["nse"]["misses"] == 1
+    assert snapshot["caches"]["nse"]["hit_ratio"] == 0.5
+    assert snapshot["component"] == {"calls": 3}
+    # Watching a cache does not keep it alive
+    del first, second
+    assert metrics.snapshot()["caches"] == {}
+
+
+def test_prometheus_exposition():
+    metrics = Instrumentation(enabled=True)
+    metrics.observe("request_seconds", "mf.list", 0.003)
+    metrics.inc("retries", "mf.list")
+    cache = LRUCache()
+    metrics.watch_cache("mf", cache)
+    text = render_prometheus(metrics)
+    assert "# TYPE pyfinmuni_request_seconds histogram" in text
+    assert 'pyfinmuni_request_seconds_bucket{endpoint="mf.list",le="0.005"} 1' in text
+    assert 'pyfinmuni_request_seconds_bucket{endpoint="mf.list",le="+Inf"} 1' in text
+    assert 'pyfinmuni_request_seconds_count{endpoint="mf.list"} 1' in text
+    assert 'pyfinmuni_retries_total{endpoint="mf.list"} 1' in text
+    assert 'pyfinmuni_cache_hits_total{cache="mf"} 0' in text
+
+    exporter = PrometheusExporter(port=0, host="127.0.0.1", instrumentation=metrics).start()
+    try:
+        response = requests.get(f"http://127.0.0.1:{exporter.port}/metrics")
+        assert response.status_code == 200
+        assert 'pyfinmuni_retries_total{endpoint="mf.list"} 1' in response.text
+    finally:
+        exporter.stop()
@@ -1,4 +1,8 @@
+import logging
 import pytest
+import numpy as np
+
+from pyfinmuni.utils.vector_index import BACKENDS
 
 @pytest.fixture
 def mf_fund_utils():
@@ -12,3 +16,186 @@ def test_find_top_fund_matches(mf_fund_utils):
 
     query_fund_name = "Principal Emerging Bluechip Fund - Growth Option"
     top_matches = mf_fund_utils.find_top_fund_matches(query_fund_name)
+
+def test_embedder_caches_and_batches_uncached_texts(mf_fund_utils, monkeypatch):
+    embedder = mf_fund_utils.FundNameEmbedder(cache_size=8)
+    embedder._model = object()  # skip loading the real model
+    forwarded = []
+
+    def forward(texts, pooling):
+        forwarded.append(list(texts))
+        return np.array([[len(text), 1.0 if pooling == "mean" else 0.0] for text in texts], dtype=np.float32)
+
+    monkeypatch.setattr(embedder, "_forward", forward)
+    first = embedder.embed_batch(["abc", "de", "abc"])
+    second = embedder.embed_batch(["de", "fghi", "abc"])
+
+    assert forwarded == [["abc", "de"], ["fghi"]]  # duplicates and cached texts skip the model
+    assert first[:, 0].tolist() == [3, 2, 3] and second[:, 0].tolist() == [2, 4, 3]
+    assert embedder.embed("de").tolist() == [2, 1]
+    assert len(forwarded) == 2
+    assert embedder.cache.stats()["hits"] == 3
+    assert embedder.embed("de", pooling="cls").tolist() == [2, 0]  # cached apart from the mean-pooled vector
+    assert len(forwarded) == 3
+
+def test_embedder_mean_pools_over_the_attention_mask(mf_fund_utils):
+    torch = pytest.importorskip("torch")
+    from types import SimpleNamespace
+
+    def tokenizer(texts, **kwargs):
+        # "a b" is padded to the length of "a b c"
+        return {"input_ids": torch.tensor([[1, 2, 0], [1, 2, 3]]),
+                "attention_mask": torch.tensor([[1, 1, 0], [1, 1, 1]])}
+
+    def model(input_ids, attention_mask):
+        hidden = torch.tensor([[[1.0, 0.0], [3.0, 2.0], [100.0, 100.0]],
+                               [[1.0, 0.0], [3.0, 2.0], [5.0, 4.0]]])
+        return SimpleNamespace(last_hidden_state=hidden)
+
+    embedder = mf_fund_utils.FundNameEmbedder()
+    embedder._torch, embedder._tokenizer, embedder._model = torch, tokenizer, model
+    vectors = embedder.embed_batch(["a b", "a b c"])
+
+    assert vectors.dtype == np.float32
+    np.testing.assert_allclose(vectors, [[2.0, 1.0], [3.0, 2.0]])  # the padding token is left out
+    assert embedder.pooling == mf_fund_utils.POOLING
+    np.testing.assert_allclose(embedder.embed_batch(["a b", "a b c"], pooling="cls"), [[1.0, 0.0], [1.0, 0.0]])
+
+def test_embedder_rejects_unknown_pooling(mf_fund_utils):
+    with pytest.raises(ValueError):
+        mf_fund_utils.FundNameEmbedder(pooling="max")
+
+class FakeEmbedder:
+    vectors = {"Alpha Growth": [1.0, 0.1, 0.0], "Beta Income": [0.0, 1.0, 0.1], "Gamma": [0.2, 0.0, 1.0]}
+
+    def embed(self, text):
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts):
+        return np.array([self.vectors[text] for text in texts], dtype=np.float32)
+
+@pytest.fixture
+def small_index(mf_fund_utils, monkeypatch):
+    monkeypatch.setattr(mf_fund_utils, "_embedder", FakeEmbedder())
+    fund_data = [("Alpha Fund - Growth", 1), ("Beta Fund - Income", 2), ("Gamma Fund", 3), ("Delta Fund", 4)]
+    embeddings = np.array([[1.0, 0.0, 0.0], [0.0, 2.0, 0.0], [0.0, 0.0, 1.0], [0.7, 0.7, 0.0]])
+    return fund_data, embeddings, {name: code for name, code in fund_data}
+
+def test_find_top_fund_matches_batch(mf_fund_utils, small_index):
+    fund_data, embeddings, fund_to_code_dict = small_index
+    queries = ["Alpha Growth", "Delta Fund", "Beta Income"]
+    batch = mf_fund_utils.find_top_fund_matches_batch(queries, fund_data, embeddings, fund_to_code_dict, top_n=2)
+
+    assert [[m["fund_code"] for m in matches] for matches in batch] == [[1, 4], [4], [2, 4]]
+    for query, matches in zip(queries, batch):
+        assert matches == mf_fund_utils.find_top_fund_matches(query, fund_data, embeddings, fund_to_code_dict, top_n=2)
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float16])
+def test_matches_from_lazy_store(mf_fund_utils, small_index, monkeypatch, tmp_path, dtype):
+    from pyfinmuni.utils.embedding_store import EmbeddingStore
+    fund_data, embeddings, fund_to_code_dict = small_index
+    EmbeddingStore.from_fund_data(fund_data, embeddings).save(str(tmp_path / "store"), dtype=dtype)
+    monkeypatch.setenv("mf_embeddings_path", str(tmp_path / "store"))
+    monkeypatch.setattr(mf_fund_utils, "_store", None)
+    monkeypatch.setattr(mf_fund_utils, "SCORE_BLOCK_ROWS", 3)
+
+    matches = mf_fund_utils.find_top_fund_matches("Alpha Growth", top_n=2)
+
+    assert [m["fund_code"] for m in matches] == [1, 4]
+    assert mf_fund_utils.fund_to_code_dict == fund_to_code_dict
+    assert mf_fund_utils.find_top_fund_matches_batch(["Gamma Fund", "Alpha Growth"], top_n=2)[1] == matches
+
+class PoolingEmbedder(FakeEmbedder):
+    pooling = "mean"
+
+    def __init__(self):
+        self.poolings = []
+
+    def embed_batch(self, texts, pooling=None):
+        self.poolings.append(pooling or self.pooling)
+        return super().embed_batch(texts)
+
+@pytest.mark.parametrize("store_pooling, query_pooling", [(None, "cls"), ("cls", "cls"), ("mean", "mean")])
+def test_queries_are_pooled_like_the_store(mf_fund_utils, small_index, monkeypatch, tmp_path, caplog,
+                                           store_pooling, query_pooling):
+    from pyfinmuni.utils.embedding_store import EmbeddingStore
+    fund_data, embeddings, fund_to_code_dict = small_index
+    meta = {"pooling": store_pooling} if store_pooling else None
+    EmbeddingStore.from_fund_data(fund_data, embeddings).save(str(tmp_path / "store"), extra_meta=meta)
+    monkeypatch.setenv("mf_embeddings_path", str(tmp_path / "store"))
+    monkeypatch.setattr(mf_fund_utils, "_store", None)
+    embedder = PoolingEmbedder()
+    monkeypatch.setattr(mf_fund_utils, "_embedder", embedder)
+
+    with caplog.at_level(logging.WARNING):
+        assert mf_fund_utils.find_top_fund_matches("Alpha Growth", top_n=1)[0]["fund_code"] == 1
+    mf_fund_utils.find_top_fund_matches("Gamma", fund_data, embeddings, fund_to_code_dict, top_n=1)
+
+    assert embedder.poolings == [query_pooling, "mean"]  # caller-supplied embeddings use the embedder's own
+    assert ("first-token" in caplog.text) == (query_pooling == "cls")
+
+def test_lexical_tiers_skip_the_model(mf_fund_utils, small_index, monkeypatch):
+    fund_data, embeddings, fund_to_code_dict = small_index
+    calls = []
+    monkeypatch.setattr(FakeEmbedder, "embed_batch", lambda self, texts: calls.append(texts))
+    mf_fund_utils.match_stats.reset()
+
+    normalized, lexical = mf_fund_utils.find_top_fund_matches_batch(
+        ["alpha fund growth", "Beta Fund Income Plan X"], fund_data, embeddings, fund_to_code_dict, top_n=1)
+
+    assert calls == []
+    assert normalized == [{"fund_name": "Alpha Fund - Growth", "fund_code": 1, "cosine_similarity_score": 1.0,
+                           "match_tier": "normalized"}]
+    assert lexical[0]["fund_code"] == 2 and lexical[0]["match_tier"] == "lexical"
+    assert lexical[0]["trigram_similarity_score"] >= mf_fund_utils.LEXICAL_THRESHOLD
+    assert lexical[0]["cosine_similarity_score"] == lexical[0]["trigram_similarity_score"]  # the original key stays
+    stats = mf_fund_utils.match_stats.snapshot()
+    assert stats["normalized"]["count"] == 1 and stats["lexical"]["count"] == 1 and stats["neural"]["count"] == 0
+
+@pytest.mark.parametrize("query, twin", [
+    ("UTI Nifty 50 Index Fund - Direct Growth", "UTI Nifty 500 Index Fund - Direct Growth"),
+    ("Kotak Nifty AAA Bond Jun 2025 HTM Index Fund - Direct Plan - Payout of IDCW option",
+     "Kotak Nifty AAA Bond Jun 2025 HTM Index Fund - Regular Plan - Payout of IDCW option"),
+    ("Nippon India Fixed Horizon Fund XLII Series 8 - Direct Plan - Growth Option",
+     "Nippon India Fixed Horizon Fund XLI Series 8 - Direct Plan - Growth Option"),
+    ("Aditya Birla Sun Life Banking and PSU Debt Fund - Direct Plan - Growth",
+     "Aditya Birla Sun Life Banking and PSU Debt Fund - Regular Plan - Growth"),
+    ("Aditya Birla Sun Life Banking and PSU Debt Fund - Direct - IDCW Payout",
+     "Aditya Birla Sun Life Banking and PSU Debt Fund - Direct - IDCW Reinvestment"),
+    ("HDFC Liquid Fund - Direct Plan - Daily IDCW Reinvestment", "HDFC Liquid Fund - Direct Plan - Weekly IDCW Reinvestment"),
+])
+def test_lexical_tier_never_answers_with_another_scheme(mf_fund_utils, monkeypatch, query, twin):
+    fund_data = [(twin, 1), ("Gamma Fund", 2)]
+    embeddings = np.array([[1.0, 0.0], [0.0, 1.0]])
+    monkeypatch.setattr(mf_fund_utils, "_embedder", FakeEmbedder())
+    monkeypatch.setitem(FakeEmbedder.vectors, query, [0.2, 1.0])
+    # Scores at or near the threshold: trigrams alone cannot be trusted here
+    assert mf_fund_utils.lexical_index(fund_data).shortlist(query, 1)[1][0] >= 0.85
+    monkeypatch.setattr(mf_fund_utils, "LEXICAL_THRESHOLD", 0.85)
+
+    matches = mf_fund_utils.find_top_fund_matches(query, fund_data, embeddings, {}, top_n=1)
+
+    assert matches[0]["match_tier"] == "neural" and matches[0]["fund_code"] == 2
+
+
+def test_neural_tier_reranks_the_shortlist(mf_fund_utils, small_index, monkeypatch):
+    fund_data, embeddings, fund_to_code_dict = small_index
+    monkeypatch.setattr(mf_fund_utils, "SHORTLIST_SIZE", 2)
+    mf_fund_utils.match_stats.reset()
+
+    matches = mf_fund_utils.find_top_fund_matches("Gamma", fund_data, embeddings, fund_to_code_dict, top_n=1)
+
+    assert [m["fund_code"] for m in matches] == [3]
+    assert mf_fund_utils.match_stats.snapshot()["neural"]["count"] == 1
+
+@pytest.mark.parametrize("backend", ["exact", "int8", "ivf"])
+def test_full_scan_uses_the_vector_index(mf_fund_utils, small_index, monkeypatch, backend):
+    fund_data, embeddings, fund_to_code_dict = small_index
+    # No trigram in common with any fund name, so every fund is scored
+    monkeypatch.setitem(FakeEmbedder.vectors, "Xyz", [0.1, 0.0, 1.0])
+    monkeypatch.setattr(mf_fund_utils, "VECTOR_INDEX", backend)
+
+    matches = mf_fund_utils.find_top_fund_matches("Xyz", fund_data, embeddings, fund_to_code_dict, top_n=2)
+
+    assert [m["fund_code"] for m in matches] == [3, 1]
+    assert isinstance(mf_fund_utils.vector_index(embeddings), BACKENDS[backend])
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from pyfinmuni.utils.nav_analytics import NavMatrix, NavSeries, sip_dates, trailing_returns_for, xirr
+
+@pytest.fixture
+def series():
+    payload = {
+        "meta": {"scheme_code": 123456},
+        "data": [
+            {"date": "01-01-2024", "nav": "121.0"},
+            {"date": "01-07-2023", "nav": "90.0"},
+            {"date": "01-01-2023", "nav": "110.0"},
+            {"date": "01-01-2022", "nav": "100.0"},
+        ],
+    }
+    return NavSeries.from_payload(payload)
+
+def test_from_payload_sorts_ascending(series):
+    assert series.scheme_code == 123456
+    assert series.dates.dtype == np.dtype("datetime64[D]")
+    assert series.navs.tolist() == [100.0, 110.0, 90.0, 121.0]
+    assert len(series.slice("01-06-2023", "2024-01-01")) == 2
+    assert series.nav_on("15-08-2023") == 90.0
+    assert np.isnan(series.nav_on("31-12-2021"))
+
+def test_returns_and_risk(series):
+    assert series.point_to_point_return("01-01-2022", "01-01-2024") == pytest.approx(0.21)
+    assert series.cagr("01-01-2022", "01-01-2024") == pytest.approx(1.21 ** (365 / 730) - 1)
+    assert series.max_drawdown() == pytest.approx(90 / 110 - 1)
+    rolling = series.rolling_returns(365)
+    assert np.isnan(rolling[0])
+    assert rolling[1] == pytest.approx(0.1)
+    assert series.volatility(periods_per_year=2) > 0
+
+def test_xirr_matches_simple_growth():
+    # 100 invested, 110 back one year later
+    assert xirr(np.array([0, 365]), np.array([-100.0, 110.0]))[()] == pytest.approx(0.1)
+
+def test_sip_xirr_on_flat_nav_is_zero(series):
+    flat = NavSeries(np.array(["2023-01-01", "2024-01-01"], dtype="datetime64[D]"), np.array([10.0, 10.0]))
+    assert len(sip_dates("2023-01-01", "2023-12-31")) == 12
+    assert flat.sip_xirr(1000, "2023-01-01", "2024-01-01") == pytest.approx(0.0, abs=1e-9)
+
+def test_matrix_aligns_and_vectorizes(series):
+    other = NavSeries(np.array(["2023-01-01", "2024-01-01"], dtype="datetime64[D]"), np.array([50.0, 55.0]), 654321)
+    matrix = NavMatrix.align([series, other])
+    assert matrix.values.shape == (4, 2)
+    assert np.isnan(matrix.values[0, 1])  # before the second fund's first NAV
+
+    returns = trailing_returns_for([series, other], as_of="2024-01-01", periods={"1Y": 365})
+    assert returns[123456]["1Y"] == pytest.approx(0.1)
+    assert returns[654321]["1Y"] == pytest.approx(0.1)
+    assert matrix.max_drawdown().tolist() == pytest.approx([90 / 110 - 1, 0.0])
+
+def test_empty_series_give_nan(series):
+    empty = NavSeries.from_payload({"meta": {"scheme_code": 111111}, "data": []})
+    assert len(empty) == 0
+    assert np.isnan(empty.nav_on("01-01-2024"))
+    assert np.isnan(empty.point_to_point_return("01-01-2023", "01-01-2024"))
+    assert np.isnan(empty.max_drawdown())
+    assert np.isnan(empty.sip_xirr(1000, "2023-01-01", "2024-01-01"))
+    assert len(empty.rolling_returns(365)) == 0
+
+    returns = trailing_returns_for([series, empty], as_of="2024-01-01", periods={"1Y": 365})
+    assert returns[123456]["1Y"] == pytest.approx(0.1)
+    assert np.isnan(returns[111111]["1Y"])
+    assert trailing_returns_for([]) == {}
+
+def test_sip_without_instalments_is_nan(series):
+    # No instalment date falls between the 2nd and the 20th of the month
+    assert len(sip_dates("2023-01-02", "2023-01-20")) == 0
+    assert np.isnan(series.sip_xirr(1000, "2023-01-02", "2023-01-20"))
+    matrix = NavMatrix.align([series, series])
+    assert np.isnan(matrix.sip_xirr(1000, "2023-01-02", "2023-01-20")).all()
+    assert np.isnan(matrix.slice("2030-01-01").max_drawdown()).all()
@@ -0,0 +1,84 @@
+import pytest
+
+from pyfinmuni.utils.nav_store import NavHistoryStore, format_day, parse_day
+
+HISTORY = {
+    "meta": {"scheme_code": 123456, "scheme_name": "Test Fund"},
+    "data": [
+        {"date": "03-07-2024", "nav": "12.30000"},
+        {"date": "02-07-2024", "nav": "12.20000"},
+        {"date": "01-07-2024", "nav": "12.10000"},
+    ],
+    "status": "SUCCESS",
+}
+
+class FakeApi:
+    def __init__(self, history, latest):
+        self.history = history
+        self.latest = latest
+        self.history_calls = 0
+        self.latest_calls = 0
+
+    def fetch_latest(self, mf_code):
+        self.latest_calls += 1
+        return self.latest
+
+    def fetch_history(self, mf_code):
+        self.history_calls += 1
+        return self.history
+
+@pytest.fixture
+def store(tmp_path):
+    return NavHistoryStore(str(tmp_path / "navs"))
+
+def test_day_round_trip():
+    assert format_day(parse_day("29-02-2024")) == "29-02-2024"
+
+def test_refresh_downloads_then_appends_only_new_rows(store):
+    api = FakeApi(HISTORY, {"data": [HISTORY["data"][0]]})
+    assert store.refresh(123456, api.fetch_latest, api.fetch_history) == 3
+    assert store.to_payload(123456) == HISTORY
+
+    # Same latest NAV: only the cheap /latest call is made
+    assert store.refresh(123456, api.fetch_latest, api.fetch_history, force=True) == 0
+    assert (api.latest_calls, api.history_calls) == (1, 1)
+
+    # A new NAV: history is downloaded and only the new row is appended
+    api.history = dict(HISTORY, data=[{"date": "04-07-2024", "nav": "12.40000"}] + HISTORY["data"])
+    api.latest = {"data": [{"date": "04-07-2024", "nav": "12.40000"}]}
+    assert store.refresh(123456, api.fetch_latest, api.fetch_history, force=True) == 1
+    records = store.load(123456)
+    assert records["nav"].tolist() == [12.1, 12.2, 12.3, 12.4]
+    assert store.codes() == [123456]
+
+def test_restarted_process_reads_locally(store):
+    api = FakeApi(HISTORY, {"data": [HISTORY["data"][0]]})
+    store.refresh(123456, api.fetch_latest, api.fetch_history)
+
+    reopened = NavHistoryStore(store.root)
+    assert reopened.is_fresh(123456)
+    assert reopened.refresh(123456, api.fetch_latest, api.fetch_history) == 0
+    assert (api.latest_calls, api.history_calls) == (0, 1)
+    assert reopened.to_payload(123456)["data"][0] == {"date": "03-07-2024", "nav": "12.30000"}
+
+def test_crash_between_the_two_writes_neither_duplicates_nor_skips(store):
+    store.append(123456, dict(HISTORY, data=HISTORY["data"][1:]))
+    sidecar = store.load_meta(123456)
+    # The process dies after appending 03-07 but before the sidecar is rewritten
+    store.append(123456, HISTORY)
+    store._save_meta(123456, dict(sidecar, last_day=parse_day("01-07-2024")))
+    assert store.last_day(123456) == parse_day("03-07-2024")
+    assert store.append(123456, HISTORY) == 0
+
+    # An append torn halfway through a record is cut back before the next one
+    with open(store._path(123456, "nav"), "ab") as f:
+        f.write(b"\x01\x02\x03")
+    assert len(store.load(123456)) == 3 and store.last_day(123456) == parse_day("03-07-2024")
+    assert store.append(123456, {"data": [{"date": "04-07-2024", "nav": "12.40000"}]}) == 1
+    assert store.load(123456)["nav"].tolist() == [12.1, 12.2, 12.3, 12.4]
+
+def test_warm(store):
+    api = FakeApi(HISTORY, {})
+    warmed = store.warm([1, 2, 3], api.fetch_latest, api.fetch_history, max_workers=2)
+    assert warmed == {1: 3, 2: 3, 3: 3}
+    assert warmed.ok
@@ -0,0 +1,86 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from pyfinmuni.utils.nse_history import HistoricalDataEngine, missing_intervals, split_interval
+
+class FakeNSE:
+    def __init__(self):
+        self.requests = []
+
+    def get_historical_data(self, code, from_date, to_date, raise_errors=False):
+        self.requests.append((from_date, to_date))
+        start = datetime.strptime(from_date, "%d-%m-%Y").date()
+        end = datetime.strptime(to_date, "%d-%m-%Y").date()
+        rows = []
+        day = start
+        while day <= end:
+            if day.weekday() < 5:
+                rows.append({"CH_SYMBOL": code, "CH_TIMESTAMP": day.isoformat(),
+                             "CH_CLOSING_PRICE": float(day.toordinal() % 1000), "CH_TOT_TRADED_QTY": 100})
+            day += timedelta(days=1)
+        # Newest first, with an overlapping duplicate row, like real responses can have
+        return {"data": rows[::-1] + rows[:1]}
+
+@pytest.fixture
+def nse():
+    return FakeNSE()
+
+def test_interval_helpers():
+    assert split_interval(1, 10, 4) == [(1, 4), (5, 8), (9, 10)]
+    assert missing_intervals(1, 20, [(3, 5), (8, 30)]) == [(1, 2), (6, 7)]
+    assert missing_intervals(1, 5, []) == [(1, 5)]
+
+def test_long_range_is_chunked_merged_and_sorted(nse):
+    engine = HistoricalDataEngine(nse, chunk_days=30)
+    data = engine.get("reliance", "01-01-2023", "31-12-2023")
+    assert len(nse.requests) == 13
+    assert data["date"].dtype == np.dtype("datetime64[D]")
+    assert len(data["date"]) == 260
+    assert np.all(np.diff(data["date"].astype(np.int64)) > 0)
+    assert np.isnan(data["open"]).all()
+    assert data["volume"][0] == 100
+
+def test_extended_query_only_fetches_gaps(nse, tmp_path):
+    engine = HistoricalDataEngine(nse, cache_dir=str(tmp_path), chunk_days=30)
+    engine.get("INFY", "01-03-2023", "31-03-2023")
+    nse.requests.clear()
+
+    # A fresh engine (e.g. after a restart) reads the coverage from disk
+    engine = HistoricalDataEngine(nse, cache_dir=str(tmp_path), chunk_days=30)
+    data = engine.get("INFY", "15-02-2023", "15-04-2023")
+    assert nse.requests == [("15-02-2023", "28-02-2023"), ("01-04-2023", "15-04-2023")]
+    assert str(data["date"][0]) == "2023-02-15" and str(data["date"][-1]) == "2023-04-14"
+    assert engine.coverage("infy") == [(date(2023, 2, 15), date(2023, 4, 15))]
+
+def test_failed_chunks_are_refetched(nse):
+    engine = HistoricalDataEngine(nse, chunk_days=10)
+    calls = {"n": 0}
+    fetch = nse.get_historical_data
+
+    def flaky(code, from_date, to_date, raise_errors=False):
+        calls["n"] += 1
+        if from_date == "11-01-2023" and calls["n"] <= 3:
+            raise IOError("throttled")
+        return fetch(code, from_date, to_date, raise_errors)
+
+    nse.get_historical_data = flaky
+    with pytest.raises(IOError):
+        engine.get("TCS", "01-01-2023", "30-01-2023")
+    nse.requests.clear()
+    engine.get("TCS", "01-01-2023", "30-01-2023")
+    assert nse.requests == [("11-01-2023", "20-01-2023")]
+
+@pytest.mark.parametrize("payload", [{}, {"error": "Resource not found"}, {"data": None}, None])
+def test_chunks_without_data_are_not_covered(nse, payload):
+    engine = HistoricalDataEngine(nse, chunk_days=10)
+    fetch = nse.get_historical_data
+
+    def bad_page(code, from_date, to_date, raise_errors=False):
+        return payload if from_date == "11-01-2023" else fetch(code, from_date, to_date, raise_errors)
+
+    nse.get_historical_data = bad_page
+    with pytest.raises(ValueError):
+        engine.get("TCS", "01-01-2023", "30-01-2023")
+    assert engine.coverage("tcs") == [(date(2023, 1, 1), date(2023, 1, 10)), (date(2023, 1, 21), date(2023, 1, 30))]
@@ -0,0 +1,25 @@
+from pyfinmuni.utils.nse_indices import IndexSnapshot
+
+PAYLOAD = {"data": [{"indexSymbol": "NIFTY 50", "last": 24000.5}, {"indexSymbol": "INDIA VIX", "last": 13.2},
+                    {"index": "no symbol"}]}
+
+
+def test_index_snapshot():
+    snapshot = IndexSnapshot(PAYLOAD, fetched_at=1.0)
+
+    assert len(snapshot) == 2 and snapshot.symbols == ["NIFTY 50", "INDIA VIX"]
+    assert "india vix" in snapshot and "NIFTY BANK" not in snapshot and None not in snapshot
+    assert snapshot.get("Nifty 50")["last"] == 24000.5
+    assert snapshot.get("NIFTY BANK") is None
+    assert snapshot.payload is PAYLOAD
+
+
+def test_get_many():
+    result = IndexSnapshot(PAYLOAD).get_many(["nifty 50", "NIFTY BANK"])
+
+    assert list(result) == ["NIFTY 50"]
+    assert list(result.errors) == ["NIFTY BANK"]
+
+
+def test_empty_snapshot_is_falsy():
+    assert not IndexSnapshot({})
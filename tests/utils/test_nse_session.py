@@ -0,0 +1,92 @@
+import gc
+import time
+import weakref
+
+import pytest
+import requests
+
+from pyfinmuni.utils.nse_session import NSESessionManager
+
+HOME = "https://nseindia.com"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def home(requests_mock):
+    return requests_mock.get(HOME, text="", cookies={"nsit": "abc"})
+
+
+def test_session_is_reused_until_it_expires(home):
+    clock = FakeClock()
+    manager = NSESessionManager(HOME, {"User-Agent": "test"}, refresh_interval=300, pool_maxsize=16,
+                                background=False, clock=clock)
+    first = manager.session()
+
+    assert home.call_count == 1
+    assert first.headers["User-Agent"] == "test"
+    assert first.get_adapter(HOME)._pool_maxsize == 16
+    clock.now = 299
+    assert manager.session() is first
+
+    clock.now = 301
+    second = manager.session()
+    assert second is not first and home.call_count == 2 and manager.refreshes == 1
+    assert manager.session() is second
+    manager.close()
+
+
+def test_stale_session_is_served_while_background_refresh_fails(home, requests_mock):
+    clock = FakeClock()
+    manager = NSESessionManager(HOME, {}, refresh_interval=300, background=True, clock=clock)
+    first = manager.session()
+    requests_mock.get(HOME, exc=requests.exceptions.ConnectTimeout)
+
+    clock.now = 400
+    # Older than refresh_interval but younger than max_age: no caller pays for the handshake
+    assert manager.session() is first
+
+    clock.now = 700
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        manager.session()
+    manager.close()
+
+
+def test_background_thread_rotates_the_session(home):
+    manager = NSESessionManager(HOME, {}, refresh_interval=0.1, retry_interval=0.01)
+    first = manager.session()
+    deadline = time.monotonic() + 5
+    while manager.refreshes < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    manager.close()
+
+    assert manager.refreshes >= 2
+    assert manager.session() is not first
+    assert not manager._thread.is_alive()
+
+
+def test_first_handshake_failure_raises(requests_mock):
+    requests_mock.get(HOME, exc=requests.exceptions.ConnectionError)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        NSESessionManager(HOME, {}, background=False)
+
+
+def test_dropped_manager_is_collected_and_its_thread_exits(home):
+    manager = NSESessionManager(HOME, {}, refresh_interval=300)
+    thread, collected = manager._thread, weakref.ref(manager)
+    del manager
+
+    deadline = time.monotonic() + 5
+    while collected() is not None and time.monotonic() < deadline:
+        gc.collect()
+        time.sleep(0.01)
+    thread.join(timeout=5)
+
+    assert collected() is None
+    assert not thread.is_alive()
@@ -0,0 +1,110 @@
+import threading
+
+import numpy as np
+import pytest
+
+from pyfinmuni.utils.nav_analytics import NavSeries
+from pyfinmuni.utils.portfolio import EQUITY, MUTUAL_FUND, PortfolioValuer, PriceSnapshot
+from pyfinmuni.utils.scheme_registry import SchemeRegistry
+from pyfinmuni.utils.symbol_table import SymbolTable
+
+
+class FakeNSE:
+    def __init__(self, quotes):
+        self.quotes = quotes
+        self.requested = []
+        self.lock = threading.Lock()
+        self.symbol_master = self
+        self._table = SymbolTable([["RELIANCE", "Reliance Industries Limited", "EQ", "29-NOV-1995", "10",
+                                    "1", "INE002A01018", "10"]])
+
+    def table(self):
+        return self._table
+
+    def get_quote(self, code, all_data=False, raise_errors=False):
+        with self.lock:
+            self.requested.append(code)
+        if code not in self.quotes:
+            raise LookupError(f"no quote for {code}")
+        return self.quotes[code]
+
+
+class FakeMF:
+    shared_plane = None
+
+    def __init__(self, navs):
+        self.navs = navs
+        self.requested = []
+        self.registry = SchemeRegistry([{"schemeCode": 125497, "schemeName": "SBI Small Cap Fund - Direct Plan - Growth",
+                                         "isinGrowth": "INF200K01T51"}])
+
+    def get_mf_price_latest(self, mf_code):
+        self.requested.append(mf_code)
+        return {"data": [{"date": "15-10-2026", "nav": self.navs[mf_code]}]} if mf_code in self.navs else {}
+
+
+@pytest.fixture
+def valuer():
+    nse = FakeNSE({"RELIANCE": {"lastPrice": 2900.0, "previousClose": 2800.0},
+                   "TCS": {"lastPrice": 4000.0, "previousClose": 4100.0}})
+    valuer = PortfolioValuer(nse, FakeMF({125497: "150.00000"}))
+    yield valuer
+    valuer.close()
+
+
+def test_distinct_instruments_are_priced_once(valuer):
+    portfolios = {
+        "alice": [{"symbol": "reliance", "quantity": 10, "avg_cost": 2500},
+                  {"scheme_code": "125497", "quantity": 100, "avg_cost": 100}],
+        "bob": [{"isin": "INE002A01018", "quantity": 1}, {"symbol": "TCS", "quantity": 2, "avg_cost": 3000},
+                {"isin": "INF200K01T51", "quantity": 10}],
+    }
+    valuation = valuer.value_many(portfolios)
+
+    assert sorted(valuer.nse.requested) == ["RELIANCE", "TCS"]
+    assert valuer.mf.requested == [125497]
+    np.testing.assert_allclose(valuation.market_value, [29000 + 15000, 2900 + 8000 + 1500])
+
+    alice = valuation["alice"]
+    assert alice["cost"] == 25000 + 10000 and alice["pnl"] == 4000 + 5000
+    assert alice["day_change"] == 1000  # the fund's previous NAV is unknown
+    assert alice["day_change_pct"] == pytest.approx(1000 / 28000 * 100)
+    assert alice["day_change_coverage"] == pytest.approx(29000 / 44000)
+    bob = valuation["bob"]
+    assert bob["day_change"] == 100 - 200
+    assert bob["day_change_coverage"] == pytest.approx((2900 + 8000) / (2900 + 8000 + 1500))
+    assert bob["pnl"] == 2000  # only holdings with a cost count towards the P&L
+    assert bob["holdings"][2]["instrument"] == (MUTUAL_FUND, 125497)
+
+
+def test_unknown_instruments_are_reported(valuer):
+    summary = valuer.value([{"symbol": "RELIANCE", "quantity": 1}, {"symbol": "NOPE", "quantity": 5},
+                            {"isin": "INE000000000", "quantity": 1}, {"quantity": 3}])
+    assert summary["market_value"] == 2900
+    assert sorted(summary["errors"]) == [1, 2, 3]
+    assert summary["holdings"][1]["value"] is None
+
+
+def test_revaluing_against_a_shared_snapshot(valuer):
+    snapshot = PriceSnapshot([(EQUITY, "TCS"), (MUTUAL_FUND, 125497)], [4200.0, 151.0], [4000.0, 150.0])
+    portfolios = {user: [{"symbol": "TCS", "quantity": user + 1}, {"scheme_code": 125497, "quantity": 10}]
+                  for user in range(1000)}
+    valuation = valuer.value_many(portfolios, snapshot=snapshot)
+    assert not valuer.nse.requested and not valuer.mf.requested
+    np.testing.assert_allclose(valuation.market_value, 4200 * (np.arange(1000) + 1) + 1510)
+    np.testing.assert_allclose(valuation.total_day_change, 200 * (np.arange(1000) + 1) + 10)
+
+
+def test_fund_day_change_comes_from_the_history_store():
+    mf = FakeMF({125497: "150.00000"})
+    mf.history_store = object()
+    mf.get_mf_nav_series = lambda mf_code: NavSeries(np.array(["2026-10-14", "2026-10-15"], dtype="datetime64[D]"),
+                                                     np.array([148.0, 150.0]), mf_code)
+    valuer = PortfolioValuer(None, mf)
+    summary = valuer.value([{"scheme_code": 125497, "quantity": 10}])
+    valuer.close()
+
+    assert valuer.mf_day_change and not mf.requested
+    assert summary["market_value"] == 1500 and summary["day_change"] == 20
+    assert summary["day_change_coverage"] == 1.0
+    assert not PortfolioValuer(None, FakeMF({})).mf_day_change  # no store: no history downloads
@@ -0,0 +1,104 @@
+import pytest
+import requests
+import requests_mock
+
+from pyfinmuni.utils.rate_limit import (CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, HostPolicy,
+                                        RateLimits, TokenBucket)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_paces_after_burst_and_adapts():
+    clock = FakeClock()
+    bucket = TokenBucket(HostPolicy(rate=2, burst=3, min_rate=0.5, max_rate=4, increase=1), clock, clock.sleep)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(0.5)
+
+    bucket.on_throttle()
+    assert bucket.rate == 1
+    bucket.on_throttle(retry_after=10)
+    assert bucket.rate == 0.5
+    assert bucket.acquire() >= 10
+
+    for _ in range(10):
+        bucket.on_success(latency=0.1)
+    assert bucket.rate == 4
+    bucket.on_success(latency=60)
+    assert bucket.rate == pytest.approx(3.6)
+
+
+def test_circuit_breaker_opens_and_probes():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()  # one probe at a time
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_throttled_and_failed_requests_are_retried_with_backoff():
+    clock = FakeClock()
+    limits = RateLimits({"example.com": HostPolicy(rate=100, burst=100, throttle_statuses=(403, 429), backoff=1)},
+                        clock=clock, sleep=clock.sleep)
+    with requests_mock.Mocker() as m:
+        m.get("https://example.com/api", [{"status_code": 429, "headers": {"Retry-After": "7"}},
+                                          {"status_code": 503}, {"json": {"ok": True}}])
+        retried = []
+        response = limits.call("https://example.com/api", lambda: requests.get("https://example.com/api"),
+                               before_retry=lambda failed: retried.append(failed.status_code))
+    assert response.json() == {"ok": True}
+    assert retried == [429, 503]
+    assert clock.sleeps[0] == 7  # Retry-After is honoured
+    assert 1 <= clock.sleeps[-1] <= 2  # second backoff step, jittered
+    stats = limits.stats()["example.com"]
+    assert (stats["requests"], stats["throttled"], stats["failures"], stats["retries"]) == (3, 1, 1, 2)
+    assert stats["rate"] < 100
+
+
+def test_unhealthy_host_fails_fast_for_every_client():
+    clock = FakeClock()
+    limits = RateLimits({}, default_policy=HostPolicy(max_attempts=1, failure_threshold=2, reset_timeout=30),
+                        clock=clock, sleep=clock.sleep)
+    with requests_mock.Mocker() as m:
+        down = m.get("https://down.example.com/", exc=requests.exceptions.ConnectionError)
+        for _ in range(2):
+            with pytest.raises(requests.exceptions.ConnectionError):
+                limits.call("https://down.example.com/", lambda: requests.get("https://down.example.com/"))
+        with pytest.raises(CircuitOpenError):
+            limits.call("https://down.example.com/", lambda: requests.get("https://down.example.com/"))
+        assert down.call_count == 2
+
+        clock.now += 30
+        m.get("https://down.example.com/", text="back")
+        assert limits.call("https://down.example.com/", lambda: requests.get("https://down.example.com/")).text == "back"
+    assert limits.stats()["down.example.com"]["breaker"] == CLOSED
+
+
+def test_configure_changes_a_host_policy():
+    limits = RateLimits()
+    policy = limits.configure("www.nseindia.com", rate=1)
+    assert policy.rate == 1
+    assert 403 in policy.throttle_statuses  # other settings are kept
+    assert limits.limiter("www.nseindia.com").bucket.rate == 1
@@ -0,0 +1,57 @@
+import pytest
+
+from pyfinmuni.utils.scheme_registry import SchemeRegistry, isin_issuer, load_snapshot, save_snapshot
+
+@pytest.fixture
+def registry():
+    fund_list = [
+        {"schemeCode": 119551, "schemeName": "Aditya Birla Sun Life Banking & PSU Debt Fund - DIRECT - IDCW",
+         "isinGrowth": "INF209KA12Z1", "isinDivReinvestment": "INF209KA13Z9"},
+        {"schemeCode": 119552, "schemeName": "Aditya Birla Sun Life Banking & PSU Debt Fund - Direct Growth",
+         "isinGrowth": "INF209K01YY7", "isinDivReinvestment": None},
+        {"schemeCode": 125497, "schemeName": "SBI Small Cap Fund - Direct Plan - Growth",
+         "isinGrowth": "INF200K01T51", "isinDivReinvestment": None},
+        {"schemeCode": 100027, "schemeName": "Grindlays Super Saver Income Fund"},
+    ]
+    return SchemeRegistry(fund_list)
+
+def test_code_lookup(registry):
+    assert len(registry) == 4
+    assert 125497 in registry
+    assert "125497" in registry
+    assert 999999 not in registry
+    assert registry.get(125497)["schemeName"] == "SBI Small Cap Fund - Direct Plan - Growth"
+    assert registry.get(999999) is None
+
+def test_name_and_isin_lookup(registry):
+    assert registry.code_for_name("Grindlays Super Saver Income Fund") == 100027
+    assert registry.get_by_isin("INF209KA13Z9")["schemeCode"] == 119551
+    assert registry.get_by_isin("inf200k01t51")["schemeCode"] == 125497
+    assert registry.get_by_isin("INF000000000") is None
+
+def test_amc_index(registry):
+    assert isin_issuer("INF209K01YY7") == "209K"
+    assert [s["schemeCode"] for s in registry.schemes_for_amc("209K")] == [119551, 119552]
+    assert [s["schemeCode"] for s in registry.schemes_for_amc("INF200K01T51")] == [125497]
+    assert registry.amc_issuers() == ["200K", "209K"]
+
+def test_fund_code_map_round_trip(registry):
+    fund_code_map = registry.fund_code_map()
+    assert fund_code_map["SBI Small Cap Fund - Direct Plan - Growth"] == 125497
+    rebuilt = SchemeRegistry.from_fund_code_map(fund_code_map)
+    assert 119552 in rebuilt
+    assert registry.to_list()[3] == {"schemeCode": 100027, "schemeName": "Grindlays Super Saver Income Fund",
+                                     "isinGrowth": None, "isinDivReinvestment": None}
+
+def test_snapshot_round_trip(registry, tmp_path):
+    path = str(tmp_path / "schemes.json")
+    save_snapshot(registry, path, fetched_at=1700000000.0)
+    loaded, fetched_at = load_snapshot(path)
+    assert fetched_at == 1700000000.0
+    assert loaded.to_list() == registry.to_list()
+    assert loaded.get_by_isin("INF209KA13Z9")["schemeCode"] == 119551
+    assert loaded.schemes_for_amc("209K") == registry.schemes_for_amc("209K")
+
+    (tmp_path / "old.json").write_text('{"version": 0}')
+    with pytest.raises(ValueError):
+        load_snapshot(str(tmp_path / "old.json"))
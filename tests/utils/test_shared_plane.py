@@ -0,0 +1,123 @@
+import os
+import time
+import uuid
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from pyfinmuni import IndianMFApi
+from pyfinmuni.utils import shared_plane
+from pyfinmuni.utils.embedding_store import EmbeddingStore
+from pyfinmuni.utils.scheme_registry import SchemeRegistry
+from pyfinmuni.utils.shared_plane import SharedDataPlane, SharedDataPublisher
+
+pytestmark = pytest.mark.skipif(shared_plane._posixshmem is None, reason="needs POSIX shared memory")
+
+FUND_LIST = [
+    {"schemeCode": 119551, "schemeName": "Aditya Birla Sun Life Banking & PSU Debt Fund - DIRECT - IDCW",
+     "isinGrowth": "INF209KA12Z1", "isinDivReinvestment": "INF209KA13Z9"},
+    {"schemeCode": 125497, "schemeName": "SBI Small Cap Fund - Direct Plan - Growth",
+     "isinGrowth": "INF200K01T51", "isinDivReinvestment": None},
+    {"schemeCode": 100027, "schemeName": "Grindlays Super Saver Income Fund"},
+]
+
+LATEST = {"meta": {"scheme_code": 125497}, "data": [{"date": "15-10-2026", "nav": "180.12340"}], "status": "SUCCESS"}
+
+
+@pytest.fixture
+def publisher():
+    publisher = SharedDataPublisher(f"pfm-test-{uuid.uuid4().hex[:8]}")
+    yield publisher
+    publisher.close(unlink=True)
+
+
+@pytest.fixture
+def plane(publisher):
+    plane = SharedDataPlane(publisher.namespace)
+    plane.attach_interval = 0
+    return plane
+
+
+def test_shared_registry_answers_like_the_registry(publisher, plane):
+    assert plane.registry() is None  # nothing published yet
+    registry = SchemeRegistry(FUND_LIST)
+    publisher.publish_registry(registry)
+
+    shared = plane.registry()
+    assert len(shared) == 3
+    assert 125497 in shared and "100027" in shared and 999999 not in shared
+    assert shared.get(100027) == registry.get(100027)
+    assert shared.code_for_name("SBI Small Cap Fund - Direct Plan - Growth") == 125497
+    assert shared.get_by_isin("inf209ka13z9")["schemeCode"] == 119551
+    assert shared.schemes_for_amc("INF200K01T51") == registry.schemes_for_amc("200K")
+    assert shared.amc_issuers() == registry.amc_issuers()
+    assert dict(shared.fund_code_map()) == dict(registry.fund_code_map())
+    assert shared.to_list() == registry.to_list()
+    assert not shared.codes.flags.writeable  # workers map the data read-only
+
+
+def test_new_versions_swap_in_and_old_ones_stay_readable(publisher, plane):
+    publisher.publish_registry(SchemeRegistry(FUND_LIST[:1]))
+    first = plane.registry()
+    for count in (2, 3, 3, 3):
+        publisher.publish_registry(SchemeRegistry(FUND_LIST[:count]))
+
+    assert len(plane.registry()) == 3
+    assert plane.stats()["registry"]["generation"] == 5
+    assert not os.path.exists(f"/dev/shm/{publisher.namespace}.registry.1")  # only `keep` old versions stay
+    assert first.get(119551)["schemeCode"] == 119551  # a mapped version outlives its unlink
+
+
+def test_embeddings_and_navs(publisher, plane):
+    store = EmbeddingStore(["Alpha", "Beta"], np.array([1, 2]), np.array([[3.0, 4.0], [0.0, 2.0]], dtype=np.float32))
+    publisher.publish_embeddings(store)
+    shared = plane.embeddings()
+    assert shared.names == ["Alpha", "Beta"] and shared.normalized
+    np.testing.assert_allclose(shared.embeddings, [[0.6, 0.8], [0.0, 1.0]])
+
+    history = {"meta": {}, "data": [{"date": "15-10-2026", "nav": "11.0"}, {"date": "14-10-2026", "nav": "10.0"}]}
+    publisher.publish_navs({125497: LATEST, "100027": history, 119551: {}}, expires_at=time.time() + 60)
+    assert plane.nav_latest(125497) == LATEST
+    assert plane.nav_latest(119551) is None
+    table = plane.navs()
+    rows = table.rows([100027, 125497, 5])
+    assert rows[2] == -1
+    np.testing.assert_allclose(table.nav[rows[:2]], [11.0, 180.1234])
+    assert table.prev_nav[rows[0]] == 10.0 and np.isnan(table.prev_nav[rows[1]])
+
+    publisher.publish_navs({125497: LATEST}, expires_at=time.time() - 1)
+    assert plane.navs() is None and plane.nav_latest(125497) is None
+
+
+def _count_schemes(namespace, queue):
+    queue.put(len(SharedDataPlane(namespace).registry()))
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_other_processes_attach(publisher):
+    publisher.publish_registry(SchemeRegistry(FUND_LIST))
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    workers = [context.Process(target=_count_schemes, args=(publisher.namespace, queue)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    assert [queue.get(timeout=30) for _ in workers] == [3, 3]
+    for worker in workers:
+        worker.join()
+
+
+def test_clients_read_the_plane(publisher, plane, requests_mock, monkeypatch):
+    publisher.publish_registry(SchemeRegistry(FUND_LIST))
+    publisher.publish_navs({125497: LATEST})
+    mf_api = IndianMFApi(shared_plane=plane)
+    assert mf_api.is_valid_fund_code(125497)
+    assert mf_api.get_mf_price_latest(125497) == LATEST
+    assert mf_api.fund_code_map["Grindlays Super Saver Income Fund"] == 100027
+    assert not requests_mock.called
+
+    from pyfinmuni.utils import mf_fund_utils
+    publisher.publish_embeddings(EmbeddingStore(["Alpha"], np.array([1]), np.ones((1, 2), dtype=np.float32)))
+    monkeypatch.setattr(shared_plane, "SHARED_PLANE", publisher.namespace)
+    monkeypatch.setattr(mf_fund_utils, "_store", None)
+    assert mf_fund_utils.get_store().fund_data == [("Alpha", 1)]
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pyfinmuni.utils.singleflight import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    executions = []
+
+    def slow_fetch():
+        executions.append(1)
+        release.wait(5)
+        return {"nav": 10.5}
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(flight.do, "url", slow_fetch) for _ in range(8)]
+        while flight.stats()["calls"] < 8:
+            threading.Event().wait(0.01)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert executions == [1]
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {"calls": 8, "executions": 1, "coalesced": 7}
+    assert flight.in_flight() == 0
+    # Nothing is cached once the call is done
+    assert flight.do("url", lambda: "again") == "again"
+
+
+def test_errors_are_shared():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(flight.do, "url", failing) for _ in range(3)]
+        while flight.stats()["calls"] < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+    assert flight.stats()["executions"] == 1
+
+
+def test_async_single_flight():
+    flight = AsyncSingleFlight()
+    executions = []
+
+    async def fetch():
+        executions.append(1)
+        await asyncio.sleep(0.01)
+        return [1, 2, 3]
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream down")
+
+    async def main():
+        results = await asyncio.gather(*(flight.do("url", fetch) for _ in range(5)))
+        errors = await asyncio.gather(*(flight.do("bad", failing) for _ in range(2)), return_exceptions=True)
+        return results, errors
+
+    results, errors = asyncio.run(main())
+    assert executions == [1] and all(result == [1, 2, 3] for result in results)
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert flight.stats() == {"calls": 7, "executions": 2, "coalesced": 5}
+    assert flight.in_flight() == 0
+
+
+def test_async_cancelled_leader_does_not_cancel_waiters():
+    flight = AsyncSingleFlight()
+    executions = []
+
+    async def fetch():
+        executions.append(1)
+        await asyncio.sleep(0.02)
+        return "payload"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("url", fetch))
+        await asyncio.sleep(0)  # the leader starts the call
+        waiter = asyncio.ensure_future(flight.do("url", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(main()) == "payload"
+    assert executions == [1] and flight.in_flight() == 0
+    assert flight.stats() == {"calls": 2, "executions": 1, "coalesced": 1}
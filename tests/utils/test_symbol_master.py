@@ -0,0 +1,76 @@
+import pytest
+import requests
+
+from pyfinmuni.utils.symbol_master import SymbolMaster
+
+CSV = "SYMBOL,NAME OF COMPANY, SERIES\nRELIANCE,Reliance Industries Limited,EQ\nTCS,Tata Consultancy Services Limited,EQ\n"
+
+class FakeResponse:
+    def __init__(self, status_code, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    encoding = "utf-8"
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self, decode_unicode=False):
+        return iter(self.text.splitlines())
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def fetcher():
+    def fetch(headers):
+        fetch.requests.append(headers)
+        if headers.get("If-None-Match") == '"v1"':
+            return FakeResponse(304)
+        return FakeResponse(200, CSV, {"ETag": '"v1"', "Last-Modified": "Mon, 01 Jul 2024 00:00:00 GMT"})
+    fetch.requests = []
+    return fetch
+
+def test_lookups_are_served_from_memory(fetcher):
+    master = SymbolMaster(fetcher, clock=FakeClock())
+    assert "RELIANCE" in master
+    assert "INVALID" not in master
+    assert master.name("TCS") == "Tata Consultancy Services Limited"
+    assert len(fetcher.requests) == 1
+
+def test_revalidates_conditionally_after_ttl(fetcher, tmp_path):
+    clock = FakeClock()
+    master = SymbolMaster(fetcher, cache_path=str(tmp_path / "symbols.json"), ttl=60, clock=clock)
+    master.symbols()
+    clock.now += 61
+    assert "TCS" in master
+    assert fetcher.requests[-1] == {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 Jul 2024 00:00:00 GMT"}
+    assert len(fetcher.requests) == 2
+
+    # Another process starts from the disk cache without any request
+    restarted = SymbolMaster(fetcher, cache_path=str(tmp_path / "symbols.json"), ttl=60, clock=clock)
+    assert "RELIANCE" in restarted
+    assert len(fetcher.requests) == 2
+
+def test_cold_failure_is_retried_after_retry_interval(fetcher):
+    clock = FakeClock()
+    calls = []
+
+    def failing(headers):
+        calls.append(headers)
+        if len(calls) == 1:
+            raise requests.exceptions.ConnectionError("down")
+        return fetcher(headers)
+
+    master = SymbolMaster(failing, retry_interval=30, clock=clock)
+    assert "TCS" not in master
+    assert "RELIANCE" not in master
+    assert len(calls) == 1  # lookups during the backoff do not download again
+    clock.now += 31
+    assert "TCS" in master
+    assert len(calls) == 2
@@ -0,0 +1,43 @@
+import pytest
+
+from pyfinmuni.utils.symbol_table import SymbolTable, normalize_name
+
+CSV = """SYMBOL,NAME OF COMPANY, SERIES, DATE OF LISTING, PAID UP VALUE, MARKET LOT, ISIN NUMBER, FACE VALUE
+20MICRONS,20 Microns Limited,EQ,06-OCT-2008,5,1,INE144J01027,5
+RELIANCE,Reliance Industries Limited,EQ,29-NOV-1995,10,1,INE002A01018,10
+RELINFRA,Reliance Infrastructure Limited,EQ,29-NOV-1995,10,1,INE036A01016,10
+MMTC,"MMTC, Limited",EQ,19-MAY-2010,1,1,INE123F01029,1
+TATAMOTORS,Tata Motors Limited,EQ,22-JUL-1998,2,1,INE155A01022,2
+"""
+
+@pytest.fixture
+def table():
+    return SymbolTable.from_csv_lines(CSV.splitlines())
+
+def test_parses_all_columns_and_quoted_names(table):
+    assert len(table) == 5
+    assert "SYMBOL" not in table
+    assert table.get("mmtc")["name"] == "MMTC, Limited"
+    assert table.get("RELIANCE") == {
+        "symbol": "RELIANCE", "name": "Reliance Industries Limited", "series": "EQ",
+        "listing_date": "1995-11-29", "paid_up_value": 10.0, "market_lot": 1,
+        "isin": "INE002A01018", "face_value": 10.0,
+    }
+
+def test_indexes(table):
+    assert table.get_by_isin("INE155A01022")["symbol"] == "TATAMOTORS"
+    assert normalize_name("Reliance Industries Ltd.") == "reliance industries"
+    assert [r["symbol"] for r in table.find_by_name("RELIANCE INDUSTRIES LTD")] == ["RELIANCE"]
+
+def test_search_and_resolve(table):
+    assert [r["symbol"] for r in table.search("reliance")] == ["RELIANCE", "RELINFRA"]
+    assert [r["symbol"] for r in table.search("motors")] == ["TATAMOTORS"]
+    assert [r["symbol"] for r in table.search("otor")] == ["TATAMOTORS"]
+    assert table.resolve("reliance ind") == "RELIANCE"
+    assert table.resolve("reliance infra") == "RELINFRA"
+    assert table.resolve("INE144J01027") == "20MICRONS"
+    assert table.resolve("tatamotors") == "TATAMOTORS"
+    assert table.resolve("nonexistent company") is None
+
+def test_rows_round_trip(table):
+    assert SymbolTable(table.rows()).get("MMTC") == table.get("MMTC")
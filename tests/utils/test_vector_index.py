@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from pyfinmuni.utils.vector_index import ExactIndex, Int8Index, IVFIndex, make_index, top_k_indices
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(1)
+    matrix = rng.standard_normal((500, 16)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    queries = matrix[:20] + 0.05 * rng.standard_normal((20, 16)).astype(np.float32)
+    return matrix, queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def test_top_k_indices():
+    scores = np.array([[0.1, 0.9, 0.5, 0.7], [1.0, 0.0, 0.2, 0.3]])
+    assert top_k_indices(scores, 2).tolist() == [[1, 3], [0, 3]]
+    assert top_k_indices(scores, 10).tolist() == [[1, 3, 2, 0], [0, 3, 2, 1]]
+
+
+def test_exact_index(data):
+    matrix, queries = data
+    indices, scores = ExactIndex(matrix).search(queries, 3)
+
+    assert indices[:, 0].tolist() == list(range(20))
+    np.testing.assert_allclose(scores, np.take_along_axis(queries @ matrix.T, indices, axis=1), rtol=1e-5)
+    float16_indices, _ = ExactIndex(matrix.astype(np.float16), block_rows=64).search(queries, 3)
+    assert float16_indices[:, 0].tolist() == list(range(20))
+
+
+def test_int8_index(data):
+    matrix, queries = data
+    exact_indices, exact_scores = ExactIndex(matrix).search(queries, 3)
+    index = Int8Index(matrix, block_rows=64)
+
+    assert index.codes.dtype == np.int8 and index.nbytes < matrix.nbytes / 3
+    assert index.search(queries, 3)[0][:, 0].tolist() == list(range(20))
+    reranked_indices, reranked_scores = Int8Index(matrix, rerank_matrix=matrix).search(queries, 3)
+    assert reranked_indices.tolist() == exact_indices.tolist()
+    np.testing.assert_allclose(reranked_scores, exact_scores, rtol=1e-5)
+
+    # Scaled float16 rows, as in a store that was never normalized: no float32 copy is needed
+    raw = (matrix * np.linspace(0.5, 4, len(matrix), dtype=np.float32)[:, None]).astype(np.float16)
+    raw_indices, raw_scores = Int8Index(raw, rerank_matrix=raw, block_rows=64).search(queries, 3)
+    assert raw_indices.tolist() == exact_indices.tolist()
+    np.testing.assert_allclose(raw_scores, exact_scores, atol=2e-3)
+
+
+def test_ivf_index(data):
+    matrix, queries = data
+    exact_indices, _ = ExactIndex(matrix).search(queries, 3)
+
+    assert IVFIndex(matrix, n_lists=10, n_probe=10).search(queries, 3)[0].tolist() == exact_indices.tolist()
+    index = IVFIndex(matrix, n_lists=10, n_probe=3)
+    assert index.offsets[-1] == len(matrix) and sorted(index.order.tolist()) == list(range(len(matrix)))
+    assert index.search(queries, 1)[0][:, 0].tolist() == list(range(20))
+
+
+def test_make_index(data):
+    matrix, _ = data
+    assert isinstance(make_index("ivf", matrix, n_lists=4), IVFIndex)
+    with pytest.raises(ValueError):
+        make_index("hnsw", matrix)